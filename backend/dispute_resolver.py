@@ -2,9 +2,13 @@
 Dispute Resolver
 Analyzes multiple LLM responses and selects the best output
 """
+import csv
 import json
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple, Callable, FrozenSet
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime
 import re
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -12,14 +16,361 @@ from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 
 from multi_llm_api_layer import LLMResponse
+from plan_validator import validate_plan
 
 logger = logging.getLogger(__name__)
 
+# Scoring pools are shared by every resolver in the process
+_scoring_pools: Dict[str, Executor] = {}
+_scoring_pools_lock = threading.Lock()
+
+def _get_scoring_pool(kind: str, max_workers: Optional[int]) -> Executor:
+    """Get (or lazily create) the shared thread/process pool for candidate scoring"""
+    
+    with _scoring_pools_lock:
+        pool = _scoring_pools.get(kind)
+        if pool is None:
+            if kind == "process":
+                pool = ProcessPoolExecutor(max_workers=max_workers)
+            else:
+                pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dispute-scoring")
+            _scoring_pools[kind] = pool
+        return pool
+
+def _score_planning_candidate(args: Tuple[int, str, float, float, Optional[FrozenSet[str]]]) -> Dict[str, Any]:
+    """Parse, validate and extract features for one planning candidate (runs on the scoring pool)"""
+    
+    index, response_text, confidence, latency, known_tools = args
+    
+    try:
+        parsed_plan = DisputeResolver._parse_json_plan(response_text)
+        
+        # Reject plans that cannot execute before they compete for selection
+        validation = validate_plan(parsed_plan, known_tools)
+        if not validation.valid:
+            return {"index": index, "error": f"Plan rejected: {'; '.join(validation.errors)}"}
+        
+        parsed_plan = validation.plan
+        
+        return {
+            "index": index,
+            "parsed_plan": parsed_plan,
+            "features": {
+                "confidence": confidence,
+                "latency": DisputeResolver._latency_score(latency),
+                "content_quality": DisputeResolver._evaluate_plan_quality(parsed_plan),
+                "format_compliance": DisputeResolver._evaluate_plan_format(parsed_plan)
+            }
+        }
+        
+    except Exception as e:
+        return {"index": index, "error": str(e)}
+
+def _score_text_candidate(args: Tuple[int, str, str, float, float]) -> Dict[str, Any]:
+    """Extract features for one analysis/correction candidate (runs on the scoring pool)"""
+    
+    index, task_type, response_text, confidence, latency = args
+    
+    try:
+        if task_type == "analysis":
+            content_score = DisputeResolver._evaluate_analysis_quality(response_text)
+        else:
+            content_score = DisputeResolver._evaluate_correction_quality(response_text)
+        
+        return {
+            "index": index,
+            "features": {
+                "confidence": confidence,
+                "latency": DisputeResolver._latency_score(latency),
+                "content_quality": content_score
+            }
+        }
+        
+    except Exception as e:
+        return {"index": index, "error": str(e)}
+
+class ResolutionLog:
+    """Fixed-size columnar log of every scored candidate with incremental aggregates
+    
+    Resolutions are evicted whole: when a new row overwrites the oldest
+    resolution's first row, the rest of that resolution's rows are dropped
+    too, so the aggregates and records never cover part of a resolution.
+    """
+    
+    FEATURES = ("confidence", "latency", "content_quality", "format_compliance", "consensus")
+    
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        
+        # One row per candidate response, written as a ring buffer
+        self._resolution_id = np.zeros(capacity, dtype=np.int64)
+        self._timestamp = np.zeros(capacity, dtype=np.float64)
+        self._task_type = np.zeros(capacity, dtype=np.int16)
+        self._provider = np.zeros(capacity, dtype=np.int16)
+        self._num_responses = np.zeros(capacity, dtype=np.int16)
+        self._raw_latency = np.zeros(capacity, dtype=np.float64)
+        self._score = np.full(capacity, np.nan, dtype=np.float64)
+        self._features = np.full((capacity, len(self.FEATURES)), np.nan, dtype=np.float64)
+        self._selected = np.zeros(capacity, dtype=bool)
+        self._live = np.zeros(capacity, dtype=bool)
+        
+        self._rows_written = 0
+        self._live_rows = 0
+        self._resolutions = 0
+        
+        # String interning for the categorical columns
+        self._providers: List[str] = []
+        self._provider_codes: Dict[str, int] = {}
+        self._task_types: List[str] = []
+        self._task_type_codes: Dict[str, int] = {}
+        
+        # (provider_code, task_type_code) -> [candidates, errors, selections,
+        #                                      score_sum, selected_score_sum, latency_sum]
+        self._aggregates: Dict[Tuple[int, int], List[float]] = {}
+    
+    def __len__(self) -> int:
+        return self._live_rows
+    
+    def append(self, task_type: str, candidates: List[Dict[str, Any]]) -> int:
+        """Append one resolution; each candidate has provider, score, features, latency, selected"""
+        
+        with self._lock:
+            resolution_id = self._resolutions
+            self._resolutions += 1
+            timestamp = time.time()
+            task_code = self._intern(task_type, self._task_types, self._task_type_codes)
+            
+            # A resolution larger than the whole log keeps its first capacity rows
+            for candidate in candidates[:self.capacity]:
+                slot = self._rows_written % self.capacity
+                if self._live[slot]:
+                    self._evict_resolution(slot)
+                
+                features = candidate.get("features") or {}
+                
+                self._resolution_id[slot] = resolution_id
+                self._timestamp[slot] = timestamp
+                self._task_type[slot] = task_code
+                self._provider[slot] = self._intern(
+                    candidate["provider"], self._providers, self._provider_codes
+                )
+                self._num_responses[slot] = len(candidates)
+                self._raw_latency[slot] = candidate.get("latency", 0.0) or 0.0
+                score = candidate.get("score")
+                self._score[slot] = np.nan if score is None else score
+                self._features[slot] = [features.get(name, np.nan) for name in self.FEATURES]
+                self._selected[slot] = candidate.get("selected", False)
+                
+                self._apply_aggregate(slot, 1)
+                self._live[slot] = True
+                self._live_rows += 1
+                self._rows_written += 1
+            
+            return resolution_id
+    
+    def _intern(self, value: str, values: List[str], codes: Dict[str, int]) -> int:
+        """Map a categorical string to a stable small integer code"""
+        code = codes.get(value)
+        if code is None:
+            code = len(values)
+            values.append(value)
+            codes[value] = code
+        return code
+    
+    def _evict_resolution(self, slot: int):
+        """Drop the resolution whose first live row is at slot (lock held)"""
+        
+        resolution_id = self._resolution_id[slot]
+        while self._live[slot] and self._resolution_id[slot] == resolution_id:
+            self._apply_aggregate(slot, -1)
+            self._live[slot] = False
+            self._live_rows -= 1
+            slot = (slot + 1) % self.capacity
+    
+    def _apply_aggregate(self, slot: int, sign: int):
+        """Add (sign=1) or remove (sign=-1) a row's contribution to the aggregates"""
+        
+        key = (int(self._provider[slot]), int(self._task_type[slot]))
+        agg = self._aggregates.setdefault(key, [0, 0, 0, 0.0, 0.0, 0.0])
+        score = self._score[slot]
+        
+        agg[0] += sign
+        agg[5] += sign * self._raw_latency[slot]
+        if np.isnan(score):
+            agg[1] += sign
+        else:
+            agg[3] += sign * score
+            if self._selected[slot]:
+                agg[2] += sign
+                agg[4] += sign * score
+    
+    def _ordered_slots(self) -> np.ndarray:
+        """Live buffer slots in insertion order, oldest first"""
+        if self._rows_written <= self.capacity:
+            return np.arange(self._rows_written)
+        start = self._rows_written % self.capacity
+        slots = (np.arange(self.capacity) + start) % self.capacity
+        return slots[self._live[slots]]
+    
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """Snapshot of the log as named columns, oldest row first"""
+        
+        with self._lock:
+            slots = self._ordered_slots()
+            providers = np.array(self._providers or [""], dtype=object)
+            task_types = np.array(self._task_types or [""], dtype=object)
+            
+            columns = {
+                "resolution_id": self._resolution_id[slots],
+                "timestamp": self._timestamp[slots],
+                "task_type": task_types[self._task_type[slots]],
+                "provider": providers[self._provider[slots]],
+                "num_responses": self._num_responses[slots],
+                "selected": self._selected[slots],
+                "score": self._score[slots],
+                "raw_latency": self._raw_latency[slots]
+            }
+            for i, name in enumerate(self.FEATURES):
+                columns[f"feature_{name}"] = self._features[slots, i]
+            
+            return columns
+    
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Rebuild per-resolution records in the legacy history format"""
+        
+        columns = self.to_columns()
+        records = []
+        current = None
+        
+        for i in range(len(columns["resolution_id"])):
+            resolution_id = int(columns["resolution_id"][i])
+            if current is None or current["resolution_id"] != resolution_id:
+                current = {
+                    "resolution_id": resolution_id,
+                    "timestamp": datetime.fromtimestamp(columns["timestamp"][i]).isoformat(),
+                    "task_type": columns["task_type"][i],
+                    "num_responses": int(columns["num_responses"][i]),
+                    "selected_provider": None,
+                    "selected_score": None,
+                    "provider_scores": {}
+                }
+                records.append(current)
+            
+            provider = columns["provider"][i]
+            score = columns["score"][i]
+            current["provider_scores"][provider] = None if np.isnan(score) else float(score)
+            if columns["selected"][i]:
+                current["selected_provider"] = provider
+                current["selected_score"] = float(score)
+        
+        return records
+    
+    def provider_stats(self) -> Dict[str, Any]:
+        """Per-provider statistics derived from the incremental aggregates"""
+        
+        with self._lock:
+            aggregates = [(key, list(agg)) for key, agg in self._aggregates.items()]
+            providers = list(self._providers)
+            task_types = list(self._task_types)
+        
+        provider_stats = {}
+        
+        for (provider_code, task_code), agg in aggregates:
+            candidates, errors, selections, score_sum, selected_score_sum, latency_sum = agg
+            if candidates <= 0:
+                continue
+            
+            stats = provider_stats.setdefault(providers[provider_code], {
+                "selections": 0,
+                "total_score": 0.0,
+                "candidates": 0,
+                "errors": 0,
+                "candidate_score_sum": 0.0,
+                "latency_sum": 0.0,
+                "task_types": {},
+                "task_type_stats": {}
+            })
+            
+            stats["selections"] += selections
+            stats["total_score"] += selected_score_sum
+            stats["candidates"] += candidates
+            stats["errors"] += errors
+            stats["candidate_score_sum"] += score_sum
+            stats["latency_sum"] += latency_sum
+            
+            task_type = task_types[task_code]
+            if selections:
+                stats["task_types"][task_type] = selections
+            scored = candidates - errors
+            stats["task_type_stats"][task_type] = {
+                "candidates": candidates,
+                "selections": selections,
+                "win_rate": selections / candidates,
+                "average_candidate_score": score_sum / scored if scored else 0.0
+            }
+        
+        for stats in provider_stats.values():
+            scored = stats["candidates"] - stats["errors"]
+            candidate_score_sum = stats.pop("candidate_score_sum")
+            if stats["selections"] > 0:
+                stats["average_score"] = stats["total_score"] / stats["selections"]
+            stats["average_candidate_score"] = candidate_score_sum / scored if scored else 0.0
+            stats["average_latency"] = stats.pop("latency_sum") / stats["candidates"]
+            stats["win_rate"] = stats["selections"] / stats["candidates"]
+        
+        return provider_stats
+    
+    def export_csv(self, path: str) -> int:
+        """Export the log as CSV, returns the number of rows written"""
+        
+        columns = self.to_columns()
+        names = list(columns.keys())
+        rows = len(columns["resolution_id"])
+        
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            for i in range(rows):
+                writer.writerow([columns[name][i] for name in names])
+        
+        return rows
+    
+    def export_parquet(self, path: str) -> int:
+        """Export the log as Parquet (requires pyarrow), returns the number of rows written"""
+        
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow is required for Parquet export")
+        
+        columns = self.to_columns()
+        table = pa.table({
+            name: pa.array(values.tolist() if values.dtype == object else values)
+            for name, values in columns.items()
+        })
+        pq.write_table(table, path)
+        
+        return table.num_rows
+
 class DisputeResolver:
     """Resolves disputes between multiple LLM responses"""
     
-    def __init__(self):
-        self.resolution_history = []
+    def __init__(self, history_size: int = 1000, parallel_threshold: int = 16384,
+                 pool_type: str = "thread", max_workers: Optional[int] = None,
+                 known_tools: Optional[List[str]] = None):
+        self.resolution_log = ResolutionLog(capacity=history_size)
+        
+        # Tool names accepted in tool_use steps (None disables the check)
+        self.known_tools = frozenset(known_tools) if known_tools is not None else None
+        
+        # Candidates are scored on the shared pool once their combined
+        # response size reaches parallel_threshold characters
+        self.parallel_threshold = parallel_threshold
+        self.pool_type = pool_type
+        self.max_workers = max_workers
+        
         self.scoring_weights = {
             "confidence": 0.25,
             "latency": 0.15,
@@ -42,35 +393,19 @@ class DisputeResolver:
             logger.error("No valid responses to resolve")
             return None
         
-        # Score each response
-        scored_responses = []
-        
-        for response in valid_responses:
-            try:
-                # Parse JSON if possible
-                parsed_plan = self._parse_json_plan(response.response)
-                
-                score = self._score_planning_response(response, parsed_plan)
-                
-                scored_responses.append({
-                    "response": response,
-                    "parsed_plan": parsed_plan,
-                    "score": score
-                })
-                
-            except Exception as e:
-                logger.error(f"Error scoring response from {response.provider}: {str(e)}")
-                continue
+        # Parse and score each response
+        scored_responses = self._score_candidates("planning", valid_responses)
         
         if not scored_responses:
             logger.error("No scorable responses found")
+            self._log_resolution("planning", responses, None, scored_responses)
             return None
         
         # Select best response
-        best_response = max(scored_responses, key=lambda x: x["score"])
+        best_response = self._select_best(scored_responses)
         
         # Log resolution
-        self._log_resolution("planning", responses, best_response)
+        self._log_resolution("planning", responses, best_response, scored_responses)
         
         return best_response["parsed_plan"]
     
@@ -86,20 +421,17 @@ class DisputeResolver:
             return None
         
         # Score each response
-        scored_responses = []
+        scored_responses = self._score_candidates("analysis", valid_responses)
         
-        for response in valid_responses:
-            score = self._score_analysis_response(response, valid_responses)
-            scored_responses.append({
-                "response": response,
-                "score": score
-            })
+        if not scored_responses:
+            self._log_resolution("analysis", responses, None, scored_responses)
+            return None
         
         # Select best response
-        best_response = max(scored_responses, key=lambda x: x["score"])
+        best_response = self._select_best(scored_responses)
         
         # Log resolution
-        self._log_resolution("analysis", responses, best_response)
+        self._log_resolution("analysis", responses, best_response, scored_responses)
         
         return best_response["response"].response
     
@@ -115,27 +447,25 @@ class DisputeResolver:
             return None
         
         # Score each response
-        scored_responses = []
+        scored_responses = self._score_candidates("correction", valid_responses)
         
-        for response in valid_responses:
-            score = self._score_correction_response(response, valid_responses)
-            scored_responses.append({
-                "response": response,
-                "score": score
-            })
+        if not scored_responses:
+            self._log_resolution("correction", responses, None, scored_responses)
+            return None
         
         # Select best response
-        best_response = max(scored_responses, key=lambda x: x["score"])
+        best_response = self._select_best(scored_responses)
         
         # Log resolution
-        self._log_resolution("correction", responses, best_response)
+        self._log_resolution("correction", responses, best_response, scored_responses)
         
         # Parse correction plan
         correction_plan = self._parse_correction_plan(best_response["response"].response)
         
         return correction_plan
     
-    def _parse_json_plan(self, response_text: str) -> Dict[str, Any]:
+    @staticmethod
+    def _parse_json_plan(response_text: str) -> Dict[str, Any]:
         """Parse JSON plan from response text"""
         
         try:
@@ -181,73 +511,91 @@ class DisputeResolver:
                 "required_tools": []
             }
     
-    def _score_planning_response(self, response: LLMResponse, parsed_plan: Dict[str, Any]) -> float:
-        """Score a planning response"""
-        
-        score = 0.0
-        
-        # Confidence score
-        score += response.confidence * self.scoring_weights["confidence"]
-        
-        # Latency score (lower is better)
-        latency_score = max(0, 1 - (response.latency / 10))  # Normalize to 0-1
-        score += latency_score * self.scoring_weights["latency"]
+    def _score_candidates(self, task_type: str, valid_responses: List[LLMResponse]) -> List[Dict[str, Any]]:
+        """Parse and score candidates, in input order, on the shared pool for large batches"""
+        
+        if task_type == "planning":
+            worker = _score_planning_candidate
+            jobs = [
+                (i, r.response, r.confidence, r.latency, self.known_tools)
+                for i, r in enumerate(valid_responses)
+            ]
+        else:
+            worker = _score_text_candidate
+            jobs = [
+                (i, task_type, r.response, r.confidence, r.latency)
+                for i, r in enumerate(valid_responses)
+            ]
+        
+        results = self._run_scoring_jobs(worker, jobs, valid_responses)
+        
+        # Consensus needs every candidate, so it is computed once for the batch
+        consensus = None
+        if task_type != "planning":
+            consensus = self._calculate_consensus(valid_responses)
         
-        # Content quality score
-        content_score = self._evaluate_plan_quality(parsed_plan)
-        score += content_score * self.scoring_weights["content_quality"]
+        scored_responses = []
         
-        # Format compliance score
-        format_score = self._evaluate_plan_format(parsed_plan)
-        score += format_score * self.scoring_weights["format_compliance"]
+        for result in results:
+            response = valid_responses[result["index"]]
+            
+            if "error" in result:
+                logger.error(f"Error scoring response from {response.provider}: {result['error']}")
+                continue
+            
+            features = result["features"]
+            if consensus is not None:
+                features["consensus"] = consensus[result["index"]]
+            
+            scored = {
+                "response": response,
+                "score": self._weighted_score(features),
+                "features": features
+            }
+            if "parsed_plan" in result:
+                scored["parsed_plan"] = result["parsed_plan"]
+            
+            scored_responses.append(scored)
         
-        return score
+        return scored_responses
     
-    def _score_analysis_response(self, response: LLMResponse, all_responses: List[LLMResponse]) -> float:
-        """Score an analysis response"""
+    def _run_scoring_jobs(self, worker: Callable[[Tuple], Dict[str, Any]], jobs: List[Tuple],
+                          valid_responses: List[LLMResponse]) -> List[Dict[str, Any]]:
+        """Run scoring jobs inline, or on the shared pool above the size threshold"""
         
-        score = 0.0
+        total_size = sum(len(r.response) for r in valid_responses)
         
-        # Confidence score
-        score += response.confidence * self.scoring_weights["confidence"]
+        if len(jobs) < 2 or total_size < self.parallel_threshold:
+            return [worker(job) for job in jobs]
         
-        # Latency score (lower is better)
-        latency_score = max(0, 1 - (response.latency / 10))
-        score += latency_score * self.scoring_weights["latency"]
-        
-        # Content quality score
-        content_score = self._evaluate_analysis_quality(response.response)
-        score += content_score * self.scoring_weights["content_quality"]
-        
-        # Consensus score (similarity to other responses)
-        consensus_score = self._calculate_consensus(response, all_responses)
-        score += consensus_score * self.scoring_weights["consensus"]
-        
-        return score
+        try:
+            pool = _get_scoring_pool(self.pool_type, self.max_workers)
+            # map preserves input order, keeping selection deterministic
+            return list(pool.map(worker, jobs))
+        except Exception as e:
+            logger.warning(f"Parallel scoring unavailable, scoring inline: {str(e)}")
+            return [worker(job) for job in jobs]
     
-    def _score_correction_response(self, response: LLMResponse, all_responses: List[LLMResponse]) -> float:
-        """Score a correction response"""
-        
-        score = 0.0
-        
-        # Confidence score
-        score += response.confidence * self.scoring_weights["confidence"]
-        
-        # Latency score
-        latency_score = max(0, 1 - (response.latency / 10))
-        score += latency_score * self.scoring_weights["latency"]
-        
-        # Content quality score
-        content_score = self._evaluate_correction_quality(response.response)
-        score += content_score * self.scoring_weights["content_quality"]
-        
-        # Consensus score
-        consensus_score = self._calculate_consensus(response, all_responses)
-        score += consensus_score * self.scoring_weights["consensus"]
-        
-        return score
+    def _select_best(self, scored_responses: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Pick the highest score; ties go to provider then model name, never arrival order"""
+        
+        return min(scored_responses, key=lambda x: (
+            -round(x["score"], 9),
+            x["response"].provider,
+            x["response"].model
+        ))
+    
+    @staticmethod
+    def _latency_score(latency: float) -> float:
+        """Latency score normalized to 0-1 (lower latency is better)"""
+        return max(0, 1 - (latency / 10))
     
-    def _evaluate_plan_quality(self, plan: Dict[str, Any]) -> float:
+    def _weighted_score(self, features: Dict[str, float]) -> float:
+        """Combine feature scores using the configured weights"""
+        return sum(value * self.scoring_weights[name] for name, value in features.items())
+    
+    @staticmethod
+    def _evaluate_plan_quality(plan: Dict[str, Any]) -> float:
         """Evaluate the quality of a plan"""
         
         quality_score = 0.0
@@ -280,7 +628,8 @@ class DisputeResolver:
         
         return min(quality_score, 1.0)
     
-    def _evaluate_plan_format(self, plan: Dict[str, Any]) -> float:
+    @staticmethod
+    def _evaluate_plan_format(plan: Dict[str, Any]) -> float:
         """Evaluate the format compliance of a plan"""
         
         format_score = 0.0
@@ -301,7 +650,8 @@ class DisputeResolver:
         
         return min(format_score, 1.0)
     
-    def _evaluate_analysis_quality(self, response_text: str) -> float:
+    @staticmethod
+    def _evaluate_analysis_quality(response_text: str) -> float:
         """Evaluate the quality of an analysis response"""
         
         quality_score = 0.0
@@ -332,7 +682,8 @@ class DisputeResolver:
         
         return min(quality_score, 1.0)
     
-    def _evaluate_correction_quality(self, response_text: str) -> float:
+    @staticmethod
+    def _evaluate_correction_quality(response_text: str) -> float:
         """Evaluate the quality of a correction response"""
         
         quality_score = 0.0
@@ -363,36 +714,25 @@ class DisputeResolver:
         
         return min(quality_score, 1.0)
     
-    def _calculate_consensus(self, response: LLMResponse, all_responses: List[LLMResponse]) -> float:
-        """Calculate consensus score based on similarity to other responses"""
+    def _calculate_consensus(self, all_responses: List[LLMResponse]) -> List[float]:
+        """Calculate each response's consensus score (mean similarity to the others)"""
         
         if len(all_responses) < 2:
-            return 0.5  # Neutral score for single response
+            return [0.5] * len(all_responses)  # Neutral score for single response
         
         try:
-            # Get response texts
-            response_texts = [r.response for r in all_responses if r.response]
-            
-            if len(response_texts) < 2:
-                return 0.5
-            
-            # Calculate TF-IDF similarity
+            # Calculate TF-IDF similarity once for the whole batch
             vectorizer = TfidfVectorizer(stop_words='english', max_features=1000)
-            tfidf_matrix = vectorizer.fit_transform(response_texts)
-            
-            # Find similarity of target response to others
-            target_idx = next(i for i, r in enumerate(all_responses) if r == response)
-            similarities = cosine_similarity(tfidf_matrix[target_idx:target_idx+1], tfidf_matrix)[0]
+            tfidf_matrix = vectorizer.fit_transform([r.response for r in all_responses])
+            similarities = cosine_similarity(tfidf_matrix)
             
-            # Remove self-similarity
-            similarities = np.delete(similarities, target_idx)
-            
-            # Return average similarity
-            return np.mean(similarities)
+            # Average similarity to the others, excluding self-similarity
+            np.fill_diagonal(similarities, 0.0)
+            return (similarities.sum(axis=1) / (len(all_responses) - 1)).tolist()
             
         except Exception as e:
             logger.error(f"Error calculating consensus: {str(e)}")
-            return 0.5
+            return [0.5] * len(all_responses)
     
     def _parse_correction_plan(self, response_text: str) -> Dict[str, Any]:
         """Parse correction plan from response text"""
@@ -424,62 +764,45 @@ class DisputeResolver:
             "estimated_time": len(steps) * 60  # 1 minute per step
         }
     
-    def _log_resolution(self, task_type: str, responses: List[LLMResponse], best_response: Dict[str, Any]):
-        """Log resolution for analysis"""
-        
-        resolution_record = {
-            "timestamp": datetime.now().isoformat(),
-            "task_type": task_type,
-            "num_responses": len(responses),
-            "selected_provider": best_response["response"].provider,
-            "selected_score": best_response["score"],
-            "provider_scores": {
-                r.provider: scored_r["score"] 
-                for r, scored_r in zip(responses, [best_response])
-            }
-        }
-        
-        self.resolution_history.append(resolution_record)
+    def _log_resolution(self, task_type: str, responses: List[LLMResponse],
+                        best_response: Optional[Dict[str, Any]], scored_responses: List[Dict[str, Any]]):
+        """Log every candidate's score and features for analysis"""
+        
+        scored_by_id = {id(scored["response"]): scored for scored in scored_responses}
+        candidates = []
+        
+        for response in responses:
+            scored = scored_by_id.get(id(response))
+            candidates.append({
+                "provider": response.provider,
+                "score": scored["score"] if scored else None,
+                "features": scored["features"] if scored else None,
+                "latency": response.latency,
+                "selected": best_response is not None and scored is best_response
+            })
         
-        # Keep only last 100 records
-        if len(self.resolution_history) > 100:
-            self.resolution_history = self.resolution_history[-100:]
+        self.resolution_log.append(task_type, candidates)
         
-        logger.info(f"Resolution completed: {task_type} -> {best_response['response'].provider}")
+        if best_response:
+            logger.info(f"Resolution completed: {task_type} -> {best_response['response'].provider}")
     
     def get_resolution_history(self) -> List[Dict[str, Any]]:
         """Get resolution history"""
-        return self.resolution_history.copy()
+        return self.resolution_log.to_records()
     
     def get_provider_performance(self) -> Dict[str, Any]:
         """Get provider performance statistics"""
+        return self.resolution_log.provider_stats()
+    
+    def export_resolution_log(self, path: str, format: str = "csv") -> int:
+        """Export the candidate-level resolution log for offline analysis"""
         
-        provider_stats = {}
-        
-        for record in self.resolution_history:
-            selected_provider = record["selected_provider"]
-            
-            if selected_provider not in provider_stats:
-                provider_stats[selected_provider] = {
-                    "selections": 0,
-                    "total_score": 0.0,
-                    "task_types": {}
-                }
-            
-            provider_stats[selected_provider]["selections"] += 1
-            provider_stats[selected_provider]["total_score"] += record["selected_score"]
-            
-            task_type = record["task_type"]
-            if task_type not in provider_stats[selected_provider]["task_types"]:
-                provider_stats[selected_provider]["task_types"][task_type] = 0
-            provider_stats[selected_provider]["task_types"][task_type] += 1
-        
-        # Calculate averages
-        for provider, stats in provider_stats.items():
-            if stats["selections"] > 0:
-                stats["average_score"] = stats["total_score"] / stats["selections"]
+        if format == "csv":
+            return self.resolution_log.export_csv(path)
+        elif format == "parquet":
+            return self.resolution_log.export_parquet(path)
         
-        return provider_stats
+        raise ValueError(f"Unknown export format: {format}")
     
     def update_scoring_weights(self, new_weights: Dict[str, float]):
         """Update scoring weights"""
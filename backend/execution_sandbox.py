@@ -10,15 +10,31 @@ import docker
 import logging
 import json
 import time
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Iterator, Callable
 from datetime import datetime, timedelta
 import threading
 import signal
+import socket
+import queue
+import shutil
+import concurrent.futures
+import contextlib
 import psutil
 from pathlib import Path
 import uuid
+from docker.utils.socket import frames_iter, STDERR
 
 from config import CONFIG
+from sandbox_pool import ContainerPool, PooledContainer, start_session_container, reset_container, remove_container
+from sandbox_output import OutputCollector, OutputCallback, pump_stream
+from sandbox_kernel import SessionKernelManager, KERNEL_LANGUAGES, parse_memory_limit, local_environment
+from sandbox_forkserver import ForkServer, ForkedExecution, DEFAULT_PRELOAD
+from sandbox_cache import ResultCache, execution_cache_key
+from sandbox_scheduler import ExecutionScheduler, QueueTimeout, PRIORITY_NORMAL
+from sandbox_metrics import ContainerUsageSampler, ResourceStats, exit_reason, usage_from_rusage
+from sandbox_validator import CodeValidator
+from sandbox_images import SandboxImages, ImageNotReady
+from sandbox_history import ExecutionHistory, default_spill_path
 
 logger = logging.getLogger(__name__)
 
@@ -48,32 +64,156 @@ class ExecutionResult:
             "metadata": self.metadata,
             "timestamp": self.timestamp.isoformat()
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ExecutionResult":
+        result = cls(
+            success=data["success"],
+            stdout=data.get("stdout", ""),
+            stderr=data.get("stderr", ""),
+            exit_code=data.get("exit_code", 0),
+            execution_time=data.get("execution_time", 0.0),
+            error=data.get("error"),
+            metadata=dict(data.get("metadata") or {})
+        )
+        if data.get("timestamp"):
+            result.timestamp = datetime.fromisoformat(data["timestamp"])
+        return result
 
 class ExecutionSandbox:
     """Secure execution environment for code and commands"""
     
-    def __init__(self):
+    def __init__(self, pool_settings: Optional[Dict[str, Any]] = None,
+                 kernel_settings: Optional[Dict[str, Any]] = None,
+                 forkserver_settings: Optional[Dict[str, Any]] = None,
+                 cache_settings: Optional[Dict[str, Any]] = None,
+                 scheduler_settings: Optional[Dict[str, Any]] = None,
+                 validation_policy: Optional[Dict[str, Dict[str, Any]]] = None,
+                 image_settings: Optional[Dict[str, Any]] = None,
+                 history_settings: Optional[Dict[str, Any]] = None):
         self.docker_client = None
+        self.container_pool = None
+        self.kernel_manager = None
+        self.fork_server = None
+        self.sandbox_images = None
+        self.resource_stats = ResourceStats()
         self.active_executions = {}
-        self.execution_history = []
+        self._executions_lock = threading.Lock()
         self.resource_limits = {
             "max_memory": "512m",
             "max_cpu": "1.0",
             "max_disk": "1g",
-            "max_time": CONFIG.sandbox_timeout
+            "max_time": CONFIG.sandbox_timeout,
+            "max_output": 1024 * 1024,  # bytes retained/streamed per execution
+            "output_tail": 64 * 1024,  # bytes of tail kept per stream once over the cap
+            "max_open_files": 256
+        }
+        
+        # Sandbox images are prepared in the background; until one is ready its
+        # executions run locally ("fallback") or wait up to wait_timeout ("wait")
+        self.image_settings = {
+            "background": True,
+            "not_ready": "fallback",
+            "wait_timeout": 300.0,
+            "buildkit": True,
+            "build_timeout": 1800.0,
+            "images": {}  # language -> pre-built image reference, pulled instead of built
+        }
+        if image_settings:
+            self.image_settings.update(image_settings)
+        
+        # Recent executions in memory, older ones in an append-only log
+        self.history_settings = {
+            "capacity": 100,
+            "spill_path": default_spill_path(),
+            "max_spill_bytes": 64 * 1024 * 1024
+        }
+        if history_settings:
+            self.history_settings.update(history_settings)
+        self.execution_history = ExecutionHistory(
+            capacity=self.history_settings["capacity"],
+            spill_path=self.history_settings["spill_path"],
+            max_spill_bytes=self.history_settings["max_spill_bytes"]
+        )
+        
+        # Warm container pool configuration
+        self.pool_settings = {
+            "enabled": True,
+            "min_size": 1,
+            "max_size": 4,
+            "max_uses": 50,
+            "acquire_timeout": 5.0,
+            "health_check_interval": 30.0
+        }
+        if pool_settings:
+            self.pool_settings.update(pool_settings)
+        
+        # Per-session REPL kernel configuration
+        self.kernel_settings = {
+            "enabled": True,
+            "idle_timeout": 600.0,
+            "max_kernels": 8,
+            "reap_interval": 30.0
+        }
+        if kernel_settings:
+            self.kernel_settings.update(kernel_settings)
+        
+        # Local Python fallback: fork from a server with modules already imported
+        self.forkserver_settings = {
+            "enabled": True,
+            "preload": list(DEFAULT_PRELOAD)
+        }
+        if forkserver_settings:
+            self.forkserver_settings.update(forkserver_settings)
+        
+        # Results of deterministic executions, keyed by content hash
+        self.cache_settings = {
+            "max_entries": 256,
+            "max_bytes": 16 * 1024 * 1024
+        }
+        if cache_settings:
+            self.cache_settings.update(cache_settings)
+        self.result_cache = ResultCache(
+            max_entries=self.cache_settings["max_entries"],
+            max_bytes=self.cache_settings["max_bytes"]
+        )
+        
+        # Concurrency caps and host-headroom admission
+        self.scheduler_settings = {
+            "enabled": True,
+            "max_concurrent": 4,
+            "max_per_session": 2,
+            "memory_reserve": "256m",
+            "max_cpu_percent": 90.0,
+            "queue_timeout": 300.0
         }
+        if scheduler_settings:
+            self.scheduler_settings.update(scheduler_settings)
+        self.scheduler = None
+        if self.scheduler_settings["enabled"]:
+            self.scheduler = ExecutionScheduler(
+                max_concurrent=self.scheduler_settings["max_concurrent"],
+                max_per_session=self.scheduler_settings["max_per_session"],
+                memory_per_execution=parse_memory_limit(self.resource_limits["max_memory"]),
+                memory_reserve=parse_memory_limit(self.scheduler_settings["memory_reserve"]),
+                max_cpu_percent=self.scheduler_settings["max_cpu_percent"],
+                queue_timeout=self.scheduler_settings["queue_timeout"]
+            )
         
         # Security configuration
-        self.blocked_imports = [
-            "os.system", "subprocess.call", "eval", "exec", "open",
-            "__import__", "globals", "locals", "vars", "dir"
-        ]
+        self.code_validator = CodeValidator(policy=validation_policy)
         
         self.blocked_commands = CONFIG.blocked_commands
         
         # Initialize Docker client
         self._initialize_docker()
         
+        self._initialize_kernels()
+        
+        # Local Python also covers executions while sandbox images are still being prepared
+        if not self.sandbox_images or not self.sandbox_images.ready.is_set():
+            self._initialize_fork_server()
+        
         logger.info("Execution Sandbox initialized")
     
     def _initialize_docker(self):
@@ -84,18 +224,112 @@ class ExecutionSandbox:
             # Test Docker connection
             self.docker_client.ping()
             
-            # Build custom sandbox image if needed
-            self._ensure_sandbox_image()
-            
             logger.info("Docker client initialized successfully")
             
+            # The pool starts once every image is ready
+            self._initialize_images()
+        
         except Exception as e:
             logger.error(f"Failed to initialize Docker: {str(e)}")
             logger.warning("Falling back to local execution (less secure)")
+            # Leave nothing half set up (a client that failed ping, images that failed to resolve)
+            self.docker_client = None
+            self.sandbox_images = None
+    
+    def _initialize_images(self):
+        """Pin images that already exist, then pull or build the rest off the startup path"""
+        
+        self.sandbox_images = SandboxImages(
+            self.docker_client,
+            overrides=self.image_settings["images"],
+            buildkit=self.image_settings["buildkit"],
+            build_timeout=self.image_settings["build_timeout"],
+            on_ready=lambda images: self._initialize_pool()
+        )
+        self.sandbox_images.resolve_existing()
+        
+        if self.sandbox_images.ready.is_set():
+            return
+        
+        if self.image_settings["background"]:
+            logger.info("Preparing sandbox images in the background")
+            self.sandbox_images.start()
+        else:
+            self.sandbox_images.prepare()
+    
+    def _initialize_pool(self):
+        """Start the warm container pool (cold containers are used if this fails)"""
+        
+        if not self.pool_settings["enabled"] or self.container_pool:
+            return
+        
+        languages = [language for language in ("python", "javascript", "bash")
+                     if self.sandbox_images.is_ready(language)]
+        if not languages:
+            return
+        
+        try:
+            self.container_pool = ContainerPool(
+                self.docker_client,
+                image=self.sandbox_images.image,
+                resource_limits=self.resource_limits,
+                languages=languages,
+                min_size=self.pool_settings["min_size"],
+                max_size=self.pool_settings["max_size"],
+                max_uses=self.pool_settings["max_uses"],
+                acquire_timeout=self.pool_settings["acquire_timeout"],
+                health_check_interval=self.pool_settings["health_check_interval"]
+            )
+        except Exception as e:
+            logger.error(f"Failed to start container pool: {str(e)}")
+            self.container_pool = None
+    
+    def _initialize_kernels(self):
+        """Start the session kernel manager (docker-backed when docker is available)"""
+        
+        if not self.kernel_settings["enabled"]:
+            return
+        
+        try:
+            self.kernel_manager = SessionKernelManager(
+                self.docker_client,
+                image=self.sandbox_images.image if self.sandbox_images else None,
+                resource_limits=self.resource_limits,
+                idle_timeout=self.kernel_settings["idle_timeout"],
+                max_kernels=self.kernel_settings["max_kernels"],
+                reap_interval=self.kernel_settings["reap_interval"]
+            )
+        except Exception as e:
+            logger.error(f"Failed to start session kernels: {str(e)}")
+            self.kernel_manager = None
+    
+    def _initialize_fork_server(self):
+        """Start the fork server used for local Python execution (plain subprocesses if this fails)"""
+        
+        if not self.forkserver_settings["enabled"] or not hasattr(socket, "send_fds"):
+            return
+        
+        try:
+            self.fork_server = ForkServer(preload=self.forkserver_settings["preload"])
+        except Exception as e:
+            logger.error(f"Failed to start fork server: {str(e)}")
+            self.fork_server = None
     
     def execute_code(self, code: str, language: str = "python", 
-                    timeout: int = None, environment: Dict[str, str] = None) -> ExecutionResult:
-        """Execute code in a secure sandbox"""
+                    timeout: int = None, environment: Dict[str, str] = None,
+                    on_output: Optional[OutputCallback] = None,
+                    session_id: Optional[str] = None,
+                    deterministic: bool = False,
+                    priority: int = PRIORITY_NORMAL) -> ExecutionResult:
+        """Execute code in a secure sandbox
+        
+        on_output, if given, receives stdout/stderr chunks while the code runs.
+        With a session_id, Python and JavaScript run in that session's
+        long-lived kernel so imports and variables persist between calls.
+        deterministic marks the code as pure: it runs stateless, results are
+        cached by content and repeated runs return the cached result
+        (metadata cache_hit). priority orders queued executions, lower first.
+        """
         
         execution_id = str(uuid.uuid4())
         start_time = time.time()
@@ -110,20 +344,67 @@ class ExecutionSandbox:
                     error="Code validation failed - potentially unsafe content detected"
                 )
             
-            # Choose execution method
-            if self.docker_client:
-                result = self._execute_in_docker(code, language, timeout, environment, execution_id)
-            else:
-                result = self._execute_locally(code, language, timeout, environment, execution_id)
+            output = self._new_output_collector(execution_id, on_output)
+            
+            # None runs locally: no docker, or the image isn't ready yet
+            image = self._sandbox_image(language)
+            
+            # Session kernels carry state, so deterministic runs skip them and can be cached
+            cache_key = None
+            if deterministic:
+                cache_key = execution_cache_key(language, code, environment, self._image_digest(image))
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return self._cached_result(cached, output, start_time)
+            
+            with self._execution_slot(session_id, priority) as ticket:
+                start_time = time.time()
+                
+                # Choose execution method (docker-backed kernels need the image too)
+                use_kernel = session_id and not deterministic and self.kernel_manager and \
+                    language in KERNEL_LANGUAGES and (image or not self.docker_client)
+                if use_kernel:
+                    result = self._execute_in_session(code, language, timeout, session_id, output)
+                elif image:
+                    result = self._execute_in_docker(code, language, timeout, environment, execution_id, output)
+                else:
+                    result = self._execute_locally(code, language, timeout, environment, execution_id, output)
+            
+            if ticket:
+                result.metadata.update(ticket.metadata())
             
             # Update execution time
             result.execution_time = time.time() - start_time
+            self._record_usage(result)
+            
+            if cache_key:
+                result.metadata["cache_hit"] = False
+                # Timeouts and sandbox failures say nothing about the code itself
+                if result.error is None:
+                    self.result_cache.put(cache_key, result.to_dict())
             
             # Store in history
             self._store_execution_history(execution_id, code, language, result)
             
             return result
-            
+        
+        except QueueTimeout as e:
+            logger.warning(f"Execution {execution_id} not admitted: {str(e)}")
+            return ExecutionResult(
+                success=False,
+                error=f"Execution queue timeout: {str(e)}",
+                execution_time=time.time() - start_time,
+                metadata={"queue_wait": time.time() - start_time}
+            )
+        
+        except ImageNotReady as e:
+            logger.warning(f"Execution {execution_id} not started: {str(e)}")
+            return ExecutionResult(
+                success=False,
+                error=str(e),
+                execution_time=time.time() - start_time
+            )
+        
         except Exception as e:
             logger.error(f"Error executing code: {str(e)}")
             return ExecutionResult(
@@ -132,8 +413,25 @@ class ExecutionSandbox:
                 execution_time=time.time() - start_time
             )
     
+    def execute_code_stream(self, code: str, language: str = "python",
+                            timeout: int = None, environment: Dict[str, str] = None,
+                            session_id: Optional[str] = None,
+                            deterministic: bool = False,
+                            priority: int = PRIORITY_NORMAL) -> Iterator[Dict[str, Any]]:
+        """Execute code and yield output chunks as they arrive, then a final result event"""
+        
+        yield from self._stream_events(
+            lambda on_output: self.execute_code(
+                code, language, timeout, environment, on_output=on_output,
+                session_id=session_id, deterministic=deterministic, priority=priority
+            )
+        )
+    
     def execute_command(self, command: str, timeout: int = None, 
-                       working_dir: str = None, environment: Dict[str, str] = None) -> ExecutionResult:
+                       working_dir: str = None, environment: Dict[str, str] = None,
+                       on_output: Optional[OutputCallback] = None,
+                       session_id: Optional[str] = None,
+                       priority: int = PRIORITY_NORMAL) -> ExecutionResult:
         """Execute shell command in sandbox"""
         
         execution_id = str(uuid.uuid4())
@@ -149,20 +447,48 @@ class ExecutionSandbox:
                     error="Command validation failed - potentially unsafe command detected"
                 )
             
-            # Execute command
-            if self.docker_client:
-                result = self._execute_command_in_docker(command, timeout, working_dir, environment, execution_id)
-            else:
-                result = self._execute_command_locally(command, timeout, working_dir, environment, execution_id)
+            output = self._new_output_collector(execution_id, on_output)
+            
+            image = self._sandbox_image("shell")
+            
+            with self._execution_slot(session_id, priority) as ticket:
+                start_time = time.time()
+                
+                # Execute command
+                if image:
+                    result = self._execute_command_in_docker(command, timeout, working_dir, environment, execution_id, output)
+                else:
+                    result = self._execute_command_locally(command, timeout, working_dir, environment, execution_id, output)
+            
+            if ticket:
+                result.metadata.update(ticket.metadata())
             
             # Update execution time
             result.execution_time = time.time() - start_time
+            self._record_usage(result)
             
             # Store in history
             self._store_execution_history(execution_id, command, "shell", result)
             
             return result
-            
+        
+        except QueueTimeout as e:
+            logger.warning(f"Command {execution_id} not admitted: {str(e)}")
+            return ExecutionResult(
+                success=False,
+                error=f"Execution queue timeout: {str(e)}",
+                execution_time=time.time() - start_time,
+                metadata={"queue_wait": time.time() - start_time}
+            )
+        
+        except ImageNotReady as e:
+            logger.warning(f"Command {execution_id} not started: {str(e)}")
+            return ExecutionResult(
+                success=False,
+                error=str(e),
+                execution_time=time.time() - start_time
+            )
+        
         except Exception as e:
             logger.error(f"Error executing command: {str(e)}")
             return ExecutionResult(
@@ -171,76 +497,308 @@ class ExecutionSandbox:
                 execution_time=time.time() - start_time
             )
     
-    def _validate_code(self, code: str, language: str) -> bool:
-        """Validate code for security issues"""
+    def execute_command_stream(self, command: str, timeout: int = None,
+                               working_dir: str = None, environment: Dict[str, str] = None,
+                               session_id: Optional[str] = None,
+                               priority: int = PRIORITY_NORMAL) -> Iterator[Dict[str, Any]]:
+        """Execute a command and yield output chunks as they arrive, then a final result event"""
         
-        # Check for blocked imports/functions
-        for blocked in self.blocked_imports:
-            if blocked in code:
-                logger.warning(f"Blocked import/function detected: {blocked}")
-                return False
+        yield from self._stream_events(
+            lambda on_output: self.execute_command(
+                command, timeout, working_dir, environment, on_output=on_output,
+                session_id=session_id, priority=priority
+            )
+        )
+    
+    def execute_batch(self, snippets: List[Any], mode: str = "isolated", max_parallel: int = 1,
+                      stop_on_error: bool = False, session_id: Optional[str] = None,
+                      priority: int = PRIORITY_NORMAL) -> List[ExecutionResult]:
+        """Execute several snippets in one sandbox session per language
         
-        # Language-specific validation
-        if language == "python":
-            return self._validate_python_code(code)
-        elif language == "javascript":
-            return self._validate_javascript_code(code)
-        elif language == "bash":
-            return self._validate_bash_code(code)
+        snippets are code strings or dicts with code, language, timeout and
+        environment. In "shared" mode the snippets of a language run in order
+        in one session and see each other's workspace files; "isolated" resets
+        the workspace between snippets and can spread the batch over up to
+        max_parallel sandboxes. Results are returned in input order. Each
+        sandbox in use holds one scheduler slot.
+        """
         
-        return True
+        if mode not in ("isolated", "shared"):
+            raise ValueError(f"Unknown batch mode: {mode}")
+        
+        batch_id = str(uuid.uuid4())
+        jobs = [self._normalize_snippet(snippet) for snippet in snippets]
+        results: List[Optional[ExecutionResult]] = [None] * len(jobs)
+        
+        logger.info(f"Executing batch of {len(jobs)} snippets (ID: {batch_id}, mode: {mode})")
+        
+        by_language: Dict[str, List[int]] = {}
+        for index, job in enumerate(jobs):
+            if not self._validate_code(job["code"], job["language"]):
+                results[index] = ExecutionResult(
+                    success=False,
+                    error="Code validation failed - potentially unsafe content detected",
+                    metadata={"batch_id": batch_id, "batch_index": index}
+                )
+                continue
+            by_language.setdefault(job["language"], []).append(index)
+        
+        # Shared state needs one ordered session; isolated snippets can be striped
+        groups = []
+        for indices in by_language.values():
+            if mode == "shared" or max_parallel <= 1:
+                groups.append(indices)
+            else:
+                stripes = min(max_parallel, len(indices))
+                groups.extend(indices[k::stripes] for k in range(stripes))
+        
+        def run_group(indices: List[int]):
+            try:
+                with self._execution_slot(session_id, priority) as ticket:
+                    self._run_batch_group(indices, jobs, results, mode, stop_on_error, batch_id)
+            except QueueTimeout as e:
+                for index in indices:
+                    results[index] = ExecutionResult(
+                        success=False,
+                        error=f"Execution queue timeout: {str(e)}",
+                        metadata={"batch_id": batch_id, "batch_index": index, "batch_mode": mode}
+                    )
+                return
+            
+            if ticket:
+                for index in indices:
+                    results[index].metadata.update(ticket.metadata())
+        
+        if max_parallel > 1 and len(groups) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_parallel, len(groups))) as executor:
+                list(executor.map(run_group, groups))
+        else:
+            for indices in groups:
+                run_group(indices)
+        
+        return results
     
-    def _validate_python_code(self, code: str) -> bool:
-        """Validate Python code"""
+    def _normalize_snippet(self, snippet: Any) -> Dict[str, Any]:
+        """Turn a batch entry into a dict with code, language, timeout and environment"""
         
-        # Check for dangerous patterns
-        dangerous_patterns = [
-            "__import__", "exec(", "eval(", "open(", "file(",
-            "subprocess", "os.system", "os.popen", "os.spawn"
-        ]
+        if isinstance(snippet, str):
+            snippet = {"code": snippet}
         
-        for pattern in dangerous_patterns:
-            if pattern in code:
-                logger.warning(f"Dangerous Python pattern detected: {pattern}")
-                return False
+        return {
+            "code": snippet.get("code", ""),
+            "language": snippet.get("language", "python"),
+            "timeout": snippet.get("timeout"),
+            "environment": snippet.get("environment")
+        }
+    
+    def _run_batch_group(self, indices: List[int], jobs: List[Dict[str, Any]],
+                         results: List[Optional[ExecutionResult]], mode: str,
+                         stop_on_error: bool, batch_id: str):
+        """Run one language group of a batch in a single sandbox session"""
+        
+        language = jobs[indices[0]]["language"]
+        session = None
+        workspace = None
+        failed = False
         
-        # Try to compile the code
         try:
-            compile(code, "<string>", "exec")
-            return True
-        except SyntaxError as e:
-            logger.warning(f"Python syntax error: {str(e)}")
-            return False
+            if self._sandbox_image(language):
+                session = self._open_batch_session(language)
+            else:
+                workspace = tempfile.mkdtemp(prefix="ali_batch_")
+            
+            for position, index in enumerate(indices):
+                job = jobs[index]
+                metadata = {"batch_id": batch_id, "batch_index": index, "batch_mode": mode}
+                
+                if failed and stop_on_error:
+                    results[index] = ExecutionResult(
+                        success=False,
+                        error="Skipped after an earlier snippet failed",
+                        metadata=metadata
+                    )
+                    continue
+                
+                execution_id = str(uuid.uuid4())
+                output = self._new_output_collector(execution_id, None)
+                start_time = time.time()
+                
+                if session is not None:
+                    pooled, method = session
+                    if mode == "isolated" and position > 0 and not reset_container(pooled):
+                        session = self._replace_batch_session(session, language)
+                        pooled, method = session
+                    
+                    result, dirty = self._run_in_container(
+                        pooled, job["code"], job["language"], job["timeout"],
+                        job["environment"], execution_id, output, method
+                    )
+                    if dirty:
+                        session = self._replace_batch_session(session, language)
+                else:
+                    if mode == "isolated" and position > 0:
+                        shutil.rmtree(workspace, ignore_errors=True)
+                        os.makedirs(workspace, exist_ok=True)
+                    result = self._execute_locally(
+                        job["code"], job["language"], job["timeout"],
+                        job["environment"], execution_id, output, cwd=workspace
+                    )
+                
+                result.execution_time = time.time() - start_time
+                result.metadata.update(metadata)
+                self._record_usage(result)
+                results[index] = result
+                failed = failed or not result.success
+                
+                self._store_execution_history(execution_id, job["code"], job["language"], result)
+        
+        except Exception as e:
+            logger.error(f"Batch execution error: {str(e)}")
+            for index in indices:
+                if results[index] is None:
+                    results[index] = ExecutionResult(
+                        success=False,
+                        error=f"Batch execution failed: {str(e)}",
+                        metadata={"batch_id": batch_id, "batch_index": index, "batch_mode": mode}
+                    )
+        
+        finally:
+            if session is not None:
+                self._close_batch_session(session, dirty=False)
+            if workspace:
+                shutil.rmtree(workspace, ignore_errors=True)
     
-    def _validate_javascript_code(self, code: str) -> bool:
-        """Validate JavaScript code"""
+    def _open_batch_session(self, language: str) -> Tuple[PooledContainer, str]:
+        """Get a container for a batch: pooled if possible, else a dedicated one"""
         
-        dangerous_patterns = [
-            "eval(", "Function(", "setTimeout(", "setInterval(",
-            "require(", "import(", "process.exit", "process.kill"
-        ]
+        if self.container_pool:
+            pooled = self.container_pool.acquire(self._pool_language(language))
+            if pooled is not None:
+                return pooled, "docker_pool"
         
-        for pattern in dangerous_patterns:
-            if pattern in code:
-                logger.warning(f"Dangerous JavaScript pattern detected: {pattern}")
-                return False
+        pooled = start_session_container(
+            self.docker_client, self.sandbox_images.image(language), self.resource_limits, language
+        )
+        return pooled, "docker_session"
+    
+    def _close_batch_session(self, session: Tuple[PooledContainer, str], dirty: bool):
+        """Return a batch container to the pool or remove a dedicated one"""
         
-        return True
+        pooled, method = session
+        if method == "docker_pool":
+            self.container_pool.release(pooled, dirty=dirty)
+        else:
+            remove_container(pooled)
     
-    def _validate_bash_code(self, code: str) -> bool:
-        """Validate Bash code"""
+    def _replace_batch_session(self, session: Tuple[PooledContainer, str],
+                               language: str) -> Tuple[PooledContainer, str]:
+        """Swap a batch's container for a fresh one after it became unusable"""
         
-        dangerous_patterns = [
-            "rm -rf", "format", "dd if=", "mkfs", "shutdown", "reboot",
-            ":(){ :|:& };:", "chmod 777", "sudo", "su -"
-        ]
+        self._close_batch_session(session, dirty=True)
+        return self._open_batch_session(language)
+    
+    def _pool_language(self, language: str) -> str:
+        """Pool key for a language (shell shares the bash containers)"""
+        return "bash" if language == "shell" else language
+    
+    def _cached_result(self, cached: Dict[str, Any], output: OutputCollector,
+                       start_time: float) -> ExecutionResult:
+        """Rebuild a cached result and replay its output to any listener"""
         
-        for pattern in dangerous_patterns:
-            if pattern in code:
-                logger.warning(f"Dangerous Bash pattern detected: {pattern}")
-                return False
+        result = ExecutionResult.from_dict(cached)
+        result.metadata["cached_execution_time"] = result.execution_time
+        result.metadata["cache_hit"] = True
         
-        return True
+        output.feed("stdout", result.stdout.encode("utf-8"))
+        output.feed("stderr", result.stderr.encode("utf-8"))
+        
+        result.execution_time = time.time() - start_time
+        return result
+    
+    def _sandbox_image(self, language: str) -> Optional[str]:
+        """Pinned image to run language in, None to run locally
+        
+        Raises ImageNotReady if the image isn't ready and image_settings
+        says to wait rather than fall back.
+        """
+        
+        if not self.docker_client or not self.sandbox_images:
+            return None
+        
+        image = self.sandbox_images.image(language)
+        if image is None and self.image_settings["not_ready"] == "wait":
+            image = self.sandbox_images.wait(language, self.image_settings["wait_timeout"])
+        
+        return image
+    
+    def _image_digest(self, image: Optional[str]) -> str:
+        """Identity of the runtime executing code, part of the result cache key"""
+        
+        # Local runs depend on the host interpreter instead of an image
+        return image or f"local:{sys.executable}:{sys.version}"
+    
+    def get_image_status(self) -> Dict[str, Any]:
+        """Sandbox image readiness, pinned ids and build state per language"""
+        
+        if not self.sandbox_images:
+            return {"ready": False, "docker": False, "images": {}}
+        
+        status = self.sandbox_images.get_status()
+        status["docker"] = True
+        return status
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get deterministic result cache statistics"""
+        return self.result_cache.get_stats()
+    
+    def clear_result_cache(self):
+        """Drop all cached deterministic results"""
+        self.result_cache.clear()
+    
+    def get_validation_stats(self) -> Dict[str, Any]:
+        """Get code validation verdict cache statistics"""
+        return self.code_validator.get_stats()
+    
+    def _stream_events(self, run: Callable[[OutputCallback], ExecutionResult]) -> Iterator[Dict[str, Any]]:
+        """Run an execution on a worker thread and yield its output events in order"""
+        
+        events = queue.Queue()
+        
+        def worker():
+            try:
+                result = run(events.put)
+                events.put({"type": "result", "result": result.to_dict()})
+            except Exception as e:
+                events.put({"type": "result", "result": ExecutionResult(success=False, error=str(e)).to_dict()})
+            finally:
+                events.put(None)
+        
+        threading.Thread(target=worker, name="sandbox-stream", daemon=True).start()
+        
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            yield event
+    
+    def _new_output_collector(self, execution_id: str,
+                              on_output: Optional[OutputCallback]) -> OutputCollector:
+        """Create the bounded output collector for one execution"""
+        return OutputCollector(
+            max_bytes=self.resource_limits["max_output"],
+            tail_bytes=self.resource_limits["output_tail"],
+            on_output=on_output,
+            execution_id=execution_id
+        )
+    
+    def _validate_code(self, code: str, language: str) -> bool:
+        """Validate code for security issues"""
+        
+        verdict = self.code_validator.validate(code, language)
+        if not verdict.allowed:
+            logger.warning(f"Code validation failed ({language}): {verdict.reason}")
+        
+        return verdict.allowed
     
     def _validate_command(self, command: str) -> bool:
         """Validate shell command"""
@@ -253,79 +811,60 @@ class ExecutionSandbox:
         return True
     
     def _execute_in_docker(self, code: str, language: str, timeout: int, 
-                          environment: Dict[str, str], execution_id: str) -> ExecutionResult:
+                          environment: Dict[str, str], execution_id: str,
+                          output: OutputCollector) -> ExecutionResult:
         """Execute code in Docker container"""
         
+        if self.container_pool:
+            result = self._execute_in_pool(code, language, timeout, environment, execution_id, output)
+            if result is not None:
+                return result
+        
+        container = None
+        
         try:
-            # Create temporary file for code
-            with tempfile.NamedTemporaryFile(mode='w', suffix=self._get_file_extension(language), 
-                                           delete=False) as f:
-                f.write(code)
-                code_file = f.name
-            
-            # Prepare Docker run parameters
-            volumes = {
-                os.path.dirname(code_file): {"bind": "/workspace", "mode": "rw"}
-            }
-            
             environment = environment or {}
             environment.update({
                 "PYTHONUNBUFFERED": "1",
                 "EXECUTION_ID": execution_id
             })
             
-            # Run container
-            container = self.docker_client.containers.run(
-                image="ali-sandbox:latest",
-                command=self._get_execution_command(language, os.path.basename(code_file)),
-                volumes=volumes,
+            # Create container; code arrives over stdin into a tmpfs workspace
+            container = self.docker_client.containers.create(
+                image=self.sandbox_images.image(language),
+                command=self._get_stdin_command(language),
                 environment=environment,
                 mem_limit=self.resource_limits["max_memory"],
                 cpu_quota=int(float(self.resource_limits["max_cpu"]) * 100000),
                 working_dir="/workspace",
-                detach=True,
-                remove=True,
+                tmpfs={"/workspace": "rw,size=64m,mode=1777"},
+                stdin_open=True,
+                stdin_once=True,
                 network_disabled=True,  # Disable network access
                 cap_drop=["ALL"],  # Drop all capabilities
                 security_opt=["no-new-privileges:true"]
             )
             
             # Track active execution
-            self.active_executions[execution_id] = container
+            self._track_execution(execution_id, container)
             
-            # Wait for completion with timeout
             timeout = timeout or self.resource_limits["max_time"]
             
             try:
-                container.wait(timeout=timeout)
-                
-                # Get logs
-                logs = container.logs(stdout=True, stderr=True).decode('utf-8')
-                
-                # Parse stdout/stderr
-                stdout_lines = []
-                stderr_lines = []
-                
-                for line in logs.split('\\n'):
-                    if line.startswith("STDERR: "):
-                        stderr_lines.append(line[8:])
-                    else:
-                        stdout_lines.append(line)
-                
-                stdout = '\\n'.join(stdout_lines)
-                stderr = '\\n'.join(stderr_lines)
+                stdin = container.attach_socket(params={"stdin": 1, "stream": 1})
+                container.start()
+                sampler = ContainerUsageSampler(self.docker_client, container.id, fresh=True).start()
+                self._send_stdin(stdin, code.encode("utf-8"))
                 
-                # Get exit code
-                exit_code = container.wait()["StatusCode"]
+                exit_code, timed_out = self._stream_container(container, output, timeout)
+                usage = sampler.stop()
                 
-                return ExecutionResult(
-                    success=exit_code == 0,
-                    stdout=stdout,
-                    stderr=stderr,
-                    exit_code=exit_code,
-                    metadata={"execution_method": "docker", "container_id": container.id}
+                return self._build_result(
+                    output, exit_code, timed_out, timeout,
+                    {"execution_method": "docker", "container_id": container.id},
+                    usage=usage, oom=usage.pop("oom_killed") or self._container_oom_killed(container)
                 )
-                
+            
             except docker.errors.ContainerError as e:
                 logger.error(f"Container execution error: {str(e)}")
                 return ExecutionResult(
@@ -333,18 +872,11 @@ class ExecutionSandbox:
                     error=f"Container execution failed: {str(e)}",
                     metadata={"execution_method": "docker"}
                 )
-                
+            
             finally:
                 # Clean up
-                if execution_id in self.active_executions:
-                    del self.active_executions[execution_id]
-                
-                # Remove temporary file
-                try:
-                    os.unlink(code_file)
-                except:
-                    pass
-                
+                self._untrack_execution(execution_id)
+        
         except Exception as e:
             logger.error(f"Docker execution error: {str(e)}")
             return ExecutionResult(
@@ -352,74 +884,224 @@ class ExecutionSandbox:
                 error=f"Docker execution failed: {str(e)}",
                 metadata={"execution_method": "docker"}
             )
+        
+        finally:
+            if container is not None:
+                try:
+                    container.remove(force=True)
+                except Exception:
+                    pass
+    
+    def _execute_in_session(self, code: str, language: str, timeout: int, session_id: str,
+                            output: OutputCollector) -> ExecutionResult:
+        """Execute code in the session's persistent kernel"""
+        
+        timeout = timeout or self.resource_limits["max_time"]
+        
+        try:
+            kernel, started = self.kernel_manager.get_kernel(session_id, language)
+        except Exception as e:
+            logger.error(f"Failed to start session kernel: {str(e)}")
+            return ExecutionResult(
+                success=False,
+                error=f"Session kernel failed to start: {str(e)}",
+                metadata={"execution_method": "session_kernel", "session_id": session_id}
+            )
+        
+        status, error, usage = kernel.execute(code, timeout, output)
+        
+        metadata = {
+            "execution_method": "session_kernel",
+            "session_id": session_id,
+            "kernel_id": kernel.kernel_id,
+            "kernel_started": started,
+            "kernel_executions": kernel.executions,
+            # State built by earlier calls is gone after a timeout or crash
+            "kernel_state_lost": status in ("timeout", "died")
+        }
+        
+        if status == "timeout":
+            return self._build_result(output, -1, True, timeout, metadata,
+                                      timeout_error="Session kernel killed: execution timeout", usage=usage)
+        
+        result = self._build_result(output, 0 if status == "ok" else 1, False, timeout, metadata, usage=usage)
+        if status == "died":
+            result.error = error or "Session kernel exited"
+        return result
+    
+    def reset_session(self, session_id: str, language: Optional[str] = None) -> bool:
+        """Discard a session's kernels; the next execution starts a fresh interpreter"""
+        
+        if not self.kernel_manager:
+            return False
+        
+        return self.kernel_manager.reset(session_id, language) > 0
+    
+    def get_session_kernels(self) -> List[Dict[str, Any]]:
+        """Get running session kernels"""
+        
+        if not self.kernel_manager:
+            return []
+        
+        return self.kernel_manager.get_kernels()
+    
+    @contextlib.contextmanager
+    def _execution_slot(self, session_id: Optional[str], priority: int):
+        """Hold a scheduler slot (yields the ticket, or None when scheduling is off)"""
+        
+        if not self.scheduler:
+            yield None
+            return
+        
+        with self.scheduler.slot(session_id, priority) as ticket:
+            yield ticket
+    
+    def get_scheduler_status(self) -> Dict[str, Any]:
+        """Get execution queue and concurrency status"""
+        
+        if not self.scheduler:
+            return {"enabled": False}
+        
+        status = self.scheduler.get_status()
+        status["enabled"] = True
+        return status
+    
+    def _track_execution(self, execution_id: str, handle: Any):
+        with self._executions_lock:
+            self.active_executions[execution_id] = handle
+    
+    def _untrack_execution(self, execution_id: str):
+        with self._executions_lock:
+            self.active_executions.pop(execution_id, None)
+    
+    def _execute_in_pool(self, code: str, language: str, timeout: int,
+                         environment: Dict[str, str], execution_id: str,
+                         output: OutputCollector) -> Optional[ExecutionResult]:
+        """Execute code with exec in a warm pooled container, None if none is available"""
+        
+        pooled = self.container_pool.acquire(self._pool_language(language))
+        
+        if pooled is None:
+            return None
+        
+        dirty = True
+        try:
+            result, dirty = self._run_in_container(
+                pooled, code, language, timeout, environment, execution_id, output, "docker_pool"
+            )
+            return result
+        finally:
+            self.container_pool.release(pooled, dirty=dirty)
+    
+    def _run_in_container(self, pooled: PooledContainer, code: str, language: str, timeout: int,
+                          environment: Dict[str, str], execution_id: str, output: OutputCollector,
+                          execution_method: str) -> Tuple[ExecutionResult, bool]:
+        """Exec one snippet in a running session container; returns (result, container_dirty)"""
+        
+        timeout = timeout or self.resource_limits["max_time"]
+        
+        environment = dict(environment or {})
+        environment.update({
+            "PYTHONUNBUFFERED": "1",
+            "EXECUTION_ID": execution_id
+        })
+        
+        # Track active execution
+        self._track_execution(execution_id, pooled)
+        
+        try:
+            # coreutils timeout kills the snippet without touching the container
+            command = ["timeout", "-s", "KILL", str(timeout)] + self._get_stdin_command(language)
+            
+            # The container runs one execution at a time, so its counters are ours
+            sampler = ContainerUsageSampler(self.docker_client, pooled.id).start()
+            started = time.time()
+            exit_code = self._exec_with_stdin(pooled.id, command, code.encode("utf-8"), environment, output)
+            elapsed = time.time() - started
+            usage = sampler.stop()
+            
+            # timeout(1) exits 124, or 137 with -s KILL; a SIGKILL before the deadline is the OOM killer
+            killed = exit_code in (124, 137)
+            oom = usage.pop("oom_killed") or (exit_code == 137 and elapsed < timeout)
+            timed_out = killed and not oom
+            
+            result = self._build_result(
+                output, exit_code, timed_out, timeout,
+                {
+                    "execution_method": execution_method,
+                    "container_id": pooled.id,
+                    "container_uses": pooled.uses
+                },
+                usage=usage, oom=oom
+            )
+            # Killed mid-run: leftover state is unknown
+            return result, killed
+        
+        except Exception as e:
+            logger.error(f"Container exec error: {str(e)}")
+            return ExecutionResult(
+                success=False,
+                error=f"Container exec failed: {str(e)}",
+                metadata={"execution_method": execution_method, "container_id": pooled.id}
+            ), True
+        
+        finally:
+            self._untrack_execution(execution_id)
     
     def _execute_locally(self, code: str, language: str, timeout: int, 
-                        environment: Dict[str, str], execution_id: str) -> ExecutionResult:
+                        environment: Dict[str, str], execution_id: str,
+                        output: OutputCollector, cwd: Optional[str] = None) -> ExecutionResult:
         """Execute code locally (fallback - less secure)"""
         
         logger.warning("Executing code locally - reduced security")
         
+        if language == "python" and self.fork_server:
+            return self._execute_forked(code, timeout, environment, execution_id, output, cwd)
+        
         try:
-            # Create temporary file for code
-            with tempfile.NamedTemporaryFile(mode='w', suffix=self._get_file_extension(language), 
-                                           delete=False) as f:
-                f.write(code)
-                code_file = f.name
+            # Code is piped to the interpreter's stdin, nothing touches disk
+            command = self._get_stdin_command(language, local=True)
             
-            # Prepare command
-            command = self._get_execution_command(language, code_file)
-            
-            # Set up environment
-            env = os.environ.copy()
-            if environment:
-                env.update(environment)
+            # Set up environment: none of the backend's own variables
+            env = local_environment(environment, cwd or tempfile.gettempdir())
             
             # Execute with timeout
             timeout = timeout or self.resource_limits["max_time"]
             
             process = subprocess.Popen(
                 command,
-                shell=True,
+                stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
                 env=env,
-                cwd=tempfile.gettempdir()
+                cwd=cwd or tempfile.gettempdir(),
+                start_new_session=True
             )
             
             # Track active execution
-            self.active_executions[execution_id] = process
+            self._track_execution(execution_id, process)
+            
+            # Write from a thread so large snippets can't deadlock against output
+            writer = threading.Thread(
+                target=self._write_stdin, args=(process.stdin, code.encode("utf-8")), daemon=True
+            )
+            writer.start()
             
             try:
-                stdout, stderr = process.communicate(timeout=timeout)
+                timed_out, usage = self._stream_process(process, output, timeout)
                 
-                return ExecutionResult(
-                    success=process.returncode == 0,
-                    stdout=stdout,
-                    stderr=stderr,
-                    exit_code=process.returncode,
-                    metadata={"execution_method": "local", "pid": process.pid}
+                return self._build_result(
+                    output, process.returncode, timed_out, timeout,
+                    {"execution_method": "local", "pid": process.pid},
+                    usage=usage
                 )
-                
-            except subprocess.TimeoutExpired:
-                process.kill()
-                return ExecutionResult(
-                    success=False,
-                    error=f"Execution timeout after {timeout} seconds",
-                    metadata={"execution_method": "local"}
-                )
-                
+            
             finally:
                 # Clean up
-                if execution_id in self.active_executions:
-                    del self.active_executions[execution_id]
-                
-                # Remove temporary file
-                try:
-                    os.unlink(code_file)
-                except:
-                    pass
+                self._untrack_execution(execution_id)
                 
+                writer.join(timeout=1)
+        
         except Exception as e:
             logger.error(f"Local execution error: {str(e)}")
             return ExecutionResult(
@@ -428,10 +1110,56 @@ class ExecutionSandbox:
                 metadata={"execution_method": "local"}
             )
     
+    def _execute_forked(self, code: str, timeout: int, environment: Dict[str, str],
+                        execution_id: str, output: OutputCollector,
+                        cwd: Optional[str] = None) -> ExecutionResult:
+        """Execute Python in a child forked from the preloaded fork server"""
+        
+        timeout = timeout or self.resource_limits["max_time"]
+        
+        # The same filtered environment as the subprocess path; the child clears its own first
+        env = local_environment(environment, cwd or tempfile.gettempdir())
+        
+        limits = {
+            "RLIMIT_CPU": int(timeout) + 1,
+            "RLIMIT_AS": parse_memory_limit(self.resource_limits["max_memory"]),
+            "RLIMIT_NOFILE": self.resource_limits["max_open_files"]
+        }
+        
+        def track(execution: ForkedExecution):
+            self._track_execution(execution_id, execution)
+        
+        try:
+            exit_code, timed_out, usage = self.fork_server.run(
+                code, timeout, env, cwd or tempfile.gettempdir(), limits, output, on_start=track
+            )
+            
+            with self._executions_lock:
+                execution = self.active_executions.get(execution_id)
+            return self._build_result(
+                output, exit_code, timed_out, timeout,
+                {"execution_method": "local_fork", "pid": getattr(execution, "pid", None)},
+                usage=usage
+            )
+        
+        except Exception as e:
+            logger.error(f"Forked execution error: {str(e)}")
+            return ExecutionResult(
+                success=False,
+                error=f"Forked execution failed: {str(e)}",
+                metadata={"execution_method": "local_fork"}
+            )
+        
+        finally:
+            self._untrack_execution(execution_id)
+    
     def _execute_command_in_docker(self, command: str, timeout: int, working_dir: str, 
-                                  environment: Dict[str, str], execution_id: str) -> ExecutionResult:
+                                  environment: Dict[str, str], execution_id: str,
+                                  output: OutputCollector) -> ExecutionResult:
         """Execute command in Docker container"""
         
+        container = None
+        
         try:
             # Prepare Docker run parameters
             volumes = {}
@@ -441,56 +1169,49 @@ class ExecutionSandbox:
             environment = environment or {}
             environment.update({"EXECUTION_ID": execution_id})
             
-            # Run container
-            container = self.docker_client.containers.run(
-                image="ali-sandbox:latest",
+            # Create, then start: an auto-removed container can vanish before its
+            # output, exit code and OOM state are read, so it is removed below instead
+            container = self.docker_client.containers.create(
+                image=self.sandbox_images.image("shell"),
                 command=["sh", "-c", command],
                 volumes=volumes,
                 environment=environment,
                 mem_limit=self.resource_limits["max_memory"],
                 cpu_quota=int(float(self.resource_limits["max_cpu"]) * 100000),
                 working_dir="/workspace" if working_dir else "/tmp",
-                detach=True,
-                remove=True,
                 network_disabled=True,
                 cap_drop=["ALL"],
                 security_opt=["no-new-privileges:true"]
             )
             
             # Track active execution
-            self.active_executions[execution_id] = container
+            self._track_execution(execution_id, container)
             
-            # Wait for completion
             timeout = timeout or self.resource_limits["max_time"]
             
             try:
-                container.wait(timeout=timeout)
+                container.start()
+                sampler = ContainerUsageSampler(self.docker_client, container.id, fresh=True).start()
+                exit_code, timed_out = self._stream_container(container, output, timeout)
+                usage = sampler.stop()
                 
-                # Get logs
-                logs = container.logs(stdout=True, stderr=True).decode('utf-8')
-                
-                # Get exit code
-                exit_code = container.wait()["StatusCode"]
-                
-                return ExecutionResult(
-                    success=exit_code == 0,
-                    stdout=logs,
-                    stderr="",
-                    exit_code=exit_code,
-                    metadata={"execution_method": "docker", "container_id": container.id}
+                return self._build_result(
+                    output, exit_code, timed_out, timeout,
+                    {"execution_method": "docker", "container_id": container.id},
+                    timeout_error="Command timeout",
+                    usage=usage, oom=usage.pop("oom_killed") or self._container_oom_killed(container)
                 )
-                
+            
             except docker.errors.ContainerError as e:
                 return ExecutionResult(
                     success=False,
                     error=f"Container command failed: {str(e)}",
                     metadata={"execution_method": "docker"}
                 )
-                
+            
             finally:
-                if execution_id in self.active_executions:
-                    del self.active_executions[execution_id]
-                
+                self._untrack_execution(execution_id)
+        
         except Exception as e:
             logger.error(f"Docker command execution error: {str(e)}")
             return ExecutionResult(
@@ -498,9 +1219,17 @@ class ExecutionSandbox:
                 error=f"Docker command execution failed: {str(e)}",
                 metadata={"execution_method": "docker"}
             )
+        
+        finally:
+            if container is not None:
+                try:
+                    container.remove(force=True)
+                except Exception:
+                    pass
     
     def _execute_command_locally(self, command: str, timeout: int, working_dir: str, 
-                               environment: Dict[str, str], execution_id: str) -> ExecutionResult:
+                               environment: Dict[str, str], execution_id: str,
+                               output: OutputCollector) -> ExecutionResult:
         """Execute command locally"""
         
         logger.warning("Executing command locally - reduced security")
@@ -519,37 +1248,27 @@ class ExecutionSandbox:
                 shell=True,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
                 env=env,
-                cwd=working_dir or tempfile.gettempdir()
+                cwd=working_dir or tempfile.gettempdir(),
+                start_new_session=True
             )
             
             # Track active execution
-            self.active_executions[execution_id] = process
+            self._track_execution(execution_id, process)
             
             try:
-                stdout, stderr = process.communicate(timeout=timeout)
-                
-                return ExecutionResult(
-                    success=process.returncode == 0,
-                    stdout=stdout,
-                    stderr=stderr,
-                    exit_code=process.returncode,
-                    metadata={"execution_method": "local", "pid": process.pid}
-                )
+                timed_out, usage = self._stream_process(process, output, timeout)
                 
-            except subprocess.TimeoutExpired:
-                process.kill()
-                return ExecutionResult(
-                    success=False,
-                    error=f"Command timeout after {timeout} seconds",
-                    metadata={"execution_method": "local"}
+                return self._build_result(
+                    output, process.returncode, timed_out, timeout,
+                    {"execution_method": "local", "pid": process.pid},
+                    timeout_error="Command timeout",
+                    usage=usage
                 )
-                
+            
             finally:
-                if execution_id in self.active_executions:
-                    del self.active_executions[execution_id]
-                
+                self._untrack_execution(execution_id)
+        
         except Exception as e:
             logger.error(f"Local command execution error: {str(e)}")
             return ExecutionResult(
@@ -558,115 +1277,218 @@ class ExecutionSandbox:
                 metadata={"execution_method": "local"}
             )
     
-    def _get_file_extension(self, language: str) -> str:
-        """Get file extension for language"""
-        extensions = {
-            "python": ".py",
-            "javascript": ".js",
-            "bash": ".sh",
-            "shell": ".sh"
-        }
-        return extensions.get(language, ".txt")
+    def _stream_container(self, container, output: OutputCollector, timeout: int) -> Tuple[int, bool]:
+        """Stream a container's demuxed output until it exits; returns (exit_code, timed_out)"""
+        
+        timed_out = threading.Event()
+        
+        def kill_on_timeout():
+            timed_out.set()
+            try:
+                container.kill()
+            except Exception:
+                pass
+        
+        killer = threading.Timer(timeout, kill_on_timeout)
+        killer.daemon = True
+        killer.start()
+        
+        try:
+            # logs=True replays anything written before we attached
+            for stdout_chunk, stderr_chunk in container.attach(
+                stdout=True, stderr=True, stream=True, logs=True, demux=True
+            ):
+                output.feed("stdout", stdout_chunk)
+                output.feed("stderr", stderr_chunk)
+            
+            exit_code = container.wait(timeout=timeout)["StatusCode"]
+        finally:
+            killer.cancel()
+        
+        return exit_code, timed_out.is_set()
+    
+    def _stream_process(self, process: subprocess.Popen, output: OutputCollector,
+                        timeout: int) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Pump a local process's pipes into the collector; returns (timed_out, resource usage)"""
+        
+        readers = [
+            threading.Thread(target=pump_stream, args=(process.stdout, output, "stdout"), daemon=True),
+            threading.Thread(target=pump_stream, args=(process.stderr, output, "stderr"), daemon=True)
+        ]
+        for reader in readers:
+            reader.start()
+        
+        expired = threading.Event()
+        
+        def kill_on_timeout():
+            expired.set()
+            # Kill the whole session so children holding the pipes die too
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (OSError, AttributeError):
+                process.kill()
+        
+        killer = threading.Timer(timeout, kill_on_timeout)
+        killer.daemon = True
+        killer.start()
+        
+        usage = None
+        try:
+            if hasattr(os, "wait4"):
+                # Reap it ourselves to get the child's own rusage
+                _, status, rusage = os.wait4(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+                usage = usage_from_rusage(rusage)
+            else:
+                process.wait()
+        except ChildProcessError:
+            process.wait()
+        finally:
+            killer.cancel()
+        
+        for reader in readers:
+            reader.join(timeout=5)
+        
+        return expired.is_set(), usage
+    
+    def _build_result(self, output: OutputCollector, exit_code: int, timed_out: bool, timeout: int,
+                      metadata: Dict[str, Any], timeout_error: str = "Execution timeout",
+                      usage: Optional[Dict[str, Any]] = None, oom: bool = False) -> ExecutionResult:
+        """Build an ExecutionResult from collected output and resource usage"""
+        
+        stderr = output.stderr
+        
+        # Under RLIMIT_AS running out of memory surfaces as a MemoryError, not a kill
+        if exit_code and not oom:
+            lines = stderr.rstrip().rsplit("\n", 1)
+            oom = lines[-1].startswith("MemoryError")
+        
+        metadata.update(output.metadata())
+        metadata["resources"] = usage or {}
+        metadata["exit_reason"] = exit_reason(exit_code, timed_out, oom)
+        
+        error = None
+        if timed_out:
+            error = f"{timeout_error} after {timeout} seconds"
+        elif metadata["exit_reason"] == "cpu_limit":
+            error = "CPU time limit exceeded"
+        
+        return ExecutionResult(
+            success=exit_code == 0 and not timed_out,
+            stdout=output.stdout,
+            stderr=stderr,
+            exit_code=exit_code,
+            error=error,
+            metadata=metadata
+        )
+    
+    def _container_oom_killed(self, container) -> bool:
+        """Whether docker recorded an OOM kill for an exited container"""
+        
+        try:
+            container.reload()
+            return bool(container.attrs.get("State", {}).get("OOMKilled"))
+        except Exception:
+            return False
     
-    def _get_execution_command(self, language: str, filename: str) -> str:
-        """Get execution command for language"""
+    def _record_usage(self, result: ExecutionResult):
+        """Feed an execution's resource usage into the aggregate histograms"""
+        
+        if "exit_reason" not in result.metadata:
+            return
+        
+        self.resource_stats.record(
+            result.metadata.get("resources") or {},
+            result.execution_time,
+            result.metadata["exit_reason"],
+            result.metadata.get("execution_method")
+        )
+    
+    def get_resource_stats(self) -> Dict[str, Any]:
+        """Get histograms of wall time, CPU time, peak memory and I/O across executions"""
+        return self.resource_stats.summary()
+    
+    def _get_stdin_command(self, language: str, local: bool = False) -> List[str]:
+        """Get an argv whose interpreter reads the program from stdin"""
         commands = {
-            "python": f"python {filename}",
-            "javascript": f"node {filename}",
-            "bash": f"bash {filename}",
-            "shell": f"bash {filename}"
+            "python": [sys.executable if local else "python", "-"],
+            "javascript": ["node", "-"],
+            "bash": ["bash", "-s"],
+            "shell": ["bash", "-s"]
         }
-        return commands.get(language, f"cat {filename}")
+        return commands.get(language, ["cat"])
     
-    def _ensure_sandbox_image(self):
-        """Ensure sandbox Docker image exists"""
+    def _exec_with_stdin(self, container_id: str, command: List[str], stdin_data: bytes,
+                         environment: Dict[str, str], output: OutputCollector) -> int:
+        """Run command in a running container, feeding stdin_data and streaming output"""
+        
+        api = self.docker_client.api
+        exec_id = api.exec_create(
+            container_id, command, stdin=True, environment=environment, workdir="/workspace"
+        )["Id"]
+        
+        sock = api.exec_start(exec_id, socket=True)
         try:
-            # Check if image exists
-            self.docker_client.images.get("ali-sandbox:latest")
-            logger.info("Sandbox image found")
-        except docker.errors.ImageNotFound:
-            logger.info("Building sandbox image...")
-            self._build_sandbox_image()
-    
-    def _build_sandbox_image(self):
-        """Build sandbox Docker image"""
-        dockerfile = """
-        FROM python:3.9-slim
-        
-        # Install basic tools
-        RUN apt-get update && apt-get install -y \\
-            nodejs npm bash curl wget git \\
-            && rm -rf /var/lib/apt/lists/*
-        
-        # Create non-root user
-        RUN useradd -m -u 1000 sandbox
-        
-        # Set working directory
-        WORKDIR /workspace
-        
-        # Change to non-root user
-        USER sandbox
-        
-        # Set default command
-        CMD ["python", "--version"]
-        """
+            self._send_stdin(sock, stdin_data)
+            
+            # Multiplexed frames: stream id 1 is stdout, 2 is stderr
+            for stream_id, data in frames_iter(sock, tty=False):
+                output.feed("stderr" if stream_id == STDERR else "stdout", data)
+        finally:
+            sock.close()
+        
+        return api.exec_inspect(exec_id)["ExitCode"]
+    
+    def _send_stdin(self, sock, data: bytes):
+        """Write data to an attached docker socket, then half-close it to signal EOF"""
         
+        raw = getattr(sock, "_sock", sock)
+        raw.sendall(data)
         try:
-            # Create temporary directory for build context
-            with tempfile.TemporaryDirectory() as temp_dir:
-                dockerfile_path = os.path.join(temp_dir, "Dockerfile")
-                with open(dockerfile_path, "w") as f:
-                    f.write(dockerfile)
-                
-                # Build image
-                self.docker_client.images.build(
-                    path=temp_dir,
-                    tag="ali-sandbox:latest",
-                    rm=True
-                )
-                
-                logger.info("Sandbox image built successfully")
-                
-        except Exception as e:
-            logger.error(f"Failed to build sandbox image: {str(e)}")
-            raise
+            raw.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+    
+    def _write_stdin(self, pipe, data: bytes):
+        """Write data to a local process's stdin and close it"""
+        
+        try:
+            pipe.write(data)
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+        finally:
+            try:
+                pipe.close()
+            except (BrokenPipeError, OSError):
+                pass
     
     def _store_execution_history(self, execution_id: str, code: str, 
                                language: str, result: ExecutionResult):
         """Store execution in history"""
         
-        history_entry = {
-            "execution_id": execution_id,
-            "code": code[:1000] + "..." if len(code) > 1000 else code,
-            "language": language,
-            "result": result.to_dict(),
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        self.execution_history.append(history_entry)
-        
-        # Keep only last 100 executions
-        if len(self.execution_history) > 100:
-            self.execution_history = self.execution_history[-100:]
+        try:
+            self.execution_history.record(execution_id, code, language, result)
+        except Exception as e:
+            logger.error(f"Failed to record execution history: {str(e)}")
     
     def kill_execution(self, execution_id: str) -> bool:
         """Kill running execution"""
         
-        if execution_id not in self.active_executions:
+        with self._executions_lock:
+            execution = self.active_executions.pop(execution_id, None)
+        
+        if execution is None:
             return False
         
         try:
-            execution = self.active_executions[execution_id]
-            
             if isinstance(execution, subprocess.Popen):
                 execution.kill()
             elif hasattr(execution, 'kill'):  # Docker container
                 execution.kill()
             
-            del self.active_executions[execution_id]
             logger.info(f"Killed execution {execution_id}")
             return True
-            
+        
         except Exception as e:
             logger.error(f"Error killing execution {execution_id}: {str(e)}")
             return False
@@ -674,8 +1496,11 @@ class ExecutionSandbox:
     def get_active_executions(self) -> List[Dict[str, Any]]:
         """Get list of active executions"""
         
+        with self._executions_lock:
+            executions = list(self.active_executions.items())
+        
         active = []
-        for exec_id, execution in self.active_executions.items():
+        for exec_id, execution in executions:
             if isinstance(execution, subprocess.Popen):
                 active.append({
                     "execution_id": exec_id,
@@ -683,6 +1508,13 @@ class ExecutionSandbox:
                     "pid": execution.pid,
                     "status": "running" if execution.poll() is None else "finished"
                 })
+            elif isinstance(execution, ForkedExecution):
+                active.append({
+                    "execution_id": exec_id,
+                    "type": "local_fork",
+                    "pid": execution.pid,
+                    "status": "running"
+                })
             else:
                 active.append({
                     "execution_id": exec_id,
@@ -693,9 +1525,23 @@ class ExecutionSandbox:
         
         return active
     
-    def get_execution_history(self) -> List[Dict[str, Any]]:
-        """Get execution history"""
-        return self.execution_history.copy()
+    def get_execution_history(self, language: Optional[str] = None, success: Optional[bool] = None,
+                              since: Any = None, until: Any = None, limit: Optional[int] = 100,
+                              include_spilled: bool = False) -> List[Dict[str, Any]]:
+        """Get execution history, oldest first
+        
+        since/until take epoch seconds, datetimes or ISO strings.
+        include_spilled extends the search past the in-memory buffer into
+        the on-disk log.
+        """
+        return self.execution_history.query(
+            language=language, success=success, since=since, until=until,
+            limit=limit, include_spilled=include_spilled
+        )
+    
+    def get_execution(self, execution_id: str) -> Optional[Dict[str, Any]]:
+        """Get one recorded execution by id (including spilled ones)"""
+        return self.execution_history.get(execution_id)
     
     def get_resource_usage(self) -> Dict[str, Any]:
         """Get current resource usage"""
@@ -703,5 +1549,37 @@ class ExecutionSandbox:
             "cpu_percent": psutil.cpu_percent(),
             "memory_percent": psutil.virtual_memory().percent,
             "disk_percent": psutil.disk_usage('/').percent,
-            "active_executions": len(self.active_executions)
+            "active_executions": len(self.active_executions),
+            "queued_executions": self.scheduler.get_status()["queue_depth"] if self.scheduler else 0
         }
+    
+    def get_pool_metrics(self) -> Dict[str, Any]:
+        """Get warm container pool metrics"""
+        
+        if not self.container_pool:
+            return {"enabled": False}
+        
+        metrics = self.container_pool.get_metrics()
+        metrics["enabled"] = True
+        return metrics
+    
+    def shutdown(self):
+        """Release pooled containers, session kernels and the fork server"""
+        
+        if self.fork_server:
+            self.fork_server.shutdown()
+            self.fork_server = None
+        
+        # A build finishing after shutdown must not start the pool
+        if self.sandbox_images:
+            self.sandbox_images.on_ready = None
+        
+        if self.kernel_manager:
+            self.kernel_manager.shutdown()
+            self.kernel_manager = None
+        
+        if self.container_pool:
+            self.container_pool.shutdown()
+            self.container_pool = None
+        
+        self.execution_history.close()
@@ -4,12 +4,14 @@ Main API Handler for ALI System
 """
 import json
 import logging
+import queue
+import threading
 from typing import Dict, Any, Optional
 from datetime import datetime
 import traceback
 
 from google.cloud import logging as cloud_logging
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 
 from orchestrator import ALIOrchestrator
@@ -74,6 +76,75 @@ def api_handler():
             "details": str(e) if CONFIG.debug else "Contact system administrator"
         }), 500
 
+@app.route('/api/ali/stream', methods=['POST'])
+def api_stream_handler():
+    """
+    Streaming variant of /api/ali
+    
+    Takes the same payload and responds with newline-delimited JSON: one
+    {"type": "output", ...} event per sandbox output chunk while steps run,
+    then a final {"type": "result", "result": {...}} event.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Content-Type must be application/json"}), 400
+        
+    payload = request.get_json()
+    
+    user_query = payload.get('user_query')
+    if not user_query:
+        return jsonify({"error": "user_query is required"}), 400
+        
+    user_context = payload.get('user_context', '')
+    current_mode = payload.get('current_mode', 'operator')
+    session_id = payload.get('session_id', f"session_{datetime.now().timestamp()}")
+    
+    logger.info(f"Processing streaming request - Session: {session_id}, Mode: {current_mode}")
+    
+    events = queue.Queue()
+    
+    def run_request():
+        try:
+            result = orchestrator.process_request(
+                user_query=user_query,
+                user_context=user_context,
+                current_mode=current_mode,
+                session_id=session_id,
+                output_callback=events.put
+            )
+            events.put({"type": "result", "result": result})
+        except Exception as e:
+            logger.error(f"Error processing streaming request: {str(e)}")
+            logger.error(traceback.format_exc())
+            events.put({
+                "type": "error",
+                "error": "Internal server error",
+                "details": str(e) if CONFIG.debug else "Contact system administrator"
+            })
+        finally:
+            events.put(None)
+    
+    threading.Thread(target=run_request, daemon=True).start()
+    
+    def generate():
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            yield json.dumps(event, default=str) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.route('/api/ali/session/reset', methods=['POST'])
+def session_reset_handler():
+    """Reset the sandbox kernels of a session: {"session_id": "string"}"""
+    payload = request.get_json(silent=True) or {}
+    
+    session_id = payload.get('session_id')
+    if not session_id:
+        return jsonify({"error": "session_id is required"}), 400
+        
+    return jsonify(orchestrator.reset_session(session_id))
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
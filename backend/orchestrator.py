@@ -5,7 +5,7 @@ Plan-Do-Check-Act framework for autonomous task execution
 import json
 import logging
 import uuid
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Callable
 from datetime import datetime, timedelta
 from enum import Enum
 import asyncio
@@ -14,6 +14,7 @@ import concurrent.futures
 from multi_llm_api_layer import MultiLLMAPILayer
 from dispute_resolver import DisputeResolver
 from execution_sandbox import ExecutionSandbox
+from sandbox_scheduler import PRIORITY_CRITICAL, PRIORITY_NORMAL
 from tool_use_api import ToolUseAPI
 from agent_foundry import AgentFoundry
 from config import CONFIG
@@ -34,9 +35,9 @@ class ALIOrchestrator:
     
     def __init__(self):
         self.llm_layer = MultiLLMAPILayer()
-        self.dispute_resolver = DisputeResolver()
-        self.execution_sandbox = ExecutionSandbox()
         self.tool_use_api = ToolUseAPI()
+        self.dispute_resolver = DisputeResolver(known_tools=self.tool_use_api.get_available_tools())
+        self.execution_sandbox = ExecutionSandbox()
         self.agent_foundry = AgentFoundry()
         
         # Session management
@@ -54,10 +55,13 @@ class ALIOrchestrator:
         logger.info("ALI Orchestrator initialized")
 
     def process_request(self, user_query: str, user_context: str, 
-                       current_mode: str, session_id: str) -> Dict[str, Any]:
+                       current_mode: str, session_id: str,
+                       output_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
         """
         Main entry point for processing user requests
         Implements the PDCA cycle
+        
+        output_callback, if given, receives sandbox output chunks as steps run
         """
         start_time = datetime.now()
         
@@ -87,7 +91,7 @@ class ALIOrchestrator:
             
             # Execute PDCA cycle
             result = self._execute_pdca_cycle(
-                user_query, user_context, current_mode, session_id
+                user_query, user_context, current_mode, session_id, output_callback
             )
             
             # Update metrics
@@ -107,7 +111,8 @@ class ALIOrchestrator:
             }
 
     def _execute_pdca_cycle(self, user_query: str, user_context: str, 
-                           current_mode: str, session_id: str) -> Dict[str, Any]:
+                           current_mode: str, session_id: str,
+                           output_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
         """Execute the Plan-Do-Check-Act cycle"""
         
         task_id = str(uuid.uuid4())
@@ -139,7 +144,8 @@ class ALIOrchestrator:
             
             # DO Phase
             task["status"] = TaskStatus.EXECUTING
-            execution_results = self._do_phase(plan["steps"], task_id, session_id)
+            execution_results = self._do_phase(plan["steps"], task_id, session_id, output_callback,
+                                               session_state=plan.get("session_state", False))
             task["execution_results"] = execution_results
             
             # CHECK Phase
@@ -204,11 +210,19 @@ class ALIOrchestrator:
             "success_criteria": best_plan["success_criteria"],
             "estimated_time": best_plan.get("estimated_time", 300),
             "required_tools": best_plan.get("required_tools", []),
+            "session_state": bool(best_plan.get("session_state", False)),
             "llm_responses": llm_responses
         }
 
-    def _do_phase(self, steps: List[Dict], task_id: str, session_id: str) -> List[Dict]:
-        """DO: Execute the planned steps"""
+    def _do_phase(self, steps: List[Dict], task_id: str, session_id: str,
+                  output_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                  session_state: bool = False) -> List[Dict]:
+        """DO: Execute the planned steps
+        
+        Code steps run stateless unless the plan sets session_state, or the
+        step its own session_state: those share the session's kernel, so
+        imports and variables from earlier steps are still there.
+        """
         
         logger.info(f"Executing {len(steps)} steps for task {task_id}")
         
@@ -230,10 +244,16 @@ class ALIOrchestrator:
                 if step["type"] == "code_execution":
                     output = self.execution_sandbox.execute_code(
                         step["code"], 
-                        step.get("language", "python")
+                        step.get("language", "python"),
+                        on_output=self._step_output_forwarder(output_callback, task_id, session_id, i + 1),
+                        # Only opted-in steps share the session's kernel; the rest go through
+                        # the container pool, and pure ones can be served from the result cache
+                        session_id=session_id if step.get("session_state", session_state) else None,
+                        deterministic=bool(step.get("deterministic", False)),
+                        priority=PRIORITY_CRITICAL if step.get("critical", False) else PRIORITY_NORMAL
                     )
-                    step_result["output"] = output
-                    step_result["success"] = output.get("success", False)
+                    step_result["output"] = output.to_dict()
+                    step_result["success"] = output.success
                     
                 elif step["type"] == "tool_use":
                     output = self.tool_use_api.execute_tool(
@@ -280,6 +300,24 @@ class ALIOrchestrator:
                 
         return results
 
+    def _step_output_forwarder(self, output_callback: Optional[Callable[[Dict[str, Any]], None]],
+                               task_id: str, session_id: str,
+                               step_number: int) -> Optional[Callable[[Dict[str, Any]], None]]:
+        """Tag sandbox output chunks with their task/step before forwarding them"""
+        
+        if not output_callback:
+            return None
+        
+        def forward(chunk: Dict[str, Any]):
+            output_callback({
+                **chunk,
+                "task_id": task_id,
+                "session_id": session_id,
+                "step_number": step_number
+            })
+        
+        return forward
+
     def _check_phase(self, execution_results: List[Dict], 
                     success_criteria: List[str]) -> Dict[str, Any]:
         """CHECK: Evaluate execution results against success criteria"""
@@ -496,7 +534,8 @@ class ALIOrchestrator:
             "status": "operational",
             "metrics": self.metrics,
             "active_sessions": len(self.active_sessions),
-            "total_tasks_in_history": len(self.task_history)
+            "total_tasks_in_history": len(self.task_history),
+            "sandbox_images": self.execution_sandbox.get_image_status()
         }
 
     def get_active_sessions(self) -> List[Dict]:
@@ -511,6 +550,13 @@ class ALIOrchestrator:
             for sid, session in self.active_sessions.items()
         ]
 
+    def reset_session(self, session_id: str) -> Dict[str, Any]:
+        """Discard a session's sandbox kernels (imports, variables, workspace files)"""
+        return {
+            "session_id": session_id,
+            "kernels_reset": self.execution_sandbox.reset_session(session_id)
+        }
+
     def get_system_resources(self) -> Dict[str, Any]:
         """Get system resource information"""
         import psutil
@@ -0,0 +1,248 @@
+"""
+Plan Validator
+Compiled schema validation and normalization for execution plans
+"""
+import logging
+from typing import Dict, Any, List, Optional, Callable, FrozenSet
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Step schemas keyed by step type. "required" fields must be present (after
+# repair) with the given type, "optional" fields get a default, "repair" maps a
+# missing field to another step field it can be rebuilt from.
+STEP_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "code_execution": {
+        "required": {"code": str},
+        "optional": {"language": (str, "python")},
+        "choices": {"language": ("python", "javascript", "bash", "shell")}
+    },
+    "tool_use": {
+        "required": {"tool": str},
+        "optional": {"parameters": (dict, {})}
+    },
+    "llm_analysis": {
+        "required": {"prompt": str},
+        "repair": {"prompt": "description"}
+    },
+    "agent_creation": {
+        "required": {"agent_spec": dict}
+    }
+}
+
+STEP_TYPE_ALIASES = {
+    "code": "code_execution",
+    "execute_code": "code_execution",
+    "tool": "tool_use",
+    "tool_call": "tool_use",
+    "analysis": "llm_analysis",
+    "llm": "llm_analysis",
+    "agent": "agent_creation",
+    "create_agent": "agent_creation"
+}
+
+VALUE_ALIASES = {
+    "language": {
+        "py": "python",
+        "python3": "python",
+        "js": "javascript",
+        "node": "javascript",
+        "nodejs": "javascript",
+        "sh": "bash"
+    }
+}
+
+TRUE_STRINGS = {"true", "yes", "1", "y"}
+
+DEFAULT_SUCCESS_CRITERIA = ["Task completed successfully"]
+
+@dataclass
+class PlanValidationResult:
+    """Outcome of validating a plan"""
+    plan: Dict[str, Any]
+    errors: List[str] = field(default_factory=list)
+    repairs: List[str] = field(default_factory=list)
+    
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+
+StepChecker = Callable[[Dict[str, Any], int, List[str], List[str]], None]
+
+def _compile_step_schema(step_type: str, schema: Dict[str, Any],
+                         known_tools: Optional[FrozenSet[str]]) -> StepChecker:
+    """Compile a step schema into a checker that normalizes a step in place"""
+    
+    # Flatten the schema into tuples once so each check is a tight loop
+    required = tuple(
+        (name, expected, schema.get("repair", {}).get(name))
+        for name, expected in schema.get("required", {}).items()
+    )
+    optional = tuple(
+        (name, expected, default)
+        for name, (expected, default) in schema.get("optional", {}).items()
+    )
+    choices = tuple(
+        (name, frozenset(values), VALUE_ALIASES.get(name, {}))
+        for name, values in schema.get("choices", {}).items()
+    )
+    check_tool = step_type == "tool_use" and known_tools is not None
+    
+    def check(step: Dict[str, Any], index: int, errors: List[str], repairs: List[str]):
+        for name, expected, repair_from in required:
+            value = step.get(name)
+            
+            if expected is str and isinstance(value, list) and all(isinstance(v, str) for v in value):
+                value = "\n".join(value)
+                step[name] = value
+                repairs.append(f"step {index}: joined '{name}' lines")
+            
+            if not value and repair_from and step.get(repair_from):
+                value = step[repair_from]
+                step[name] = value
+                repairs.append(f"step {index}: filled '{name}' from '{repair_from}'")
+            
+            if not value or not isinstance(value, expected):
+                errors.append(f"step {index} ({step_type}): missing or invalid '{name}'")
+        
+        for name, expected, default in optional:
+            value = step.get(name)
+            if value is None:
+                step[name] = default.copy() if isinstance(default, dict) else default
+            elif not isinstance(value, expected):
+                errors.append(f"step {index} ({step_type}): invalid '{name}'")
+        
+        for name, allowed, aliases in choices:
+            value = step.get(name)
+            if isinstance(value, str):
+                value = value.strip().lower()
+                value = aliases.get(value, value)
+                step[name] = value
+            if value not in allowed:
+                errors.append(f"step {index} ({step_type}): unsupported {name} '{value}'")
+        
+        if check_tool and isinstance(step.get("tool"), str) and step["tool"] not in known_tools:
+            errors.append(f"step {index} (tool_use): unknown tool '{step['tool']}'")
+    
+    return check
+
+class PlanValidator:
+    """Validates plans against the step schemas and repairs fixable fields"""
+    
+    def __init__(self, known_tools: Optional[FrozenSet[str]] = None):
+        self.known_tools = known_tools
+        self._checkers: Dict[str, StepChecker] = {
+            step_type: _compile_step_schema(step_type, schema, known_tools)
+            for step_type, schema in STEP_SCHEMAS.items()
+        }
+    
+    def validate(self, plan: Any) -> PlanValidationResult:
+        """Validate and normalize a plan; the input is not modified"""
+        
+        if not isinstance(plan, dict):
+            return PlanValidationResult(plan={}, errors=["plan is not an object"])
+        
+        plan = dict(plan)
+        errors: List[str] = []
+        repairs: List[str] = []
+        
+        steps = plan.get("steps")
+        if not isinstance(steps, list) or not steps:
+            errors.append("plan has no steps")
+            steps = []
+        
+        plan["steps"] = [self._validate_step(step, i + 1, errors, repairs) for i, step in enumerate(steps)]
+        
+        # Top-level fields
+        criteria = plan.get("success_criteria")
+        if isinstance(criteria, str):
+            plan["success_criteria"] = [criteria]
+            repairs.append("wrapped success_criteria in a list")
+        elif not isinstance(criteria, list) or not criteria:
+            plan["success_criteria"] = list(DEFAULT_SUCCESS_CRITERIA)
+            repairs.append("defaulted success_criteria")
+        else:
+            plan["success_criteria"] = [str(c) for c in criteria if c]
+        
+        if "estimated_time" in plan:
+            estimated_time = self._to_number(plan["estimated_time"])
+            if estimated_time is None:
+                del plan["estimated_time"]
+                repairs.append("dropped non-numeric estimated_time")
+            else:
+                plan["estimated_time"] = estimated_time
+        
+        required_tools = plan.get("required_tools")
+        if required_tools is not None and not isinstance(required_tools, list):
+            plan["required_tools"] = [required_tools] if isinstance(required_tools, str) else []
+            repairs.append("normalized required_tools")
+        
+        if "session_state" in plan and not isinstance(plan["session_state"], bool):
+            plan["session_state"] = str(plan["session_state"]).strip().lower() in TRUE_STRINGS
+        
+        return PlanValidationResult(plan=plan, errors=errors, repairs=repairs)
+    
+    def _validate_step(self, step: Any, index: int, errors: List[str], repairs: List[str]) -> Any:
+        """Validate and normalize a single step"""
+        
+        if not isinstance(step, dict):
+            errors.append(f"step {index}: not an object")
+            return step
+        
+        step = dict(step)
+        
+        step_type = step.get("type")
+        if isinstance(step_type, str):
+            normalized_type = step_type.strip().lower()
+            normalized_type = STEP_TYPE_ALIASES.get(normalized_type, normalized_type)
+            if normalized_type != step_type:
+                step["type"] = normalized_type
+                repairs.append(f"step {index}: normalized type '{step_type}' -> '{normalized_type}'")
+            step_type = normalized_type
+        
+        checker = self._checkers.get(step_type)
+        if checker is None:
+            errors.append(f"step {index}: unknown step type '{step_type}'")
+            return step
+        
+        checker(step, index, errors, repairs)
+        
+        # Fields shared by every step type
+        if not isinstance(step.get("description"), str):
+            step["description"] = str(step.get("description") or f"Step {index}")
+        
+        critical = step.get("critical", False)
+        if not isinstance(critical, bool):
+            step["critical"] = str(critical).strip().lower() in TRUE_STRINGS
+        
+        if "estimated_time" in step:
+            step["estimated_time"] = self._to_number(step["estimated_time"])
+        
+        # Absent means "as the plan says", so it is only normalized when given
+        if "session_state" in step and not isinstance(step["session_state"], bool):
+            step["session_state"] = str(step["session_state"]).strip().lower() in TRUE_STRINGS
+        
+        return step
+    
+    @staticmethod
+    def _to_number(value: Any) -> Optional[float]:
+        """Coerce a numeric-looking value, None if not possible"""
+        
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return value
+        try:
+            return float(str(value).strip().rstrip("s"))
+        except ValueError:
+            return None
+
+@lru_cache(maxsize=16)
+def get_plan_validator(known_tools: Optional[FrozenSet[str]] = None) -> PlanValidator:
+    """Compiled validator per tool set, built once per process"""
+    return PlanValidator(known_tools)
+
+def validate_plan(plan: Any, known_tools: Optional[FrozenSet[str]] = None) -> PlanValidationResult:
+    """Validate a plan with the cached compiled validator"""
+    return get_plan_validator(known_tools).validate(plan)
@@ -0,0 +1,102 @@
+"""
+Sandbox Result Cache
+Content-addressed LRU cache of deterministic execution results
+"""
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+def execution_cache_key(language: str, code: str, environment: Optional[Dict[str, str]],
+                        image_digest: str) -> str:
+    """Key over everything that can change a pure snippet's output"""
+    
+    code_hash = hashlib.sha256(code.encode("utf-8")).hexdigest()
+    env_hash = hashlib.sha256(
+        json.dumps(environment or {}, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    
+    return hashlib.sha256(
+        "\0".join((language, code_hash, env_hash, image_digest)).encode("utf-8")
+    ).hexdigest()
+
+class ResultCache:
+    """LRU cache of serialized ExecutionResults bounded by entry count and bytes"""
+    
+    def __init__(self, max_entries: int = 256, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "rejected": 0
+        }
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached result dict for key (marked most recently used), None on a miss"""
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.metrics["misses"] += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.metrics["hits"] += 1
+            return entry
+    
+    def put(self, key: str, result: Dict[str, Any]) -> bool:
+        """Store a result dict, evicting least recently used entries to fit"""
+        
+        size = len(result.get("stdout", "")) + len(result.get("stderr", "")) + 512
+        
+        with self._lock:
+            if size > self.max_bytes:
+                self.metrics["rejected"] += 1
+                return False
+            
+            if key in self._entries:
+                self._bytes -= self._sizes.pop(key)
+                del self._entries[key]
+            
+            self._entries[key] = result
+            self._sizes[key] = size
+            self._bytes += size
+            self.metrics["stores"] += 1
+            
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                evicted, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(evicted)
+                self.metrics["evictions"] += 1
+        
+        return True
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["max_bytes"] = self.max_bytes
+        
+        return stats
@@ -0,0 +1,396 @@
+"""
+Sandbox Fork Server
+Local Python runner that preloads modules once and forks a limited child per execution
+"""
+import os
+import sys
+import json
+import logging
+import select
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+from sandbox_output import OutputCollector, pump_stream
+from sandbox_metrics import usage_from_rusage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRELOAD = ["json", "re", "math", "collections", "itertools", "datetime", "numpy"]
+
+# The server runs as its own interpreter so the parent's threads, sockets and
+# logging never leak into children. Requests arrive on a unix socket as a
+# length-prefixed JSON body with the child's stdout/stderr pipe ends attached
+# (SCM_RIGHTS); the server replies {"pid"} once forked and {"exit"} once reaped.
+FORK_SERVER_SOURCE = r'''
+import io, json, os, select, signal, socket, struct, sys, traceback
+
+socket_path, preload = sys.argv[1], json.loads(sys.argv[2])
+
+# One BLAS thread per child; thread pools would otherwise be copied half-started
+for _name in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_name, "1")
+
+loaded = []
+for _module in preload:
+    try:
+        __import__(_module)
+        loaded.append(_module)
+    except Exception:
+        pass
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+listener.bind(socket_path)
+listener.listen(64)
+
+wakeup_r, wakeup_w = os.pipe()
+os.set_blocking(wakeup_w, False)
+signal.set_wakeup_fd(wakeup_w)
+signal.signal(signal.SIGCHLD, lambda *args: None)
+
+children = {}
+
+def send(conn, message):
+    try:
+        conn.sendall((json.dumps(message) + "\n").encode())
+    except OSError:
+        pass
+
+def run_child(request, out_fd, err_fd):
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    os.setsid()
+    
+    null_fd = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(null_fd, 0)
+    os.dup2(out_fd, 1)
+    os.dup2(err_fd, 2)
+    os.closerange(3, 65536)
+    
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    os.umask(0o077)
+    
+    if resource:
+        for name, value in request["limits"].items():
+            if value:
+                limit = getattr(resource, name)
+                # A hard CPU limit above the soft one lets SIGXCPU, not SIGKILL, end the child
+                hard = value + 1 if name == "RLIMIT_CPU" else value
+                try:
+                    resource.setrlimit(limit, (value, hard))
+                except (ValueError, OSError):
+                    pass
+    
+    sys.stdin = io.StringIO()
+    sys.stdout = io.TextIOWrapper(io.FileIO(1, "w", closefd=False), write_through=True)
+    sys.stderr = io.TextIOWrapper(io.FileIO(2, "w", closefd=False), write_through=True)
+    sys.argv = ["-"]
+    
+    exit_code = 0
+    try:
+        exec(compile(request["code"], "<stdin>", "exec"), {"__name__": "__main__"})
+    except SystemExit as e:
+        if isinstance(e.code, int) or e.code is None:
+            exit_code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException as e:
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        exit_code = 1
+    
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(exit_code)
+
+def handle(conn):
+    data, fds, _, _ = socket.recv_fds(conn, 65536, 2)
+    if len(data) < 4 or len(fds) != 2:
+        for fd in fds:
+            os.close(fd)
+        conn.close()
+        return
+    
+    size = struct.unpack(">I", data[:4])[0]
+    body = data[4:]
+    while len(body) < size:
+        chunk = conn.recv(size - len(body))
+        if not chunk:
+            break
+        body += chunk
+    
+    request = json.loads(body)
+    pid = os.fork()
+    if pid == 0:
+        run_child(request, fds[0], fds[1])
+    
+    for fd in fds:
+        os.close(fd)
+    children[pid] = conn
+    send(conn, {"pid": pid})
+
+def reap():
+    while children:
+        try:
+            pid, status, usage = os.wait4(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        conn = children.pop(pid, None)
+        if conn:
+            rusage = {name: getattr(usage, name) for name in
+                      ("ru_utime", "ru_stime", "ru_maxrss", "ru_inblock", "ru_oublock")}
+            send(conn, {"exit": os.waitstatus_to_exitcode(status), "rusage": rusage})
+            conn.close()
+
+print(json.dumps({"ready": True, "preloaded": loaded}), flush=True)
+
+while True:
+    try:
+        ready, _, _ = select.select([listener, wakeup_r, sys.stdin], [], [])
+    except InterruptedError:
+        continue
+    
+    if sys.stdin in ready and not os.read(sys.stdin.fileno(), 1024):
+        # Parent went away: take the children down with us
+        for pid in list(children):
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        break
+    
+    if wakeup_r in ready:
+        os.read(wakeup_r, 4096)
+        reap()
+    
+    if listener in ready:
+        conn, _ = listener.accept()
+        try:
+            handle(conn)
+        except Exception:
+            traceback.print_exc()
+            conn.close()
+'''
+
+class ForkedExecution:
+    """A child forked by the server, tracked in ExecutionSandbox.active_executions"""
+    
+    def __init__(self, pid: int):
+        self.pid = pid
+    
+    def kill(self):
+        """Kill the child's whole session (it calls setsid after forking)"""
+        
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+class ForkServer:
+    """Owns a fork server process and runs Python snippets through it"""
+    
+    def __init__(self, preload: Optional[List[str]] = None, start_timeout: float = 30.0):
+        self.preload = list(DEFAULT_PRELOAD if preload is None else preload)
+        self.start_timeout = start_timeout
+        self.preloaded: List[str] = []
+        self.process: Optional[subprocess.Popen] = None
+        self._socket_dir = None
+        self._lock = threading.Lock()
+        # Runs talking to the current server; a restart waits until there are none
+        self._running = 0
+        self._drained = threading.Condition(self._lock)
+        self._start()
+    
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+    
+    def run(self, code: str, timeout: int, env: Dict[str, str], cwd: str,
+            limits: Dict[str, int], output: OutputCollector,
+            on_start: Optional[Callable[[ForkedExecution], None]] = None) -> Tuple[int, bool, Optional[Dict[str, Any]]]:
+        """Fork a child for code and stream its output; returns (exit_code, timed_out, resource usage)
+        
+        timed_out is only the wall-clock timeout. A child stopped by
+        RLIMIT_CPU comes back with exit_code -SIGXCPU instead, which
+        exit_reason reports as "cpu_limit".
+        """
+        
+        with self._lock:
+            if not self.alive:
+                # Restarting shuts the old server down, which kills its children:
+                # let runs still waiting on it finish first (a dead server ends them fast)
+                while self._running:
+                    self._drained.wait()
+                if not self.alive:
+                    logger.warning("Fork server is not running, restarting it")
+                    self._start()
+            self._running += 1
+        
+        try:
+            return self._run(code, timeout, env, cwd, limits, output, on_start)
+        finally:
+            with self._lock:
+                self._running -= 1
+                if not self._running:
+                    self._drained.notify_all()
+    
+    def _run(self, code: str, timeout: int, env: Dict[str, str], cwd: str,
+             limits: Dict[str, int], output: OutputCollector,
+             on_start: Optional[Callable[[ForkedExecution], None]]) -> Tuple[int, bool, Optional[Dict[str, Any]]]:
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        
+        try:
+            conn.connect(self.socket_path)
+            body = json.dumps({"code": code, "env": env, "cwd": cwd, "limits": limits}).encode("utf-8")
+            message = struct.pack(">I", len(body)) + body
+            sent = socket.send_fds(conn, [message], [out_w, err_w])
+            if sent < len(message):
+                conn.sendall(message[sent:])
+        except Exception:
+            for fd in (out_r, err_r):
+                os.close(fd)
+            conn.close()
+            raise
+        finally:
+            os.close(out_w)
+            os.close(err_w)
+        
+        readers = [
+            threading.Thread(target=pump_stream, args=(os.fdopen(out_r, "rb"), output, "stdout"), daemon=True),
+            threading.Thread(target=pump_stream, args=(os.fdopen(err_r, "rb"), output, "stderr"), daemon=True)
+        ]
+        for reader in readers:
+            reader.start()
+        
+        replies = conn.makefile("rb")
+        killer = None
+        expired = threading.Event()
+        
+        try:
+            pid = json.loads(replies.readline())["pid"]
+            execution = ForkedExecution(pid)
+            if on_start:
+                on_start(execution)
+            
+            def kill_on_timeout():
+                expired.set()
+                execution.kill()
+            
+            killer = threading.Timer(timeout, kill_on_timeout)
+            killer.daemon = True
+            killer.start()
+            
+            line = replies.readline()
+            reply = json.loads(line) if line else {"exit": -signal.SIGKILL}
+            exit_code = reply["exit"]
+            usage = usage_from_rusage(reply["rusage"]) if reply.get("rusage") else None
+        finally:
+            if killer:
+                killer.cancel()
+            replies.close()
+            conn.close()
+        
+        for reader in readers:
+            reader.join(timeout=5)
+        
+        return exit_code, expired.is_set(), usage
+    
+    def shutdown(self):
+        """Stop the server; closing its stdin also kills any running children"""
+        
+        if self.process:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+            self.process = None
+        
+        if self._socket_dir:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+    
+    def _start(self):
+        """Start the server and wait until its modules are imported"""
+        
+        self.shutdown()
+        
+        self._socket_dir = tempfile.mkdtemp(prefix="ali_forkserver_")
+        self.socket_path = os.path.join(self._socket_dir, "server.sock")
+        
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", FORK_SERVER_SOURCE, self.socket_path, json.dumps(self.preload)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        
+        ready, _, _ = select.select([self.process.stdout], [], [], self.start_timeout)
+        line = self.process.stdout.readline() if ready else b""
+        if not line:
+            self.shutdown()
+            raise RuntimeError("Fork server failed to start")
+        
+        self.preloaded = json.loads(line).get("preloaded", [])
+        logger.info(f"Fork server started (pid {self.process.pid}, preloaded: {', '.join(self.preloaded)})")
+
+def benchmark_startup(fork_server: ForkServer, runs: int = 20,
+                      code: str = "import numpy\nprint('ready')") -> Dict[str, Any]:
+    """Compare time to first output line: fork server vs a fresh interpreter per run"""
+    
+    def first_line_latency(start) -> float:
+        seen = []
+        collector = OutputCollector(on_output=lambda chunk: seen.append(time.perf_counter()))
+        started = time.perf_counter()
+        start(collector)
+        return seen[0] - started
+    
+    def forked(collector):
+        fork_server.run(code, 60, dict(os.environ), tempfile.gettempdir(), {}, collector)
+    
+    def spawned(collector):
+        process = subprocess.Popen([sys.executable, "-"], stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        process.stdin.write(code.encode("utf-8"))
+        process.stdin.close()
+        pump_stream(process.stdout, collector, "stdout")
+        process.wait()
+    
+    results = {}
+    for name, start in (("fork_server", forked), ("subprocess", spawned)):
+        timings = sorted(first_line_latency(start) for _ in range(runs))
+        results[name] = {
+            "median_ms": round(timings[len(timings) // 2] * 1000, 2),
+            "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000, 2),
+            "min_ms": round(timings[0] * 1000, 2)
+        }
+    
+    results["speedup"] = round(results["subprocess"]["median_ms"] / max(results["fork_server"]["median_ms"], 1e-6), 1)
+    return results
+
+if __name__ == "__main__":
+    server = ForkServer()
+    try:
+        print(json.dumps(benchmark_startup(server), indent=2))
+    finally:
+        server.shutdown()
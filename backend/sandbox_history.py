@@ -0,0 +1,339 @@
+"""
+Sandbox History
+Bounded in-memory execution history that spills older entries to an indexed append-only log
+"""
+import os
+import json
+import stat
+import logging
+import tempfile
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+CODE_PREVIEW = 500
+TEXT_PREVIEW = 256
+
+TimeBound = Union[float, datetime, str, None]
+
+class HistoryEntry:
+    """What history keeps of one execution: a summary, not the full result"""
+    
+    __slots__ = ("execution_id", "timestamp", "language", "success", "exit_code", "exit_reason",
+                 "execution_time", "execution_method", "code", "stdout", "stderr", "error",
+                 "cpu_time", "peak_rss")
+    
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+    
+    @classmethod
+    def from_result(cls, execution_id: str, code: str, language: str, result, timestamp: float) -> "HistoryEntry":
+        metadata = result.metadata or {}
+        resources = metadata.get("resources") or {}
+        return cls(
+            execution_id=execution_id,
+            timestamp=timestamp,
+            language=language,
+            success=result.success,
+            exit_code=result.exit_code,
+            exit_reason=metadata.get("exit_reason"),
+            execution_time=round(result.execution_time, 6),
+            execution_method=metadata.get("execution_method"),
+            code=_preview(code, CODE_PREVIEW),
+            # The end of the output is where results and tracebacks are
+            stdout=_tail(result.stdout, TEXT_PREVIEW),
+            stderr=_tail(result.stderr, TEXT_PREVIEW),
+            error=_preview(result.error, TEXT_PREVIEW),
+            cpu_time=resources.get("cpu_time"),
+            peak_rss=resources.get("peak_rss")
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        entry = {name: getattr(self, name) for name in self.__slots__}
+        entry["timestamp"] = datetime.fromtimestamp(self.timestamp).isoformat()
+        return entry
+    
+    def to_record(self) -> Dict[str, Any]:
+        """Form written to the spill log (epoch timestamp)"""
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    def matches(self, language: Optional[str], success: Optional[bool]) -> bool:
+        return (language is None or self.language == language) and \
+            (success is None or self.success == success)
+
+def default_spill_path() -> str:
+    """Spill log for this process in a per-user directory under the temp dir
+    
+    Execution summaries include code and output, so the log must not sit in a
+    shared, world-readable location, and two backends must not share one file.
+    """
+    
+    owner = os.getuid() if hasattr(os, "getuid") else os.environ.get("USERNAME", "user")
+    return os.path.join(tempfile.gettempdir(), f"ali_sandbox-{owner}",
+                        f"execution_history-{os.getpid()}.jsonl")
+
+def _private_directory(path: str):
+    """Create path with mode 0700, or check an existing one is our own directory"""
+    
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise OSError(f"{path} is not a directory")
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise OSError(f"{path} is owned by another user")
+    if info.st_mode & 0o077:
+        os.chmod(path, 0o700)
+
+def _preview(text: Optional[str], limit: int) -> Optional[str]:
+    if text is None or len(text) <= limit:
+        return text
+    return text[:limit] + "..."
+
+def _tail(text: Optional[str], limit: int) -> Optional[str]:
+    if text is None or len(text) <= limit:
+        return text
+    return "..." + text[-limit:]
+
+def _to_epoch(value: TimeBound) -> Optional[float]:
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.timestamp()
+
+class ExecutionHistory:
+    """Ring buffer of recent executions; evicted entries go to a JSONL spill log
+    
+    The spill log is append-only. It is rotated to <path>.1 once it passes
+    max_spill_bytes, so at most two segments exist. An in-memory index maps
+    execution_id to (segment, offset, length) plus the fields queries filter
+    on, so spilled entries are filtered without reading the log and fetched
+    with a single seek.
+    """
+    
+    def __init__(self, capacity: int = 100, spill_path: Optional[str] = None,
+                 max_spill_bytes: int = 64 * 1024 * 1024):
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.max_spill_bytes = max_spill_bytes
+        
+        self._buffer: deque = deque()
+        self._recent: Dict[str, HistoryEntry] = {}
+        self._lock = threading.Lock()
+        
+        # execution_id -> (segment, offset, length, timestamp, language, success)
+        self._index: Dict[str, Tuple[int, int, int, float, str, bool]] = {}
+        self._segment = 0
+        self._spill_file = None
+        self._index_loaded = False
+        
+        self.metrics = {"recorded": 0, "spilled": 0, "spill_errors": 0, "rotations": 0}
+    
+    def record(self, execution_id: str, code: str, language: str, result,
+               timestamp: Optional[float] = None) -> HistoryEntry:
+        """Add an execution, spilling the oldest entry once the buffer is full"""
+        
+        entry = HistoryEntry.from_result(
+            execution_id, code, language, result,
+            timestamp if timestamp is not None else datetime.now().timestamp()
+        )
+        
+        with self._lock:
+            self._buffer.append(entry)
+            self._recent[execution_id] = entry
+            self.metrics["recorded"] += 1
+            
+            while len(self._buffer) > self.capacity:
+                evicted = self._buffer.popleft()
+                self._recent.pop(evicted.execution_id, None)
+                if self.spill_path:
+                    self._spill(evicted)
+        
+        return entry
+    
+    def get(self, execution_id: str) -> Optional[Dict[str, Any]]:
+        """One execution by id, from memory or the spill log"""
+        
+        with self._lock:
+            entry = self._recent.get(execution_id)
+            if entry is not None:
+                return entry.to_dict()
+            
+            if not self.spill_path:
+                return None
+            self._load_index()
+            location = self._index.get(execution_id)
+            if location is None:
+                return None
+            entry = self._read_spilled(location)
+        
+        return entry.to_dict() if entry else None
+    
+    def query(self, language: Optional[str] = None, success: Optional[bool] = None,
+              since: TimeBound = None, until: TimeBound = None, limit: Optional[int] = 100,
+              include_spilled: bool = False) -> List[Dict[str, Any]]:
+        """Most recent matching executions, oldest first
+        
+        Entries are stored in time order, so the scan walks back from the
+        newest and stops at since or once limit entries have matched.
+        """
+        
+        since, until = _to_epoch(since), _to_epoch(until)
+        matched: List[HistoryEntry] = []
+        
+        with self._lock:
+            for entry in self._scan_recent(since, until):
+                if entry.matches(language, success):
+                    matched.append(entry)
+                    if limit is not None and len(matched) >= limit:
+                        break
+            else:
+                if include_spilled and self.spill_path:
+                    self._load_index()
+                    remaining = None if limit is None else limit - len(matched)
+                    for location in self._scan_index(language, success, since, until, remaining):
+                        entry = self._read_spilled(location)
+                        if entry:
+                            matched.append(entry)
+        
+        return [entry.to_dict() for entry in reversed(matched)]
+    
+    def __len__(self) -> int:
+        return len(self._buffer)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["buffered"] = len(self._buffer)
+            stats["indexed"] = len(self._index)
+        stats["capacity"] = self.capacity
+        stats["spill_path"] = self.spill_path
+        return stats
+    
+    def close(self):
+        with self._lock:
+            if self._spill_file:
+                self._spill_file.close()
+                self._spill_file = None
+    
+    def _scan_recent(self, since: Optional[float], until: Optional[float]) -> Iterator[HistoryEntry]:
+        """Buffered entries newest first within [since, until] (lock held)"""
+        
+        for entry in reversed(self._buffer):
+            if until is not None and entry.timestamp > until:
+                continue
+            if since is not None and entry.timestamp < since:
+                return
+            yield entry
+    
+    def _scan_index(self, language: Optional[str], success: Optional[bool], since: Optional[float],
+                    until: Optional[float], limit: Optional[int]) -> Iterator[tuple]:
+        """Spilled locations newest first matching the filters (lock held)"""
+        
+        if limit is not None and limit <= 0:
+            return
+        
+        found = 0
+        # dicts keep insertion order, which is spill (and so time) order
+        for location in reversed(self._index.values()):
+            segment, _, _, timestamp, entry_language, entry_success = location
+            if segment < self._segment - 1:
+                continue
+            if until is not None and timestamp > until:
+                continue
+            if since is not None and timestamp < since:
+                return
+            if (language is None or entry_language == language) and \
+                    (success is None or entry_success == success):
+                yield location
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+    
+    def _spill(self, entry: HistoryEntry):
+        """Append an evicted entry to the log and index it (lock held)"""
+        
+        try:
+            self._load_index()
+            if self._spill_file is None:
+                _private_directory(os.path.dirname(os.path.abspath(self.spill_path)))
+                fd = os.open(self.spill_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                self._spill_file = os.fdopen(fd, "ab")
+            
+            line = (json.dumps(entry.to_record(), separators=(",", ":")) + "\n").encode("utf-8")
+            self._spill_file.write(line)
+            self._spill_file.flush()
+            # Offset from the end of our own write, in case something else appended too
+            offset = self._spill_file.tell() - len(line)
+            
+            self._index[entry.execution_id] = (
+                self._segment, offset, len(line), entry.timestamp, entry.language, entry.success
+            )
+            self.metrics["spilled"] += 1
+            
+            if offset + len(line) >= self.max_spill_bytes:
+                self._rotate()
+        
+        except (OSError, TypeError, ValueError) as e:
+            self.metrics["spill_errors"] += 1
+            logger.warning(f"Failed to spill execution history entry: {str(e)}")
+    
+    def _rotate(self):
+        """Start a new segment; the previous one becomes <path>.1 (lock held)"""
+        
+        self._spill_file.close()
+        self._spill_file = None
+        os.replace(self.spill_path, self.spill_path + ".1")
+        
+        self._segment += 1
+        # Entries two segments back were in the .1 file just overwritten
+        self._index = {key: location for key, location in self._index.items()
+                       if location[0] >= self._segment - 1}
+        self.metrics["rotations"] += 1
+    
+    def _segment_path(self, segment: int) -> str:
+        return self.spill_path if segment == self._segment else self.spill_path + ".1"
+    
+    def _read_spilled(self, location: tuple) -> Optional[HistoryEntry]:
+        segment, offset, length = location[:3]
+        if segment < self._segment - 1:
+            return None
+        
+        try:
+            with open(self._segment_path(segment), "rb") as f:
+                f.seek(offset)
+                return HistoryEntry(**json.loads(f.read(length)))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read spilled history entry: {str(e)}")
+            return None
+    
+    def _load_index(self):
+        """Index whatever an earlier process left in the log (first use only, lock held)"""
+        
+        if self._index_loaded:
+            return
+        self._index_loaded = True
+        
+        # Older segment first so newer entries end up later in the index
+        for segment, path in ((self._segment - 1, self.spill_path + ".1"), (self._segment, self.spill_path)):
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, "rb") as f:
+                    offset = 0
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                            self._index[record["execution_id"]] = (
+                                segment, offset, len(line), record["timestamp"],
+                                record["language"], record["success"]
+                            )
+                        except (ValueError, KeyError):
+                            pass  # torn final line from a crash
+                        offset += len(line)
+            except OSError as e:
+                logger.warning(f"Failed to index execution history log {path}: {str(e)}")
@@ -0,0 +1,291 @@
+"""
+Sandbox Images
+Background preparation of slim per-language sandbox images, pinned by image id
+"""
+import os
+import hashlib
+import io
+import logging
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, Any, List, Optional, Callable
+
+import docker
+
+logger = logging.getLogger(__name__)
+
+IMAGE_REPOSITORY = "ali-sandbox"
+
+# Apt cache mounts only exist under BuildKit; the legacy builder gets a plain RUN
+APT_RUN = {
+    True: "RUN --mount=type=cache,target=/var/cache/apt,sharing=locked "
+          "--mount=type=cache,target=/var/lib/apt,sharing=locked \\\n"
+          "    rm -f /etc/apt/apt.conf.d/docker-clean && apt-get update && "
+          "apt-get install -y --no-install-recommends {packages}",
+    False: "RUN apt-get update && apt-get install -y --no-install-recommends {packages} "
+           "&& rm -rf /var/lib/apt/lists/*"
+}
+
+SANDBOX_USER = """
+RUN (userdel -r node 2>/dev/null || true) && useradd -m -u 1000 sandbox
+WORKDIR /workspace
+USER sandbox
+"""
+
+# One small image per language. "shell" backs execute_command and keeps the
+# old all-in-one toolset, layered on the python image so those layers are shared.
+IMAGE_SPECS = {
+    "python": {
+        "base": "python:3.9-slim",
+        "packages": [],
+        "cmd": '["python", "--version"]'
+    },
+    "javascript": {
+        "base": "node:18-slim",
+        "packages": [],
+        "cmd": '["node", "--version"]'
+    },
+    "bash": {
+        "base": "debian:bookworm-slim",
+        "packages": ["bash", "ca-certificates", "curl", "wget", "git"],
+        "cmd": '["bash", "--version"]'
+    },
+    "shell": {
+        "from": "python",
+        "packages": ["nodejs", "npm", "bash", "ca-certificates", "curl", "wget", "git"],
+        "cmd": '["bash", "--version"]'
+    }
+}
+
+class ImageNotReady(Exception):
+    """Raised when an execution needs a sandbox image that isn't available"""
+
+def render_dockerfile(spec: Dict[str, Any], base: str, buildkit: bool) -> str:
+    """Dockerfile for one image spec on top of a resolved base image"""
+    
+    lines = []
+    if buildkit:
+        lines.append("# syntax=docker/dockerfile:1")
+    lines.append(f"FROM {base}")
+    
+    if spec.get("packages"):
+        # Derived images start as the sandbox user
+        if "from" in spec:
+            lines.append("USER root")
+        lines.append(APT_RUN[buildkit].format(packages=" ".join(spec["packages"])))
+    
+    if "from" in spec:
+        lines.append("USER sandbox")
+    else:
+        lines.append(SANDBOX_USER.strip())
+    
+    lines.append(f"CMD {spec['cmd']}")
+    return "\n".join(lines) + "\n"
+
+class SandboxImages:
+    """Resolves, pulls or builds each language's image off the startup path
+    
+    Images are tagged by a hash of their Dockerfile, so an unchanged spec is
+    found with a single lookup and never rebuilt. Executions get the image id
+    rather than the tag, so a rebuild can't change the image under a running
+    session or a cached result.
+    """
+    
+    def __init__(self, docker_client, languages: Optional[List[str]] = None,
+                 overrides: Optional[Dict[str, str]] = None, buildkit: bool = True,
+                 build_timeout: float = 1800.0,
+                 on_ready: Optional[Callable[["SandboxImages"], None]] = None):
+        self.docker_client = docker_client
+        self.languages = list(languages or IMAGE_SPECS)
+        # Dependencies first, so "shell" finds its python base
+        self.languages.sort(key=lambda language: "from" in IMAGE_SPECS.get(language, {}))
+        self.overrides = dict(overrides or {})
+        self.buildkit = buildkit and shutil.which("docker") is not None
+        self.build_timeout = build_timeout
+        self.on_ready = on_ready
+        
+        self._images: Dict[str, Optional[str]] = {}
+        self._status: Dict[str, Dict[str, Any]] = {
+            language: {"state": "pending", "image": None, "tag": None, "error": None}
+            for language in self.languages
+        }
+        self._events = {language: threading.Event() for language in self.languages}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.ready = threading.Event()  # set once every language is resolved (or failed)
+    
+    def resolve_existing(self):
+        """Pin any image that is already present locally (fast, no builds or pulls)"""
+        
+        for language in self.languages:
+            reference = self.overrides.get(language) or self._tag(language)
+            if reference is None:
+                continue
+            try:
+                image = self.docker_client.images.get(reference)
+            except docker.errors.ImageNotFound:
+                continue
+            except Exception as e:
+                logger.warning(f"Could not look up sandbox image {reference}: {str(e)}")
+                continue
+            self._mark_ready(language, image.id, reference)
+        
+        self._check_all_ready()
+    
+    def start(self):
+        """Prepare the remaining images on a background thread"""
+        
+        self._thread = threading.Thread(target=self.prepare, name="sandbox-images", daemon=True)
+        self._thread.start()
+    
+    def prepare(self):
+        """Resolve every language's image, pulling or building what is missing"""
+        
+        for language in self.languages:
+            if self._events[language].is_set():
+                continue
+            
+            started = time.time()
+            self._update(language, state="building")
+            try:
+                reference = self._prepare_language(language)
+                image_id = self.docker_client.images.get(reference).id
+                self._mark_ready(language, image_id, reference, build_time=time.time() - started)
+                logger.info(f"Sandbox image for {language} ready: {reference} ({image_id[:19]})")
+            except Exception as e:
+                logger.error(f"Failed to prepare sandbox image for {language}: {str(e)}")
+                self._update(language, state="failed", error=str(e))
+                self._events[language].set()
+        
+        self._check_all_ready()
+    
+    def image(self, language: str) -> Optional[str]:
+        """Pinned image id for language, None until it is ready"""
+        return self._images.get(language)
+    
+    def is_ready(self, language: str) -> bool:
+        return self._images.get(language) is not None
+    
+    def wait(self, language: str, timeout: Optional[float] = None) -> str:
+        """Block until language's image is ready; raises ImageNotReady on timeout or failure"""
+        
+        event = self._events.get(language)
+        if event is None:
+            raise ImageNotReady(f"No sandbox image configured for {language}")
+        
+        if not event.wait(timeout):
+            raise ImageNotReady(f"Sandbox image for {language} not ready after {timeout} seconds")
+        
+        image_id = self._images.get(language)
+        if image_id is None:
+            raise ImageNotReady(f"Sandbox image for {language} failed: {self._status[language]['error']}")
+        return image_id
+    
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self.ready.is_set(),
+                "buildkit": self.buildkit,
+                "images": {language: dict(status) for language, status in self._status.items()}
+            }
+    
+    def _prepare_language(self, language: str) -> str:
+        """Local reference for language's image after pulling or building it"""
+        
+        override = self.overrides.get(language)
+        if override:
+            # A pre-built image (ideally name@sha256:...) is pulled, never built
+            logger.info(f"Pulling sandbox image {override}")
+            self.docker_client.images.pull(override)
+            return override
+        
+        spec = IMAGE_SPECS[language]
+        base = self._base(spec)
+        if base is None:
+            raise ImageNotReady(f"Base image for {language} ({spec['from']}) is not available")
+        
+        tag = self._tag(language)
+        repository = f"{IMAGE_REPOSITORY}-{language}"
+        dockerfile = render_dockerfile(spec, base, self.buildkit)
+        
+        logger.info(f"Building sandbox image {tag}{' with BuildKit' if self.buildkit else ''}")
+        if self.buildkit:
+            self._build_with_buildkit(dockerfile, tag, repository)
+        else:
+            self.docker_client.images.build(
+                fileobj=io.BytesIO(dockerfile.encode("utf-8")),
+                tag=tag,
+                cache_from=[f"{repository}:latest"],
+                rm=True,
+                timeout=int(self.build_timeout)
+            )
+        
+        # :latest is the cache source for the next spec change
+        self.docker_client.images.get(tag).tag(repository, "latest")
+        return tag
+    
+    def _build_with_buildkit(self, dockerfile: str, tag: str, repository: str):
+        """docker build under BuildKit: cache mounts plus inline cache from the last build"""
+        
+        with tempfile.TemporaryDirectory() as context:
+            with open(os.path.join(context, "Dockerfile"), "w") as f:
+                f.write(dockerfile)
+            
+            completed = subprocess.run(
+                ["docker", "build", "--build-arg", "BUILDKIT_INLINE_CACHE=1",
+                 "--cache-from", f"{repository}:latest", "-t", tag, context],
+                env={**os.environ, "DOCKER_BUILDKIT": "1"},
+                capture_output=True,
+                text=True,
+                timeout=self.build_timeout
+            )
+        
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.strip()[-2000:] or f"docker build exited with {completed.returncode}")
+    
+    def _tag(self, language: str) -> Optional[str]:
+        """Content tag: changes whenever the Dockerfile (or its base image) does"""
+        
+        spec = IMAGE_SPECS.get(language)
+        if spec is None:
+            return None
+        
+        base = self._base(spec)
+        if base is None:
+            return None
+        
+        # The tag must not depend on which builder produced it
+        digest = hashlib.sha256(render_dockerfile(spec, base, False).encode("utf-8")).hexdigest()
+        return f"{IMAGE_REPOSITORY}-{language}:{digest[:12]}"
+    
+    def _base(self, spec: Dict[str, Any]) -> Optional[str]:
+        """FROM reference: a public base, or the (content-tagged) image it layers on"""
+        
+        if "from" not in spec:
+            return spec["base"]
+        if not self.is_ready(spec["from"]):
+            return None
+        return self._status[spec["from"]]["tag"]
+    
+    def _mark_ready(self, language: str, image_id: str, reference: str, build_time: Optional[float] = None):
+        self._images[language] = image_id
+        self._update(language, state="ready", image=image_id, tag=reference, error=None, build_time=build_time)
+        self._events[language].set()
+    
+    def _update(self, language: str, **fields):
+        with self._lock:
+            self._status[language].update(fields)
+    
+    def _check_all_ready(self):
+        if self.ready.is_set() or not all(event.is_set() for event in self._events.values()):
+            return
+        
+        self.ready.set()
+        if self.on_ready:
+            try:
+                self.on_ready(self)
+            except Exception as e:
+                logger.error(f"Sandbox image ready callback failed: {str(e)}")
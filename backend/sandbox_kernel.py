@@ -0,0 +1,597 @@
+"""
+Sandbox Session Kernels
+Long-lived per-session Python/Node interpreters that keep state between executions
+"""
+import os
+import sys
+import json
+import logging
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional, Tuple, Union, Callable
+
+from docker.utils.socket import frames_iter, STDERR
+
+from sandbox_output import OutputCollector
+from sandbox_pool import start_session_container, remove_container, remove_stale_containers
+
+logger = logging.getLogger(__name__)
+
+KERNEL_LABEL = "ali.sandbox.kernel"
+
+KERNEL_LANGUAGES = ("python", "javascript")
+
+# Kernels speak newline-delimited JSON on stdin/stdout. A request is
+# {"id", "code", "cpu"}; the kernel answers with {"id", "stream", "data"}
+# output events followed by one {"id", "done", "status", "error"} event.
+PYTHON_KERNEL_SOURCE = r'''
+import io, json, sys, traceback
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_protocol = sys.stdout
+_namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+
+def _emit(event):
+    _protocol.write(json.dumps(event) + "\n")
+    _protocol.flush()
+
+class _Stream(io.TextIOBase):
+    def __init__(self, name):
+        self.name = name
+        self.request_id = None
+    def writable(self):
+        return True
+    def write(self, data):
+        if data:
+            _emit({"id": self.request_id, "stream": self.name, "data": data})
+        return len(data)
+
+_stdout, _stderr = _Stream("stdout"), _Stream("stderr")
+sys.stdout, sys.stderr, sys.stdin = _stdout, _stderr, io.StringIO()
+
+def _limit_cpu(seconds):
+    if not resource or not seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+    try:
+        hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    except (ValueError, OSError):
+        pass
+
+def _usage():
+    if not resource:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF)
+
+for _line in sys.__stdin__:
+    _request = json.loads(_line)
+    _stdout.request_id = _stderr.request_id = _request["id"]
+    _limit_cpu(_request.get("cpu"))
+    _before = _usage()
+    _status, _error = "ok", None
+    try:
+        exec(compile(_request["code"], "<session>", "exec"), _namespace)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            _status, _error = "error", f"SystemExit: {e.code}"
+    except BaseException as e:
+        # Drop the driver's own frame from the traceback
+        _status, _error = "error", "".join(traceback.format_exception(type(e), e, e.__traceback__.tb_next))
+        _stderr.write(_error)
+    _after = _usage()
+    # CPU and I/O for this request; peak memory is the kernel's high-water mark
+    _resources = _after and {
+        "cpu_time": round(_after.ru_utime + _after.ru_stime - _before.ru_utime - _before.ru_stime, 6),
+        "peak_rss": _after.ru_maxrss * (1 if sys.platform == "darwin" else 1024),
+        "io_read_bytes": (_after.ru_inblock - _before.ru_inblock) * 512,
+        "io_write_bytes": (_after.ru_oublock - _before.ru_oublock) * 512,
+        "source": "kernel_rusage"
+    }
+    _emit({"id": _request["id"], "done": True, "status": _status, "error": _error, "usage": _resources})
+'''
+
+JAVASCRIPT_KERNEL_SOURCE = r'''
+const readline = require("readline");
+const util = require("util");
+const vm = require("vm");
+
+let requestId = null;
+const emit = (event) => process.stdout.write(JSON.stringify(event) + "\n");
+const writer = (stream) => (...args) => emit({id: requestId, stream, data: util.format(...args) + "\n"});
+
+const context = vm.createContext({
+    console: {log: writer("stdout"), info: writer("stdout"), debug: writer("stdout"),
+              warn: writer("stderr"), error: writer("stderr")},
+    require, Buffer, URL, TextEncoder, TextDecoder,
+    setTimeout, clearTimeout, setInterval, clearInterval, setImmediate, clearImmediate
+});
+
+readline.createInterface({input: process.stdin}).on("line", (line) => {
+    const request = JSON.parse(line);
+    requestId = request.id;
+    const cpuBefore = process.cpuUsage();
+    const ioBefore = process.resourceUsage();
+    let status = "ok", error = null;
+    try {
+        vm.runInContext(request.code, context, {filename: "session.js"});
+    } catch (e) {
+        status = "error";
+        // Keep the user's frames, drop node internals
+        error = String((e && e.stack) || e).split("\n").filter((l) => !l.includes("node:") && !l.includes("[eval]")).join("\n");
+        emit({id: requestId, stream: "stderr", data: error + "\n"});
+    }
+    const cpu = process.cpuUsage(cpuBefore);
+    const io = process.resourceUsage();
+    const usage = {
+        cpu_time: (cpu.user + cpu.system) / 1e6,
+        peak_rss: io.maxRSS * 1024,
+        io_read_bytes: (io.fsRead - ioBefore.fsRead) * 512,
+        io_write_bytes: (io.fsWrite - ioBefore.fsWrite) * 512,
+        source: "kernel_rusage"
+    };
+    emit({id: requestId, done: true, status, error, usage});
+});
+'''
+
+def parse_memory_limit(value: Any) -> Optional[int]:
+    """Convert a docker-style memory limit ("512m", "1g") to bytes"""
+    
+    if isinstance(value, (int, float)):
+        return int(value)
+    
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    text = str(value).strip().lower().rstrip("b")
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        return None
+
+# Host variables a locally run interpreter may inherit; everything else (tokens,
+# API keys, the backend's own config) stays out of sandboxed code
+LOCAL_ENV_KEYS = ("PATH", "LANG", "LC_ALL", "LC_CTYPE", "TZ", "SYSTEMROOT")
+
+def local_environment(environment: Optional[Dict[str, str]], home: str) -> Dict[str, str]:
+    """Environment for code run on the host: a few locale/path variables, HOME, then the caller's"""
+    
+    env = {name: os.environ[name] for name in LOCAL_ENV_KEYS if name in os.environ}
+    env["HOME"] = home
+    env.update(environment or {})
+    return env
+
+class SessionKernel(ABC):
+    """One long-lived interpreter bound to a session; runs one request at a time"""
+    
+    def __init__(self, session_id: str, language: str):
+        self.session_id = session_id
+        self.language = language
+        self.kernel_id = str(uuid.uuid4())
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.executions = 0
+        self.alive = True
+        
+        self._lock = threading.Lock()  # serializes requests
+        self._state_lock = threading.Lock()  # guards _current
+        self._current: Optional[Dict[str, Any]] = None
+        self._line_buffer = b""
+    
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+    
+    def execute(self, code: str, timeout: int,
+                output: OutputCollector) -> Tuple[str, Optional[str], Optional[Dict[str, Any]]]:
+        """Run code in the kernel; returns (status, error, usage) with status ok, error, timeout or died"""
+        
+        with self._lock:
+            if not self.alive:
+                return "died", "Kernel is not running", None
+            
+            request_id = uuid.uuid4().hex
+            current = {"id": request_id, "output": output, "done": threading.Event(),
+                       "status": "died", "error": "Kernel exited", "usage": None}
+            with self._state_lock:
+                self._current = current
+            
+            self.executions += 1
+            self.last_used = time.time()
+            
+            try:
+                request = {"id": request_id, "code": code, "cpu": timeout}
+                self._write((json.dumps(request) + "\n").encode("utf-8"))
+            except OSError as e:
+                self._mark_dead()
+                return "died", f"Kernel stdin closed: {str(e)}", None
+            
+            finished = current["done"].wait(timeout)
+            
+            with self._state_lock:
+                self._current = None
+            self.last_used = time.time()
+            
+            if not finished:
+                # The request may still be running: the kernel state is unknown
+                self.kill()
+                return "timeout", None, None
+            
+            return current["status"], current["error"], current["usage"]
+    
+    def info(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "language": self.language,
+            "kernel_id": self.kernel_id,
+            "created_at": self.created_at,
+            "last_used": self.last_used,
+            "executions": self.executions,
+            "busy": self.busy,
+            "alive": self.alive
+        }
+    
+    @abstractmethod
+    def kill(self):
+        """Stop the interpreter immediately"""
+    
+    @abstractmethod
+    def _write(self, data: bytes):
+        """Send bytes to the interpreter's stdin"""
+    
+    def _feed_stdout(self, data: bytes):
+        """Split protocol output into lines and dispatch them"""
+        
+        self._line_buffer += data
+        *lines, self._line_buffer = self._line_buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                self._handle_line(line)
+    
+    def _feed_stderr(self, data: bytes):
+        """Raw interpreter stderr goes to whichever request is running"""
+        
+        with self._state_lock:
+            current = self._current
+        if current:
+            current["output"].feed("stderr", data)
+    
+    def _handle_line(self, line: bytes):
+        with self._state_lock:
+            current = self._current
+        
+        try:
+            event = json.loads(line)
+        except ValueError:
+            event = None
+        
+        if not isinstance(event, dict):
+            # Something wrote straight to the real stdout: pass it through
+            if current:
+                current["output"].feed("stdout", line + b"\n")
+            return
+        
+        if not current or event.get("id") != current["id"]:
+            return
+        
+        if event.get("done"):
+            current["status"] = event.get("status", "error")
+            current["error"] = event.get("error")
+            current["usage"] = event.get("usage")
+            current["done"].set()
+        elif event.get("stream") in ("stdout", "stderr"):
+            current["output"].feed(event["stream"], str(event.get("data", "")).encode("utf-8"))
+    
+    def _mark_dead(self):
+        """Called when the interpreter's output closes"""
+        
+        self.alive = False
+        with self._state_lock:
+            current = self._current
+        if current:
+            current["done"].set()
+
+class LocalSessionKernel(SessionKernel):
+    """Kernel running as a local subprocess in its own scratch directory"""
+    
+    def __init__(self, session_id: str, language: str, resource_limits: Dict[str, Any]):
+        super().__init__(session_id, language)
+        
+        self.workspace = tempfile.mkdtemp(prefix="ali_kernel_")
+        memory = parse_memory_limit(resource_limits.get("max_memory"))
+        
+        if language == "python":
+            command = [sys.executable, "-u", "-c", PYTHON_KERNEL_SOURCE]
+        else:
+            command = ["node", "-e", JAVASCRIPT_KERNEL_SOURCE]
+            if memory:
+                command.insert(1, f"--max-old-space-size={max(16, memory // (1024 * 1024))}")
+        
+        def limit_resources():
+            # V8 reserves far more address space than it uses, so node is capped by heap size instead
+            if memory and language == "python":
+                try:
+                    import resource
+                    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+                except (ImportError, ValueError, OSError):
+                    pass
+        
+        env = local_environment({"PYTHONUNBUFFERED": "1", "SESSION_ID": session_id}, self.workspace)
+        
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.workspace,
+            env=env,
+            preexec_fn=limit_resources if os.name == "posix" else None,
+            start_new_session=True
+        )
+        
+        threading.Thread(target=self._read, args=(self.process.stdout, self._feed_stdout),
+                         name=f"kernel-{self.kernel_id[:8]}-out", daemon=True).start()
+        threading.Thread(target=self._read, args=(self.process.stderr, self._feed_stderr),
+                         name=f"kernel-{self.kernel_id[:8]}-err", daemon=True).start()
+    
+    def _read(self, pipe, handler):
+        try:
+            read = getattr(pipe, "read1", pipe.read)
+            while True:
+                data = read(4096)
+                if not data:
+                    break
+                handler(data)
+        except (OSError, ValueError):
+            pass
+        finally:
+            if handler == self._feed_stdout:
+                self._mark_dead()
+    
+    def _write(self, data: bytes):
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+    
+    def info(self) -> Dict[str, Any]:
+        info = super().info()
+        info.update({"type": "local", "pid": self.process.pid})
+        return info
+    
+    def kill(self):
+        self.alive = False
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (OSError, AttributeError):
+            try:
+                self.process.kill()
+            except OSError:
+                pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+        shutil.rmtree(self.workspace, ignore_errors=True)
+
+class DockerSessionKernel(SessionKernel):
+    """Kernel exec'd into a dedicated locked-down session container"""
+    
+    def __init__(self, session_id: str, language: str, docker_client, image: str,
+                 resource_limits: Dict[str, Any]):
+        super().__init__(session_id, language)
+        
+        self.docker_client = docker_client
+        self.pooled = start_session_container(
+            docker_client, image, resource_limits, language, labels={KERNEL_LABEL: session_id}
+        )
+        
+        if language == "python":
+            command = ["python", "-u", "-c", PYTHON_KERNEL_SOURCE]
+        else:
+            command = ["node", "-e", JAVASCRIPT_KERNEL_SOURCE]
+        
+        try:
+            api = docker_client.api
+            exec_id = api.exec_create(
+                self.pooled.id, command, stdin=True, workdir="/workspace",
+                environment={"PYTHONUNBUFFERED": "1", "SESSION_ID": session_id}
+            )["Id"]
+            self.sock = api.exec_start(exec_id, socket=True)
+        except Exception:
+            remove_container(self.pooled)
+            raise
+        
+        self._raw = getattr(self.sock, "_sock", self.sock)
+        
+        threading.Thread(target=self._read, name=f"kernel-{self.kernel_id[:8]}", daemon=True).start()
+    
+    def _read(self):
+        try:
+            # Multiplexed frames: stream id 1 is stdout, 2 is stderr
+            for stream_id, data in frames_iter(self.sock, tty=False):
+                if stream_id == STDERR:
+                    self._feed_stderr(data)
+                else:
+                    self._feed_stdout(data)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._mark_dead()
+    
+    def _write(self, data: bytes):
+        self._raw.sendall(data)
+    
+    def info(self) -> Dict[str, Any]:
+        info = super().info()
+        info.update({"type": "docker", "container_id": self.pooled.id})
+        return info
+    
+    def kill(self):
+        self.alive = False
+        try:
+            self._raw.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        remove_container(self.pooled)
+
+class SessionKernelManager:
+    """Starts, reuses, resets and idle-evicts session kernels"""
+    
+    def __init__(self, docker_client, image: Union[str, Callable[[str], str], None], resource_limits: Dict[str, Any],
+                 idle_timeout: float = 600.0, max_kernels: int = 8, reap_interval: float = 30.0):
+        self.docker_client = docker_client
+        self.image = image
+        self.resource_limits = resource_limits
+        self.idle_timeout = idle_timeout
+        self.max_kernels = max_kernels
+        self.reap_interval = reap_interval
+        
+        self._lock = threading.Lock()
+        self._kernels: Dict[Tuple[str, str], SessionKernel] = {}
+        self._stopped = threading.Event()
+        
+        self.metrics = {
+            "started": 0,
+            "reused": 0,
+            "evicted_idle": 0,
+            "evicted_capacity": 0,
+            "restarted": 0,
+            "resets": 0
+        }
+        
+        self._remove_stale_containers()
+        
+        self._reaper = threading.Thread(target=self._reap_loop, name="sandbox-kernel-reaper", daemon=True)
+        self._reaper.start()
+    
+    def get_kernel(self, session_id: str, language: str) -> Tuple[SessionKernel, bool]:
+        """Get the session's kernel for a language, starting one if needed; returns (kernel, started)"""
+        
+        key = (session_id, language)
+        evicted = []
+        
+        with self._lock:
+            kernel = self._kernels.get(key)
+            if kernel and kernel.alive:
+                self.metrics["reused"] += 1
+                return kernel, False
+            
+            if kernel:
+                # Died (timeout, crash, OOM) since its last use
+                self.metrics["restarted"] += 1
+                del self._kernels[key]
+            
+            # Make room by evicting the least recently used idle kernels
+            while len(self._kernels) >= self.max_kernels:
+                idle = [k for k in self._kernels.values() if not k.busy]
+                if not idle:
+                    break
+                victim = min(idle, key=lambda k: k.last_used)
+                del self._kernels[(victim.session_id, victim.language)]
+                evicted.append(victim)
+                self.metrics["evicted_capacity"] += 1
+        
+        for victim in evicted:
+            logger.info(f"Evicting kernel for session {victim.session_id} to make room")
+            victim.kill()
+        
+        kernel = self._start_kernel(session_id, language)
+        
+        with self._lock:
+            existing = self._kernels.get(key)
+            if existing and existing.alive:
+                # Another thread started one first
+                duplicate, kernel = kernel, existing
+            else:
+                duplicate = None
+                self._kernels[key] = kernel
+                self.metrics["started"] += 1
+        
+        if duplicate:
+            duplicate.kill()
+            return kernel, False
+        
+        return kernel, True
+    
+    def reset(self, session_id: str, language: Optional[str] = None) -> int:
+        """Shut down a session's kernels so the next execution starts clean"""
+        
+        with self._lock:
+            keys = [key for key in self._kernels
+                    if key[0] == session_id and (language is None or key[1] == language)]
+            kernels = [self._kernels.pop(key) for key in keys]
+            self.metrics["resets"] += len(kernels)
+        
+        for kernel in kernels:
+            kernel.kill()
+        
+        if kernels:
+            logger.info(f"Reset {len(kernels)} kernel(s) for session {session_id}")
+        
+        return len(kernels)
+    
+    def get_kernels(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            kernels = list(self._kernels.values())
+        return [kernel.info() for kernel in kernels]
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self.metrics)
+            metrics["active"] = len(self._kernels)
+        return metrics
+    
+    def shutdown(self):
+        """Stop the reaper and every kernel"""
+        
+        self._stopped.set()
+        
+        with self._lock:
+            kernels = list(self._kernels.values())
+            self._kernels.clear()
+        
+        for kernel in kernels:
+            kernel.kill()
+    
+    def _start_kernel(self, session_id: str, language: str) -> SessionKernel:
+        logger.info(f"Starting {language} kernel for session {session_id}")
+        
+        if self.docker_client:
+            image = self.image(language) if callable(self.image) else self.image
+            return DockerSessionKernel(session_id, language, self.docker_client, image,
+                                       self.resource_limits)
+        return LocalSessionKernel(session_id, language, self.resource_limits)
+    
+    def _reap_loop(self):
+        """Shut down kernels that have been idle longer than idle_timeout"""
+        
+        while not self._stopped.wait(self.reap_interval):
+            cutoff = time.time() - self.idle_timeout
+            
+            with self._lock:
+                expired = [key for key, kernel in self._kernels.items()
+                           if not kernel.alive or (not kernel.busy and kernel.last_used < cutoff)]
+                kernels = [self._kernels.pop(key) for key in expired]
+                self.metrics["evicted_idle"] += len(kernels)
+            
+            for kernel in kernels:
+                logger.info(f"Evicting idle kernel for session {kernel.session_id}")
+                kernel.kill()
+    
+    def _remove_stale_containers(self):
+        """Remove kernel containers left behind by backend processes that have exited"""
+        
+        if self.docker_client:
+            remove_stale_containers(self.docker_client, KERNEL_LABEL)
@@ -0,0 +1,287 @@
+"""
+Sandbox Metrics
+Per-execution resource accounting (CPU, peak memory, I/O, exit reason) and aggregate histograms
+"""
+import os
+import sys
+import bisect
+import logging
+import signal
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0]
+MEMORY_BUCKETS = [mb * 1024 * 1024 for mb in (8, 16, 32, 64, 128, 256, 512, 1024, 2048)]
+IO_BUCKETS = [kb * 1024 for kb in (4, 64, 1024, 16 * 1024, 256 * 1024, 1024 * 1024)]
+
+CGROUP_V2_PATHS = (
+    "/sys/fs/cgroup/system.slice/docker-{id}.scope",
+    "/sys/fs/cgroup/docker/{id}"
+)
+
+def exit_reason(exit_code: Optional[int], timed_out: bool, oom: bool = False) -> str:
+    """Classify how an execution ended: completed, error, timeout, oom, cpu_limit, signal"""
+    
+    if timed_out:
+        return "timeout"
+    if oom:
+        return "oom"
+    if exit_code is None:
+        return "error"
+    if exit_code == 0:
+        return "completed"
+    if exit_code == -signal.SIGXCPU:
+        return "cpu_limit"
+    if exit_code < 0 or exit_code > 128:
+        return "signal"
+    return "error"
+
+def usage_from_rusage(rusage) -> Dict[str, Any]:
+    """Resource usage dict from a struct rusage (or an equivalent dict)"""
+    
+    get = rusage.get if isinstance(rusage, dict) else lambda name: getattr(rusage, name)
+    
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+    
+    return {
+        "cpu_time": round(get("ru_utime") + get("ru_stime"), 6),
+        "cpu_user": round(get("ru_utime"), 6),
+        "cpu_system": round(get("ru_stime"), 6),
+        "peak_rss": int(get("ru_maxrss")) * rss_unit,
+        # Block I/O is counted in 512-byte units
+        "io_read_bytes": int(get("ru_inblock")) * 512,
+        "io_write_bytes": int(get("ru_oublock")) * 512,
+        "source": "rusage"
+    }
+
+def find_cgroup_v2(container_id: str) -> Optional[str]:
+    """Host cgroup v2 directory of a container, if this process can see it"""
+    
+    for template in CGROUP_V2_PATHS:
+        path = template.format(id=container_id)
+        if os.path.exists(os.path.join(path, "cpu.stat")):
+            return path
+    return None
+
+def read_cgroup_v2(path: str) -> Dict[str, int]:
+    """CPU, memory, I/O and OOM counters from a cgroup v2 directory"""
+    
+    counters = {}
+    
+    def read_keyed(name: str) -> Dict[str, int]:
+        try:
+            with open(os.path.join(path, name)) as f:
+                return {key: int(value) for key, value in (line.split() for line in f if line.strip())}
+        except (OSError, ValueError):
+            return {}
+    
+    cpu = read_keyed("cpu.stat")
+    if "usage_usec" in cpu:
+        counters["cpu_ns"] = cpu["usage_usec"] * 1000
+    
+    for name in ("memory.current", "memory.peak"):
+        try:
+            with open(os.path.join(path, name)) as f:
+                counters[name.split(".")[1]] = int(f.read().strip())
+        except (OSError, ValueError):
+            pass
+    
+    counters["oom_kill"] = read_keyed("memory.events").get("oom_kill", 0)
+    
+    try:
+        with open(os.path.join(path, "io.stat")) as f:
+            read_bytes = write_bytes = 0
+            for line in f:
+                for field in line.split()[1:]:
+                    key, _, value = field.partition("=")
+                    if key == "rbytes":
+                        read_bytes += int(value)
+                    elif key == "wbytes":
+                        write_bytes += int(value)
+        counters["io_read"] = read_bytes
+        counters["io_write"] = write_bytes
+    except (OSError, ValueError):
+        pass
+    
+    return counters
+
+def read_docker_stats(api, container_id: str) -> Dict[str, int]:
+    """Same counters from the docker stats API (one-shot, no 1s priming delay)"""
+    
+    stats = api.stats(container_id, stream=False, one_shot=True)
+    counters = {}
+    
+    cpu_usage = (stats.get("cpu_stats") or {}).get("cpu_usage") or {}
+    if "total_usage" in cpu_usage:
+        counters["cpu_ns"] = cpu_usage["total_usage"]
+    
+    memory = stats.get("memory_stats") or {}
+    if "usage" in memory:
+        counters["current"] = memory["usage"]
+    if "max_usage" in memory:  # cgroup v1 only
+        counters["peak"] = memory["max_usage"]
+    
+    blkio = (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []
+    counters["io_read"] = sum(entry.get("value", 0) for entry in blkio if entry.get("op", "").lower() == "read")
+    counters["io_write"] = sum(entry.get("value", 0) for entry in blkio if entry.get("op", "").lower() == "write")
+    
+    return counters
+
+class ContainerUsageSampler:
+    """Measures one execution's usage in a container it has to itself
+    
+    CPU and I/O are counter deltas between start() and stop(); peak memory is
+    the highest sample taken while running, or the cgroup's own high-water
+    mark when the container was started for this execution (fresh). Counters
+    come from the host's cgroup v2 files when visible, otherwise from the
+    docker stats API.
+    """
+    
+    def __init__(self, docker_client, container_id: str, interval: float = 0.1, fresh: bool = False):
+        self.api = docker_client.api
+        self.container_id = container_id
+        self.interval = interval
+        self.fresh = fresh
+        self.cgroup_path = find_cgroup_v2(container_id)
+        self.baseline: Dict[str, int] = {}
+        self.latest: Dict[str, int] = {}
+        self.peak_memory = 0
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def start(self) -> "ContainerUsageSampler":
+        self.baseline = self._sample() or {}
+        self._thread = threading.Thread(target=self._run, name="sandbox-usage-sampler", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self) -> Dict[str, Any]:
+        """Stop sampling and return the usage dict"""
+        
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        
+        # The container may already be gone (cold runs): keep the last sample
+        self._sample()
+        latest = self.latest
+        
+        def delta(name: str) -> Optional[int]:
+            if name not in latest:
+                return None
+            return max(0, latest[name] - self.baseline.get(name, 0))
+        
+        cpu_ns = delta("cpu_ns")
+        peak = self.peak_memory
+        if self.fresh:
+            peak = max(peak, latest.get("peak", 0))
+        
+        return {
+            "cpu_time": round(cpu_ns / 1e9, 6) if cpu_ns is not None else None,
+            "peak_rss": peak or None,
+            "io_read_bytes": delta("io_read"),
+            "io_write_bytes": delta("io_write"),
+            "oom_killed": bool(delta("oom_kill")),
+            "source": "cgroup_v2" if self.cgroup_path else "docker_stats"
+        }
+    
+    def _sample(self) -> Optional[Dict[str, int]]:
+        try:
+            if self.cgroup_path:
+                counters = read_cgroup_v2(self.cgroup_path)
+            else:
+                counters = read_docker_stats(self.api, self.container_id)
+        except Exception:
+            return None
+        
+        if counters:
+            self.latest = counters
+            self.peak_memory = max(self.peak_memory, counters.get("current", 0))
+        return counters
+    
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+class Histogram:
+    """Fixed-bucket histogram with count/sum/min/max"""
+    
+    def __init__(self, bounds: List[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile"""
+        
+        if not self.count:
+            return None
+        
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "avg": self.total / self.count if self.count else 0.0,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": [
+                {"le": bound, "count": count}
+                for bound, count in zip(self.bounds + ["+Inf"], self.counts)
+            ]
+        }
+
+class ResourceStats:
+    """Aggregate resource histograms across executions"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {
+            "wall_time": Histogram(TIME_BUCKETS),
+            "cpu_time": Histogram(TIME_BUCKETS),
+            "peak_rss": Histogram(MEMORY_BUCKETS),
+            "io_read_bytes": Histogram(IO_BUCKETS),
+            "io_write_bytes": Histogram(IO_BUCKETS)
+        }
+        self.exit_reasons = Counter()
+        self.by_method = Counter()
+    
+    def record(self, usage: Dict[str, Any], wall_time: float, reason: str, method: Optional[str]):
+        with self._lock:
+            self.histograms["wall_time"].observe(wall_time)
+            for name in ("cpu_time", "peak_rss", "io_read_bytes", "io_write_bytes"):
+                if usage.get(name) is not None:
+                    self.histograms[name].observe(usage[name])
+            self.exit_reasons[reason] += 1
+            self.by_method[method or "unknown"] += 1
+    
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "histograms": {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+                "exit_reasons": dict(self.exit_reasons),
+                "execution_methods": dict(self.by_method)
+            }
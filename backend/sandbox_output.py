@@ -0,0 +1,156 @@
+"""
+Sandbox Output
+Bounded, streaming capture of stdout/stderr from sandbox executions
+"""
+import codecs
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+OutputCallback = Callable[[Dict[str, Any]], None]
+
+class StreamBuffer:
+    """Keeps the head of a stream up to a budget plus a ring-buffered tail"""
+    
+    def __init__(self, head_bytes: int, tail_bytes: int):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = deque()
+        self.tail_size = 0
+        self.total_bytes = 0
+    
+    def write(self, data: bytes):
+        self.total_bytes += len(data)
+        
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        
+        if not data or self.tail_bytes <= 0:
+            return
+        
+        self.tail.append(data)
+        self.tail_size += len(data)
+        
+        # Drop whole chunks from the left, then trim the oldest one
+        while self.tail_size - len(self.tail[0]) >= self.tail_bytes:
+            self.tail_size -= len(self.tail.popleft())
+        if self.tail_size > self.tail_bytes:
+            excess = self.tail_size - self.tail_bytes
+            self.tail[0] = self.tail[0][excess:]
+            self.tail_size -= excess
+    
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > len(self.head) + self.tail_size
+    
+    def getvalue(self) -> str:
+        """Retained output, with a marker where bytes were dropped"""
+        
+        head = bytes(self.head).decode("utf-8", errors="replace")
+        if not self.tail:
+            return head
+        
+        tail = b"".join(self.tail).decode("utf-8", errors="replace")
+        dropped = self.total_bytes - len(self.head) - self.tail_size
+        if dropped > 0:
+            return f"{head}\n... [{dropped} bytes truncated] ...\n{tail}"
+        return head + tail
+
+class OutputCollector:
+    """Collects separated stdout/stderr under a per-execution byte cap and forwards chunks"""
+    
+    def __init__(self, max_bytes: int = 1024 * 1024, tail_bytes: int = 64 * 1024,
+                 on_output: Optional[OutputCallback] = None, execution_id: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.on_output = on_output
+        self.execution_id = execution_id
+        self.forwarded_bytes = 0
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._decoders = {
+            "stdout": codecs.getincrementaldecoder("utf-8")(errors="replace"),
+            "stderr": codecs.getincrementaldecoder("utf-8")(errors="replace")
+        }
+        
+        # Half of the cap for each stream's head, plus a tail ring per stream
+        self.buffers = {
+            "stdout": StreamBuffer(max_bytes // 2, tail_bytes),
+            "stderr": StreamBuffer(max_bytes // 2, tail_bytes)
+        }
+    
+    def feed(self, stream: str, data: bytes):
+        """Record a chunk of raw output from stdout or stderr"""
+        
+        if not data:
+            return
+        
+        with self._lock:
+            self.buffers[stream].write(data)
+            
+            if not self.on_output or self.forwarded_bytes >= self.max_bytes:
+                return
+            
+            data = data[:self.max_bytes - self.forwarded_bytes]
+            self.forwarded_bytes += len(data)
+            text = self._decoders[stream].decode(data)
+            self._sequence += 1
+            sequence = self._sequence
+        
+        if text:
+            self._forward({
+                "type": "output",
+                "stream": stream,
+                "data": text,
+                "sequence": sequence,
+                "execution_id": self.execution_id
+            })
+    
+    def _forward(self, chunk: Dict[str, Any]):
+        """Hand a chunk to the callback without letting it break the execution"""
+        
+        try:
+            self.on_output(chunk)
+        except Exception as e:
+            logger.warning(f"Output callback failed: {str(e)}")
+            self.on_output = None
+    
+    @property
+    def stdout(self) -> str:
+        return self.buffers["stdout"].getvalue()
+    
+    @property
+    def stderr(self) -> str:
+        return self.buffers["stderr"].getvalue()
+    
+    def metadata(self) -> Dict[str, Any]:
+        """Byte counts and truncation flags for ExecutionResult.metadata"""
+        
+        return {
+            "stdout_bytes": self.buffers["stdout"].total_bytes,
+            "stderr_bytes": self.buffers["stderr"].total_bytes,
+            "output_truncated": self.buffers["stdout"].truncated or self.buffers["stderr"].truncated
+        }
+
+def pump_stream(pipe, collector: OutputCollector, stream: str, chunk_size: int = 4096):
+    """Read a binary pipe into the collector until EOF (run on a reader thread)"""
+    
+    try:
+        read = getattr(pipe, "read1", pipe.read)
+        while True:
+            data = read(chunk_size)
+            if not data:
+                break
+            collector.feed(stream, data)
+    except (OSError, ValueError):
+        pass
+    finally:
+        try:
+            pipe.close()
+        except OSError:
+            pass
@@ -0,0 +1,429 @@
+"""
+Sandbox Container Pool
+Pre-started, locked-down containers reused across sandbox executions
+"""
+import os
+import socket
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, Any, List, Optional, Union, Callable
+
+import docker
+
+logger = logging.getLogger(__name__)
+
+POOL_LABEL = "ali.sandbox.pool"
+
+# Every session container also records which backend process started it, so
+# cleanup on startup only touches containers whose owner has exited and never
+# those of another backend sharing the Docker host.
+OWNER_LABEL = "ali.sandbox.owner"
+INSTANCE_ID = uuid.uuid4().hex
+
+# The only writable paths in a session container (the root filesystem is read-only)
+SCRATCH_PATHS = ["/workspace", "/tmp", "/var/tmp", "/home/sandbox"]
+
+# Run between uses: kill every process but PID 1 (and this shell), wipe the
+# scratch paths, then fail if anything other than a zombie is still alive.
+# Only shell builtins are used after the kill, so the check sees no children.
+RESET_SCRIPT = """
+kill -9 -1 2>/dev/null
+kill -9 -1 2>/dev/null
+for dir in {paths}; do rm -rf "$dir"/* "$dir"/.[!.]* "$dir"/..?* 2>/dev/null; done
+for proc in /proc/[0-9]*; do
+    pid=${{proc#/proc/}}
+    if [ "$pid" = 1 ] || [ "$pid" = $$ ]; then continue; fi
+    [ -r "$proc/status" ] || continue
+    while read -r key value rest; do
+        if [ "$key" = "State:" ]; then
+            [ "$value" = Z ] || exit 1
+            break
+        fi
+    done < "$proc/status"
+done
+exit 0
+""".format(paths=" ".join(SCRATCH_PATHS + ["/dev/shm"]))
+
+class PooledContainer:
+    """A warm container plus its usage bookkeeping"""
+    
+    def __init__(self, container, language: str):
+        self.container = container
+        self.language = language
+        self.uses = 0
+        self.dirty = False
+        self.created_at = time.time()
+        self.last_used = self.created_at
+    
+    @property
+    def id(self) -> str:
+        return self.container.id
+    
+    def kill(self):
+        """Kill the underlying container (used by ExecutionSandbox.kill_execution)"""
+        self.dirty = True
+        self.container.kill()
+
+def _process_start_time(pid: int) -> str:
+    """Start time of a process in clock ticks since boot, empty where /proc is unavailable"""
+    
+    try:
+        with open(f"/proc/{pid}/stat") as handle:
+            # The command name may contain spaces, so split after its closing parenthesis
+            return handle.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return ""
+
+def owner_label() -> str:
+    """host:pid:start-time:instance-id identifying this backend process"""
+    pid = os.getpid()
+    return f"{socket.gethostname()}:{pid}:{_process_start_time(pid)}:{INSTANCE_ID}"
+
+def owner_is_alive(owner: Optional[str]) -> bool:
+    """Whether the backend process named by an owner label may still be running"""
+    
+    if not owner:
+        return False
+    
+    try:
+        host, pid, start_time, instance = owner.rsplit(":", 3)
+        pid = int(pid)
+    except ValueError:
+        return False
+    
+    if instance == INSTANCE_ID:
+        return True
+    if host != socket.gethostname():
+        # Another machine's process table is not visible from here
+        return True
+    
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    
+    # A recycled pid belongs to a different process with a different start time
+    return not start_time or _process_start_time(pid) == start_time
+
+def remove_stale_containers(docker_client, label: str):
+    """Remove containers carrying label that were started by a backend process which has exited"""
+    
+    try:
+        containers = docker_client.containers.list(all=True, filters={"label": label})
+    except Exception as e:
+        logger.warning(f"Could not list stale {label} containers: {str(e)}")
+        return
+    
+    for container in containers:
+        if owner_is_alive((container.labels or {}).get(OWNER_LABEL)):
+            continue
+        try:
+            container.remove(force=True)
+        except Exception:
+            pass
+
+def start_session_container(docker_client, image: str, resource_limits: Dict[str, Any],
+                            language: str, labels: Optional[Dict[str, str]] = None) -> PooledContainer:
+    """Start an idle, locked-down container that executions are exec'd into"""
+    
+    container = docker_client.containers.run(
+        image=image,
+        command=["sleep", "infinity"],
+        name=f"ali-session-{language}-{uuid.uuid4().hex[:8]}",
+        labels={**(labels or {}), OWNER_LABEL: owner_label()},
+        mem_limit=resource_limits["max_memory"],
+        cpu_quota=int(float(resource_limits["max_cpu"]) * 100000),
+        working_dir="/workspace",
+        # Nothing written outside the scratch tmpfs mounts can outlive a reset
+        read_only=True,
+        tmpfs={path: "rw,size=64m,mode=1777" for path in SCRATCH_PATHS},
+        detach=True,
+        auto_remove=True,
+        network_disabled=True,  # Disable network access
+        cap_drop=["ALL"],  # Drop all capabilities
+        security_opt=["no-new-privileges:true"]
+    )
+    
+    return PooledContainer(container, language)
+
+def reset_container(pooled: PooledContainer) -> bool:
+    """Kill leftover processes and wipe the scratch paths, False if the container must be retired"""
+    
+    try:
+        exit_code, _ = pooled.container.exec_run(["sh", "-c", RESET_SCRIPT])
+        if exit_code != 0:
+            logger.warning(f"Container {pooled.id[:12]} still has live processes after reset")
+        return exit_code == 0
+    except Exception as e:
+        logger.warning(f"Failed to reset container {pooled.id[:12]}: {str(e)}")
+        return False
+
+def remove_container(pooled: PooledContainer):
+    """Remove a session container, ignoring ones that are already gone"""
+    
+    try:
+        pooled.container.remove(force=True)
+    except docker.errors.NotFound:
+        pass
+    except Exception as e:
+        logger.warning(f"Failed to remove container {pooled.id[:12]}: {str(e)}")
+
+class ContainerPool:
+    """Per-language pool of warm, network-disabled, capability-dropped containers"""
+    
+    def __init__(self, docker_client, image: Union[str, Callable[[str], str]], resource_limits: Dict[str, Any],
+                 languages: List[str], min_size: int = 1, max_size: int = 4,
+                 max_uses: int = 50, acquire_timeout: float = 5.0,
+                 health_check_interval: float = 30.0):
+        self.docker_client = docker_client
+        self.image = image
+        self.resource_limits = resource_limits
+        self.languages = list(languages)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        
+        self._lock = threading.Condition()
+        self._idle: Dict[str, deque] = {language: deque() for language in self.languages}
+        self._busy: Dict[str, int] = {language: 0 for language in self.languages}
+        self._stopped = threading.Event()
+        
+        self.metrics = {
+            "acquires": 0,
+            "hits": 0,
+            "misses": 0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "health_failures": 0,
+            "acquire_latency_total": 0.0,
+            "acquire_latency_max": 0.0
+        }
+        self._recent_latencies = deque(maxlen=1000)
+        
+        self._remove_stale_containers()
+        
+        for language in self.languages:
+            for _ in range(self.min_size):
+                self._add_idle(language)
+        
+        self._health_thread = threading.Thread(
+            target=self._health_loop, name="sandbox-pool-health", daemon=True
+        )
+        self._health_thread.start()
+        
+        logger.info(f"Container pool started ({self.min_size}-{self.max_size} per language)")
+    
+    def acquire(self, language: str, timeout: Optional[float] = None) -> Optional[PooledContainer]:
+        """Get a warm container for a language, None if the pool can't supply one in time"""
+        
+        if language not in self._idle or self._stopped.is_set():
+            return None
+        
+        start_time = time.time()
+        deadline = start_time + (self.acquire_timeout if timeout is None else timeout)
+        hit = True
+        create = False
+        
+        with self._lock:
+            while True:
+                if self._idle[language]:
+                    pooled = self._idle[language].popleft()
+                    break
+                
+                hit = False
+                if self._size(language) < self.max_size:
+                    # Reserve the slot, create outside the lock
+                    self._busy[language] += 1
+                    create = True
+                    pooled = None
+                    break
+                
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.metrics["timeouts"] += 1
+                    return None
+                self._lock.wait(remaining)
+            
+            if not create:
+                self._busy[language] += 1
+        
+        if create:
+            try:
+                pooled = self._start_container(language)
+            except Exception as e:
+                logger.error(f"Failed to start pooled container: {str(e)}")
+                with self._lock:
+                    self._busy[language] -= 1
+                    self._lock.notify()
+                return None
+        elif not self._is_healthy(pooled):
+            self._discard(pooled)
+            with self._lock:
+                self._busy[language] -= 1
+            return self.acquire(language, max(0.0, deadline - time.time()))
+        
+        latency = time.time() - start_time
+        with self._lock:
+            self.metrics["acquires"] += 1
+            self.metrics["hits" if hit else "misses"] += 1
+            self.metrics["acquire_latency_total"] += latency
+            self.metrics["acquire_latency_max"] = max(self.metrics["acquire_latency_max"], latency)
+            self._recent_latencies.append(latency)
+        
+        pooled.uses += 1
+        pooled.last_used = time.time()
+        return pooled
+    
+    def release(self, pooled: PooledContainer, dirty: bool = False):
+        """Return a container to the pool; dirty or worn-out containers are recycled"""
+        
+        dirty = dirty or pooled.dirty
+        
+        if not dirty and pooled.uses < self.max_uses and not self._stopped.is_set():
+            dirty = not self.reset(pooled)
+        
+        if dirty or pooled.uses >= self.max_uses or self._stopped.is_set():
+            self._discard(pooled)
+            with self._lock:
+                self._busy[pooled.language] -= 1
+                self.metrics["recycled"] += 1
+                self._lock.notify()
+            if not self._stopped.is_set():
+                self._top_up(pooled.language)
+            return
+        
+        with self._lock:
+            self._busy[pooled.language] -= 1
+            self._idle[pooled.language].append(pooled)
+            self._lock.notify()
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Pool hit rate, acquire latency and sizing"""
+        
+        with self._lock:
+            metrics = dict(self.metrics)
+            latencies = sorted(self._recent_latencies)
+            metrics["idle"] = {language: len(idle) for language, idle in self._idle.items()}
+            metrics["busy"] = dict(self._busy)
+        
+        acquires = metrics["acquires"]
+        metrics["hit_rate"] = metrics["hits"] / acquires if acquires else 0.0
+        metrics["acquire_latency_avg"] = metrics["acquire_latency_total"] / acquires if acquires else 0.0
+        metrics["acquire_latency_p95"] = latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+        
+        return metrics
+    
+    def shutdown(self):
+        """Stop health checks and remove every pooled container"""
+        
+        self._stopped.set()
+        
+        with self._lock:
+            idle = [pooled for queue in self._idle.values() for pooled in queue]
+            for queue in self._idle.values():
+                queue.clear()
+            self._lock.notify_all()
+        
+        for pooled in idle:
+            self._discard(pooled)
+        
+        logger.info("Container pool shut down")
+    
+    def _size(self, language: str) -> int:
+        return len(self._idle[language]) + self._busy[language]
+    
+    def _start_container(self, language: str) -> PooledContainer:
+        """Start a long-lived idle container with the sandbox restrictions"""
+        
+        pooled = start_session_container(
+            self.docker_client, self.image(language) if callable(self.image) else self.image,
+            self.resource_limits, language,
+            labels={POOL_LABEL: language}
+        )
+        
+        with self._lock:
+            self.metrics["created"] += 1
+        
+        return pooled
+    
+    def _add_idle(self, language: str):
+        """Start a container and park it in the idle queue"""
+        
+        try:
+            pooled = self._start_container(language)
+        except Exception as e:
+            logger.error(f"Failed to warm {language} container: {str(e)}")
+            return
+        
+        with self._lock:
+            self._idle[language].append(pooled)
+            self._lock.notify()
+    
+    def _top_up(self, language: str):
+        """Bring the pool back up to min_size for a language"""
+        
+        with self._lock:
+            missing = self.min_size - self._size(language)
+        
+        for _ in range(max(0, missing)):
+            self._add_idle(language)
+    
+    def reset(self, pooled: PooledContainer) -> bool:
+        """Kill leftover processes and wipe the scratch paths between uses, False if the container is unusable"""
+        return reset_container(pooled)
+    
+    def _is_healthy(self, pooled: PooledContainer) -> bool:
+        """Check the container is still running"""
+        
+        try:
+            pooled.container.reload()
+            healthy = pooled.container.status == "running"
+        except docker.errors.NotFound:
+            healthy = False
+        except Exception as e:
+            logger.warning(f"Health check failed for {pooled.id[:12]}: {str(e)}")
+            healthy = False
+        
+        if not healthy:
+            with self._lock:
+                self.metrics["health_failures"] += 1
+        
+        return healthy
+    
+    def _discard(self, pooled: PooledContainer):
+        """Remove a container, ignoring ones that are already gone"""
+        remove_container(pooled)
+    
+    def _remove_stale_containers(self):
+        """Remove pool containers left behind by backend processes that have exited"""
+        remove_stale_containers(self.docker_client, POOL_LABEL)
+    
+    def _health_loop(self):
+        """Periodically drop unhealthy idle containers and refill to min_size"""
+        
+        while not self._stopped.wait(self.health_check_interval):
+            for language in self.languages:
+                with self._lock:
+                    idle = list(self._idle[language])
+                
+                for pooled in idle:
+                    if self._is_healthy(pooled):
+                        continue
+                    
+                    with self._lock:
+                        # Skip containers acquired while we were checking
+                        if pooled not in self._idle[language]:
+                            continue
+                        self._idle[language].remove(pooled)
+                    
+                    self._discard(pooled)
+                
+                self._top_up(language)
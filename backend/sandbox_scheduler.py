@@ -0,0 +1,221 @@
+"""
+Sandbox Scheduler
+Priority queue with concurrency caps and host-resource admission for sandbox executions
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+PRIORITY_CRITICAL = 0
+PRIORITY_NORMAL = 10
+PRIORITY_BACKGROUND = 20
+
+class QueueTimeout(Exception):
+    """Raised when an execution waits longer than the queue timeout for a slot"""
+
+class ExecutionTicket:
+    """A queued or running execution's place in the scheduler"""
+    
+    def __init__(self, session_id: Optional[str], priority: int, sequence: int):
+        self.session_id = session_id
+        self.priority = priority
+        self.sequence = sequence
+        self.enqueued_at = time.time()
+        self.admitted_at: Optional[float] = None
+        self.queue_position = 0
+    
+    @property
+    def admitted(self) -> bool:
+        return self.admitted_at is not None
+    
+    @property
+    def queue_wait(self) -> float:
+        return (self.admitted_at or time.time()) - self.enqueued_at
+    
+    def __lt__(self, other: "ExecutionTicket") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+    
+    def metadata(self) -> Dict[str, Any]:
+        """Scheduling details for ExecutionResult.metadata"""
+        return {
+            "queue_wait": round(self.queue_wait, 6),
+            "queue_position": self.queue_position,
+            "priority": self.priority
+        }
+
+class ExecutionScheduler:
+    """Admits executions by priority under global/per-session caps and host headroom
+    
+    Executions without a session id only count against the global cap.
+    """
+    
+    def __init__(self, max_concurrent: int = 4, max_per_session: int = 2,
+                 memory_per_execution: int = 512 * 1024 * 1024,
+                 memory_reserve: int = 256 * 1024 * 1024,
+                 max_cpu_percent: float = 90.0, queue_timeout: Optional[float] = 300.0,
+                 resource_poll_interval: float = 0.25):
+        self.max_concurrent = max_concurrent
+        self.max_per_session = max_per_session
+        self.memory_per_execution = memory_per_execution
+        self.memory_reserve = memory_reserve
+        self.max_cpu_percent = max_cpu_percent
+        self.queue_timeout = queue_timeout
+        self.resource_poll_interval = resource_poll_interval
+        
+        self._lock = threading.Condition()
+        self._queue: List[ExecutionTicket] = []
+        self._running: Dict[str, int] = {}
+        self._running_total = 0
+        self._sequence = itertools.count()
+        
+        self._host_sample: Optional[Dict[str, float]] = None
+        self._host_sampled_at = 0.0
+        psutil.cpu_percent(interval=None)  # prime the non-blocking CPU sampler
+        
+        self.metrics = {
+            "admitted": 0,
+            "queued": 0,
+            "timeouts": 0,
+            "resource_deferrals": 0,
+            "queue_wait_total": 0.0,
+            "queue_wait_max": 0.0
+        }
+    
+    @contextmanager
+    def slot(self, session_id: Optional[str] = None, priority: int = PRIORITY_NORMAL,
+             timeout: Optional[float] = None) -> Iterator[ExecutionTicket]:
+        """Hold an execution slot for the duration of the block"""
+        
+        ticket = self.acquire(session_id, priority, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+    
+    def acquire(self, session_id: Optional[str] = None, priority: int = PRIORITY_NORMAL,
+                timeout: Optional[float] = None) -> ExecutionTicket:
+        """Wait until admitted; raises QueueTimeout if that takes longer than timeout"""
+        
+        timeout = self.queue_timeout if timeout is None else timeout
+        
+        with self._lock:
+            ticket = ExecutionTicket(session_id, priority, next(self._sequence))
+            ticket.queue_position = sum(1 for queued in self._queue if queued < ticket)
+            heapq.heappush(self._queue, ticket)
+            
+            deadline = ticket.enqueued_at + timeout if timeout is not None else None
+            
+            self._dispatch()
+            if not ticket.admitted:
+                self.metrics["queued"] += 1
+            
+            while not ticket.admitted:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    self.metrics["timeouts"] += 1
+                    # Removing a blocked head can unblock the tickets behind it
+                    self._dispatch()
+                    raise QueueTimeout(f"No execution slot within {timeout} seconds")
+                
+                # Re-check host headroom periodically even without a release
+                wait = self.resource_poll_interval if remaining is None else min(remaining, self.resource_poll_interval)
+                self._lock.wait(wait)
+                self._dispatch()
+            
+            wait_time = ticket.queue_wait
+            self.metrics["admitted"] += 1
+            self.metrics["queue_wait_total"] += wait_time
+            self.metrics["queue_wait_max"] = max(self.metrics["queue_wait_max"], wait_time)
+        
+        return ticket
+    
+    def release(self, ticket: ExecutionTicket):
+        """Free a slot and let waiting executions in"""
+        
+        with self._lock:
+            self._running_total -= 1
+            if ticket.session_id is not None:
+                self._running[ticket.session_id] -= 1
+                if not self._running[ticket.session_id]:
+                    del self._running[ticket.session_id]
+            
+            self._dispatch()
+            self._lock.notify_all()
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Queue depth, running counts and wait statistics"""
+        
+        with self._lock:
+            status = dict(self.metrics)
+            status["queue_depth"] = len(self._queue)
+            status["running"] = self._running_total
+            status["running_by_session"] = dict(self._running)
+        
+        admitted = status["admitted"]
+        status["queue_wait_avg"] = status["queue_wait_total"] / admitted if admitted else 0.0
+        status["max_concurrent"] = self.max_concurrent
+        status["max_per_session"] = self.max_per_session
+        
+        return status
+    
+    def _dispatch(self):
+        """Admit queued tickets in priority order while caps and headroom allow (lock held)"""
+        
+        if not self._queue or self._running_total >= self.max_concurrent:
+            return
+        
+        host = self._host_state()
+        available = host["available_memory"]
+        admitted = False
+        
+        for ticket in sorted(self._queue):
+            if self._running_total >= self.max_concurrent:
+                break
+            
+            # A session at its cap doesn't hold up other sessions behind it
+            session_id = ticket.session_id
+            if session_id is not None and self._running.get(session_id, 0) >= self.max_per_session:
+                continue
+            
+            # Always let one execution run so a busy host can't stall the queue forever
+            if self._running_total > 0:
+                if available - self.memory_per_execution < self.memory_reserve or \
+                        host["cpu_percent"] > self.max_cpu_percent:
+                    self.metrics["resource_deferrals"] += 1
+                    break
+            
+            ticket.admitted_at = time.time()
+            self._running_total += 1
+            if session_id is not None:
+                self._running[session_id] = self._running.get(session_id, 0) + 1
+            available -= self.memory_per_execution
+            admitted = True
+        
+        if admitted:
+            self._queue = [ticket for ticket in self._queue if not ticket.admitted]
+            heapq.heapify(self._queue)
+            self._lock.notify_all()
+    
+    def _host_state(self) -> Dict[str, float]:
+        """Free memory and CPU load, sampled at most once per poll interval"""
+        
+        now = time.time()
+        if self._host_sample is None or now - self._host_sampled_at >= self.resource_poll_interval:
+            self._host_sample = {
+                "available_memory": psutil.virtual_memory().available,
+                "cpu_percent": psutil.cpu_percent(interval=None)
+            }
+            self._host_sampled_at = now
+        
+        return self._host_sample
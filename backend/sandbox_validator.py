@@ -0,0 +1,533 @@
+"""
+Sandbox Validator
+Policy-driven code validation: one AST pass for Python, token passes for JavaScript and Bash
+"""
+import ast
+import hashlib
+import logging
+import re
+import shlex
+import threading
+from collections import OrderedDict
+from fnmatch import fnmatchcase, translate
+from typing import Dict, Any, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# What each language may not do. Names are matched as fnmatch patterns so a
+# family of calls (os.exec*, os.spawn*) is one entry.
+DEFAULT_POLICY = {
+    "python": {
+        # Builtins that may not be referenced at all (called, aliased or passed around)
+        "builtins": ["eval", "exec", "compile", "__import__", "open", "globals",
+                     "locals", "vars", "dir", "breakpoint"],
+        # Modules that may not be imported
+        "modules": ["subprocess", "ctypes", "pty", "importlib", "multiprocessing", "pexpect"],
+        # Dotted attributes reached through an imported module
+        "attributes": ["os.system", "os.popen", "os.spawn*", "os.exec*", "os.fork*", "os.kill*",
+                       "os.posix_spawn*", "builtins.*", "sys.modules"],
+        # Introspection hooks used to climb out to builtins
+        "dunders": ["__builtins__", "__subclasses__", "__globals__", "__code__", "__bases__",
+                    "__mro__", "__loader__", "__spec__", "__dict__", "__getattribute__"]
+    },
+    "javascript": {
+        # Identifiers that may not be called
+        "calls": ["eval", "Function"],
+        # Called with a string first argument these evaluate code
+        "string_calls": ["setTimeout", "setInterval"],
+        # require()/import() of these, or of anything not a string literal
+        "modules": ["child_process", "vm", "worker_threads", "cluster", "module", "inspector"],
+        # member accesses, dotted or bracketed with a string literal
+        "members": ["process.exit", "process.kill", "process.binding", "process.dlopen",
+                    "process.mainModule", "globalThis.eval", "constructor.constructor"]
+    },
+    "bash": {
+        # Command names, also checked behind wrappers like sudo/env/xargs
+        "commands": ["shutdown", "reboot", "halt", "poweroff", "mkfs*", "format", "sudo", "su",
+                     "doas", "dd", "eval"],
+        # A command is blocked when it has all of these flags/arguments
+        "arguments": {"rm": [["-r", "-f"]], "chmod": [["777"], ["-R", "777"]]},
+        "wrappers": ["env", "nohup", "exec", "xargs", "time", "command", "builtin", "nice",
+                     "timeout", "stdbuf", "setsid"]
+    }
+}
+
+# Fork bombs are the one bash pattern that's about shape rather than a command
+FORK_BOMB = re.compile(r"(\S+)\(\)\s*\{[^}]*\1\s*\|\s*\1\s*&")
+
+class Verdict(NamedTuple):
+    allowed: bool
+    reason: Optional[str] = None
+
+ALLOWED = Verdict(True)
+
+# Modules that are os under another name (os re-exports them)
+PYTHON_MODULE_ALIASES = {"posix": "os", "nt": "os"}
+
+def _canonical_module(module: str) -> str:
+    root, dot, rest = module.partition(".")
+    return PYTHON_MODULE_ALIASES.get(root, root) + dot + rest
+
+class _PythonPolicyVisitor(ast.NodeVisitor):
+    """Walks the module once, stopping at the first violation"""
+    
+    def __init__(self, patterns: Dict[str, Any]):
+        self.patterns = patterns
+        self.aliases: Dict[str, str] = {}
+        self.reason: Optional[str] = None
+    
+    def visit(self, node):
+        if self.reason is None:
+            super().visit(node)
+    
+    def block(self, reason: str):
+        if self.reason is None:
+            self.reason = reason
+    
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            self.check_module(alias.name)
+            # "import os.path" binds os; "import os.path as p" binds p to os.path
+            if alias.asname:
+                self.aliases[alias.asname] = _canonical_module(alias.name)
+            else:
+                root = alias.name.split(".")[0]
+                self.aliases[root] = _canonical_module(root)
+    
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        self.check_module(node.module or "")
+        module = _canonical_module(node.module or "")
+        for alias in node.names:
+            qualified = f"{module}.{alias.name}"
+            if alias.name == "*":
+                if module in self.patterns["restricted_modules"]:
+                    self.block(f"star import from {module}")
+                continue
+            self.check_dotted(qualified)
+            self.aliases[alias.asname or alias.name] = qualified
+    
+    def visit_Assign(self, node: ast.Assign):
+        for target in node.targets:
+            self.visit(target)
+        # o = os makes o.system as dangerous as os.system
+        dotted = self.visit_aliased(node.value)
+        if dotted:
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    self.aliases[target.id] = dotted
+    
+    def visit_AnnAssign(self, node: ast.AnnAssign):
+        self.visit(node.target)
+        self.visit(node.annotation)
+        dotted = self.visit_aliased(node.value) if node.value is not None else None
+        if dotted and isinstance(node.target, ast.Name):
+            self.aliases[node.target.id] = dotted
+    
+    def visit_NamedExpr(self, node: ast.NamedExpr):
+        dotted = self.visit_aliased(node.value)
+        if dotted:
+            self.aliases[node.target.id] = dotted
+    
+    def visit_aliased(self, node: ast.AST) -> Optional[str]:
+        """Visit a value that is being bound to a name or looked up by getattr
+        
+        Those are the only places a restricted module may appear bare, since
+        the alias keeps being tracked; returns the value's dotted path.
+        """
+        
+        dotted = self.resolve(node)
+        if dotted and isinstance(node, ast.Name):
+            self.check_dotted(dotted)
+        else:
+            self.visit(node)
+        return dotted
+    
+    def visit_Name(self, node: ast.Name):
+        if isinstance(node.ctx, ast.Load) and self._matches(node.id, "builtins"):
+            self.block(f"use of {node.id}")
+        elif self._matches(node.id, "dunders"):
+            self.block(f"access to {node.id}")
+        elif node.id in self.aliases:
+            # Anywhere else (a list, an argument, a default) the module escapes tracking
+            if isinstance(node.ctx, ast.Load) and self.aliases[node.id] in self.patterns["restricted_modules"]:
+                self.block(f"dynamic reference to {self.aliases[node.id]}")
+            else:
+                self.check_dotted(self.aliases[node.id])
+    
+    def visit_Attribute(self, node: ast.Attribute):
+        if self._matches(node.attr, "dunders"):
+            self.block(f"access to {node.attr}")
+            return
+        
+        dotted = self.resolve(node)
+        if dotted:
+            for part in dotted.split("."):
+                if self._matches(part, "dunders"):
+                    self.block(f"access to {part}")
+            self.check_dotted(dotted)
+            return
+        self.generic_visit(node)
+    
+    def visit_Call(self, node: ast.Call):
+        # getattr(os, "sys" + "tem") hides the attribute from the attribute check
+        if isinstance(node.func, ast.Name) and node.func.id in ("getattr", "setattr", "delattr", "hasattr") and node.args:
+            target = self.resolve(node.args[0]) if len(node.args) > 0 else None
+            name = node.args[1] if len(node.args) > 1 else None
+            if isinstance(name, ast.Constant) and isinstance(name.value, str):
+                if self._matches(name.value, "dunders") or self._matches(name.value, "builtins"):
+                    self.block(f"{node.func.id} of {name.value}")
+                elif target:
+                    self.check_dotted(f"{target}.{name.value}")
+            elif target in self.patterns["restricted_modules"]:
+                self.block(f"dynamic {node.func.id} on {target}")
+            
+            self.visit(node.func)
+            self.visit_aliased(node.args[0])
+            for argument in node.args[1:] + node.keywords:
+                self.visit(argument)
+            return
+        self.generic_visit(node)
+    
+    def resolve(self, node: ast.AST) -> Optional[str]:
+        """Dotted import path of a Name/Attribute chain rooted at an imported name"""
+        
+        parts = []
+        while isinstance(node, ast.Attribute):
+            parts.append(node.attr)
+            node = node.value
+        if isinstance(node, ast.NamedExpr):
+            base = self.resolve(node.value)
+            return ".".join([base] + list(reversed(parts))) if base else None
+        if not isinstance(node, ast.Name) or node.id not in self.aliases:
+            return None
+        parts.append(self.aliases[node.id])
+        return ".".join(reversed(parts))
+    
+    def check_module(self, module: str):
+        root = module.split(".")[0]
+        if self._matches(root, "modules") or self._matches(module, "modules"):
+            self.block(f"import of {module}")
+    
+    def check_dotted(self, dotted: str):
+        if self._matches(dotted, "attributes"):
+            self.block(f"use of {dotted}")
+        else:
+            self.check_module(dotted)
+    
+    def _matches(self, name: str, category: str) -> bool:
+        pattern = self.patterns.get(category)
+        return bool(pattern and pattern.match(name))
+
+def _compile_patterns(policy: Dict[str, Any]) -> Dict[str, Any]:
+    """One regex per category, so a name check is a single match instead of a loop"""
+    
+    compiled = {
+        category: re.compile("|".join(translate(pattern) for pattern in patterns))
+        for category, patterns in policy.items()
+        if isinstance(patterns, list) and patterns
+    }
+    # Modules with restricted attributes can't be star-imported or reached via dynamic getattr
+    compiled["restricted_modules"] = {
+        pattern.split(".*")[0].rsplit(".", 1)[0] for pattern in policy.get("attributes", ())
+    }
+    return compiled
+
+# Strings, comments and template literals are skipped as whole tokens so their
+# contents never look like code; template `${}` substitutions are scanned on their own.
+_JS_TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<number>\d[\w.]*)
+  | (?P<punct>\?\.|\.\.\.|[^\s\w])
+""", re.VERBOSE | re.DOTALL)
+
+def _js_tokens(code: str) -> List[tuple]:
+    tokens = []
+    for match in _JS_TOKEN.finditer(code):
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        value = match.group()
+        if kind == "string":
+            # A template literal with a substitution isn't a constant
+            if value.startswith("`") and "${" in value:
+                tokens.append(("template", value))
+                for expression in re.findall(r"\$\{([^}]*)\}", value):
+                    tokens.extend(_js_tokens(expression))
+                continue
+            value = value[1:-1]
+        tokens.append((kind, value))
+    return tokens
+
+def _validate_javascript(code: str, policy: Dict[str, Any]) -> Verdict:
+    tokens = _js_tokens(code)
+    calls = policy.get("calls", ())
+    string_calls = policy.get("string_calls", ())
+    modules = policy.get("modules", ())
+    members = policy.get("members", ())
+    
+    def at(index: int) -> tuple:
+        return tokens[index] if 0 <= index < len(tokens) else ("", "")
+    
+    for index, (kind, value) in enumerate(tokens):
+        # require and process may only be used directly: const r = require,
+        # [process] or f(process) would carry them past the checks below
+        if kind in ("name", "string") and value in ("require", "process") and _js_global_reference(tokens, index):
+            # globalThis["process"] is followed by its closing bracket
+            following = at(index + 2) if kind == "string" else at(index + 1)
+            if value == "require" and following != ("punct", "("):
+                return Verdict(False, "reference to require")
+            if value == "process" and following not in (("punct", "."), ("punct", "?.")) and \
+                    not (following == ("punct", "[") and at(index + 2)[0] == "string"):
+                return Verdict(False, "reference to process")
+        
+        if kind == "name" and at(index + 1) == ("punct", "("):
+            # Method calls like obj.eval() aren't the global eval
+            member = not _js_global_reference(tokens, index)
+            argument = at(index + 2)
+            
+            if not member and any(fnmatchcase(value, pattern) for pattern in calls):
+                return Verdict(False, f"call to {value}")
+            
+            if not member and value in string_calls and argument[0] in ("string", "template"):
+                return Verdict(False, f"{value} with a string argument")
+            
+            if not member and value in ("require", "import"):
+                if argument[0] != "string" or at(index + 3) != ("punct", ")"):
+                    return Verdict(False, f"dynamic {value}()")
+                if any(fnmatchcase(argument[1].replace("node:", "", 1), pattern) for pattern in modules):
+                    return Verdict(False, f"{value} of {argument[1]}")
+        
+        # import ... from "child_process"
+        if kind == "name" and value == "from" and at(index + 1)[0] == "string":
+            module = at(index + 1)[1].replace("node:", "", 1)
+            if any(fnmatchcase(module, pattern) for pattern in modules):
+                return Verdict(False, f"import of {module}")
+        
+        # Member access: a.b or a["b"]
+        if kind == "name" and index + 2 < len(tokens):
+            following = at(index + 1)
+            if following in (("punct", "."), ("punct", "?.")) and at(index + 2)[0] == "name":
+                member = f"{value}.{at(index + 2)[1]}"
+            elif following == ("punct", "[") and at(index + 2)[0] in ("string", "template"):
+                member = f"{value}.{at(index + 2)[1]}"
+            else:
+                continue
+            if any(fnmatchcase(member, pattern) for pattern in members):
+                return Verdict(False, f"access to {member}")
+    
+    return ALLOWED
+
+def _js_global_reference(tokens: List[tuple], index: int) -> bool:
+    """Whether the token at index is the global itself: bare, globalThis.name or globalThis["name"], not obj.name"""
+    
+    if tokens[index][0] == "string":
+        accessor = (("punct", "["),)
+    elif index == 0 or tokens[index - 1] not in (("punct", "."), ("punct", "?.")):
+        return True
+    else:
+        accessor = (("punct", "."), ("punct", "?."))
+    return index >= 2 and tokens[index - 1] in accessor and tokens[index - 2] in (("name", "globalThis"), ("name", "global"),
+                                                ("name", "window"), ("name", "self"))
+
+_BASH_SEPARATORS = {"`", "{", "}", "\n"}
+
+# Reserved words that may start a segment ahead of the real command (if rm ...; then rm ...)
+_BASH_RESERVED = {"!", "if", "then", "else", "elif", "while", "until", "do"}
+
+# Shells whose -c argument is itself a script to validate
+_BASH_SHELLS = {"sh", "bash", "dash", "zsh", "ksh", "ash", "busybox"}
+
+def _bash_tokens(code: str) -> List[str]:
+    lexer = shlex.shlex(code, posix=True, punctuation_chars=";&|()`")
+    lexer.whitespace = " \t\r"
+    lexer.commenters = "#"
+    lexer.wordchars += "$-{}[]:@%+,^!"
+    
+    return list(lexer)
+
+def _split_bash_commands(tokens: List[str]) -> List[List[str]]:
+    commands, current = [], []
+    for token in tokens:
+        if token in _BASH_SEPARATORS or set(token) <= set(";&|()\n"):
+            if current:
+                commands.append(current)
+            current = []
+        else:
+            current.append(token)
+    if current:
+        commands.append(current)
+    return commands
+
+def _validate_bash(code: str, policy: Dict[str, Any]) -> Verdict:
+    if FORK_BOMB.search(code):
+        return Verdict(False, "fork bomb")
+    
+    try:
+        tokens = _bash_tokens(code)
+    except ValueError as e:
+        return Verdict(False, f"unparseable shell: {str(e)}")
+    
+    blocked = policy.get("commands", ())
+    arguments = policy.get("arguments", {})
+    wrappers = set(policy.get("wrappers", ()))
+    
+    for words in _split_bash_commands(tokens):
+        # Skip leading VAR=value assignments, then follow wrappers to the real command
+        position = 0
+        while position < len(words):
+            word = words[position]
+            if re.match(r"^[A-Za-z_]\w*=", word) or word in _BASH_RESERVED:
+                position += 1
+                continue
+            
+            # s=sudo; $s ls names its command at run time
+            if "$" in word:
+                return Verdict(False, f"command from variable expansion {word}")
+            
+            name = word.rsplit("/", 1)[-1]
+            if any(fnmatchcase(name, pattern) for pattern in blocked):
+                return Verdict(False, f"command {name}")
+            
+            flags = _bash_flags(words[position + 1:])
+            for required in arguments.get(name, ()):
+                if all(item in flags for item in required):
+                    return Verdict(False, f"{name} {' '.join(required)}")
+            
+            script = _shell_script(name, words[position + 1:])
+            if script is not None:
+                verdict = _validate_bash(script, policy)
+                if not verdict.allowed:
+                    return Verdict(False, f"{name} -c: {verdict.reason}")
+                break
+            
+            if name not in wrappers:
+                break
+            
+            # Step over the wrapper's own options and arguments
+            position += 1
+            while position < len(words) and (words[position].startswith("-") or re.match(r"^[\d.]+[smhd]?$", words[position])):
+                position += 1
+    
+    return ALLOWED
+
+def _shell_script(name: str, arguments: List[str]) -> Optional[str]:
+    """The script a shell runs with -c (also combined, as in -ec), None if it isn't one"""
+    
+    if name not in _BASH_SHELLS:
+        return None
+    if name == "busybox":
+        if not arguments or arguments[0] not in _BASH_SHELLS:
+            return None
+        return _shell_script(arguments[0], arguments[1:])
+    
+    index = 0
+    while index < len(arguments):
+        argument = arguments[index]
+        if re.match(r"^-[A-Za-z]*c[A-Za-z]*$", argument):
+            return arguments[index + 1] if index + 1 < len(arguments) else ""
+        if not argument.startswith(("-", "+")):
+            return None
+        # -o/+o take an option name
+        index += 2 if argument in ("-o", "+o", "-O", "+O") else 1
+    return None
+
+def _bash_flags(arguments: List[str]) -> Set[str]:
+    """Arguments with combined short flags split apart (-rf -> -r, -f)"""
+    
+    flags = set()
+    for argument in arguments:
+        flags.add(argument)
+        if re.match(r"^-[A-Za-z]{2,}$", argument):
+            flags.update(f"-{flag}" for flag in argument[1:])
+        elif argument in ("--recursive", "--force"):
+            flags.add(argument[1:3])
+    return flags
+
+def _validate_python(code: str, patterns: Dict[str, Any]) -> Verdict:
+    try:
+        tree = ast.parse(code, "<string>", "exec")
+    except SyntaxError as e:
+        return Verdict(False, f"syntax error: {str(e)}")
+    except ValueError as e:  # null bytes
+        return Verdict(False, str(e))
+    
+    visitor = _PythonPolicyVisitor(patterns)
+    visitor.visit(tree)
+    if visitor.reason:
+        return Verdict(False, visitor.reason)
+    
+    return ALLOWED
+
+VALIDATORS = {
+    "python": _validate_python,
+    "javascript": _validate_javascript,
+    "bash": _validate_bash
+}
+
+# Languages the sandbox runs with another language's interpreter ("shell" is bash -s)
+LANGUAGE_ALIASES = {"shell": "bash"}
+
+class CodeValidator:
+    """Checks code against a per-language policy, caching verdicts by content hash"""
+    
+    def __init__(self, policy: Optional[Dict[str, Dict[str, Any]]] = None, cache_size: int = 2048):
+        self.policy = {language: dict(rules) for language, rules in DEFAULT_POLICY.items()}
+        for language, rules in (policy or {}).items():
+            self.policy.setdefault(language, {}).update(rules)
+        
+        # Python checks run once per AST node, so its patterns are precompiled
+        self.rules = dict(self.policy)
+        self.rules["python"] = _compile_patterns(self.policy.get("python", {}))
+        
+        self.cache_size = cache_size
+        self._verdicts: "OrderedDict[str, Verdict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "rejected": 0}
+    
+    def validate(self, code: str, language: str) -> Verdict:
+        """Verdict for code in language; languages without a validator are denied"""
+        
+        key = hashlib.sha256(f"{language}\0{code}".encode("utf-8", "surrogatepass")).hexdigest()
+        
+        with self._lock:
+            verdict = self._verdicts.get(key)
+            if verdict is not None:
+                self._verdicts.move_to_end(key)
+                self.metrics["hits"] += 1
+                return verdict
+            self.metrics["misses"] += 1
+        
+        checked_as = LANGUAGE_ALIASES.get(language, language)
+        validator = VALIDATORS.get(checked_as)
+        try:
+            if validator is None:
+                verdict = Verdict(False, f"no validator for language {language}")
+            else:
+                verdict = validator(code, self.rules.get(checked_as, {}))
+        except RecursionError:
+            verdict = Verdict(False, "code nested too deeply to validate")
+        
+        with self._lock:
+            if not verdict.allowed:
+                self.metrics["rejected"] += 1
+            self._verdicts[key] = verdict
+            while len(self._verdicts) > self.cache_size:
+                self._verdicts.popitem(last=False)
+        
+        return verdict
+    
+    def clear(self):
+        with self._lock:
+            self._verdicts.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["entries"] = len(self._verdicts)
+        
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,8 @@
+"""
+Test Configuration
+Puts the flat backend modules on the import path
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
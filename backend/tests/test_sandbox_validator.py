@@ -0,0 +1,100 @@
+"""
+Sandbox Validator Tests
+Regression cases for the Python and Bash policy checks
+"""
+import pytest
+
+from sandbox_validator import CodeValidator
+
+@pytest.fixture
+def validator():
+    return CodeValidator()
+
+@pytest.mark.parametrize("code", [
+    "rm -rf /",
+    "if true; then rm -rf /; fi",
+    "if rm -rf /; then :; fi",
+    "for f in *; do rm -fr $f; done",
+    "while true; do reboot; done",
+    "true && ! rm -rf /",
+    "{ rm -rf /; }",
+    "(rm -rf /)",
+    'sh -c "rm -rf /"',
+    "bash -o pipefail -ec 'sudo ls'",
+    "env FOO=1 bash -c 'if true; then rm -rf /; fi'",
+    "busybox sh -c 'rm -rf /'"
+])
+def test_bash_blocks_commands_behind_reserved_words_and_shells(validator, code):
+    assert not validator.validate(code, "bash").allowed
+
+@pytest.mark.parametrize("code", [
+    "ls -la; echo hi",
+    "for f in a b; do echo $f; done",
+    "if [ -f x ]; then cat x; else echo none; fi",
+    'bash -c "echo ok"',
+    "sh script.sh"
+])
+def test_bash_allows_harmless_scripts(validator, code):
+    assert validator.validate(code, "bash").allowed
+
+def test_python_file_is_an_ordinary_name(validator):
+    assert validator.validate("for file in [1]:\n    print(file)", "python").allowed
+
+@pytest.mark.parametrize("code", [
+    "import os; o = os; o.system('id')",
+    "import os\nx: object = os\nx.popen('id')",
+    "import os\n(y := os).system('id')",
+    "import os as a\nb = a\nc = b\nc.execv('/bin/sh', [])",
+    "from os import system\nrun = system"
+])
+def test_python_follows_aliases_through_assignments(validator, code):
+    assert not validator.validate(code, "python").allowed
+
+def test_python_allows_aliases_of_safe_attributes(validator):
+    assert validator.validate("import os\np = os.path\nprint(p.join('a', 'b'))", "python").allowed
+
+def test_shell_is_validated_as_bash(validator):
+    assert not validator.validate("sudo rm -rf /", "shell").allowed
+    assert validator.validate("echo hi", "shell").allowed
+
+def test_languages_without_a_validator_are_denied(validator):
+    verdict = validator.validate("print 1", "ruby")
+    assert not verdict.allowed
+    assert "ruby" in verdict.reason
+
+@pytest.mark.parametrize("code", [
+    "import posix; posix.system('id')",
+    "from nt import popen",
+    "import os\nl = [os]\nl[0].system('id')",
+    "import os\ndef f(m=os):\n    m.system('id')",
+    "import os\no = os\nrun(o)",
+    "import os\nx = os.__dict__"
+])
+def test_python_blocks_os_under_other_names_and_escaping_references(validator, code):
+    assert not validator.validate(code, "python").allowed
+
+@pytest.mark.parametrize("code", [
+    "const r = require; r('child_process').execSync('id')",
+    "const p = process; p.kill(1)",
+    "run([process])",
+    "const p = globalThis['process']",
+    "globalThis.require('child_process')"
+])
+def test_javascript_blocks_bare_require_and_process(validator, code):
+    assert not validator.validate(code, "javascript").allowed
+
+@pytest.mark.parametrize("code", [
+    "const fs = require('fs')",
+    "console.log(process.env.HOME)",
+    "process.stdout.write('x')",
+    "obj.process = 1"
+])
+def test_javascript_allows_direct_require_and_process_use(validator, code):
+    assert validator.validate(code, "javascript").allowed
+
+@pytest.mark.parametrize("code", ["s=sudo; $s ls", "${CMD} -rf /", "env $X", "$(echo rm) -rf /"])
+def test_bash_blocks_commands_from_expansions(validator, code):
+    assert not validator.validate(code, "bash").allowed
+
+def test_bash_allows_expansions_as_arguments(validator):
+    assert validator.validate('x=$(date); echo "$x" $HOME', "bash").allowed
@@ -0,0 +1,194 @@
+"""
+Tool HTTP Cache Tests
+HTTPCache against a local stand-in origin server
+"""
+import os
+import stat
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from tool_http import HTTPClient
+from tool_http_cache import HTTPCache, freshness_lifetime
+
+LAST_MODIFIED = "Mon, 05 Oct 2026 12:00:00 GMT"
+
+def _route(path, headers):
+    """(status, response headers, body) for a request to the stand-in origin"""
+    
+    if path.startswith("/fresh"):
+        return 200, {"Cache-Control": "max-age=60"}, b"fresh"
+    if path == "/etag":
+        if headers.get("If-None-Match") == '"v1"':
+            return 304, {"ETag": '"v1"'}, b""
+        return 200, {"Cache-Control": "max-age=0", "ETag": '"v1"'}, b"etag body"
+    if path == "/last-modified":
+        if headers.get("If-Modified-Since") == LAST_MODIFIED:
+            return 304, {}, b""
+        return 200, {"Cache-Control": "no-cache", "Last-Modified": LAST_MODIFIED}, b"dated body"
+    if path.startswith("/revalidate/"):
+        directive = path.rsplit("/", 1)[1]
+        return 200, {"Cache-Control": f"max-age=0, {directive}", "ETag": '"v1"'}, b"strict"
+    if path.startswith("/big"):
+        return 200, {"Cache-Control": "max-age=60"}, b"x" * 1000
+    if path == "/uncacheable":
+        return 200, {"Cache-Control": "max-age=0"}, b"short-lived"
+    if path == "/private":
+        return 200, {"Cache-Control": "private, max-age=60"}, b"mine"
+    if path == "/set-cookie":
+        return 200, {"Cache-Control": "max-age=60", "Set-Cookie": "session=abc"}, b"welcome"
+    return 404, {}, b"not found"
+
+class _Origin(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.seen.append((self.path, dict(self.headers)))
+        status, headers, body = _route(self.path, self.headers)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def origin():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Origin)
+    server.seen = []
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def client():
+    client = HTTPClient(retries=0, timeout=5)
+    yield client
+    client.close()
+
+def _url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+def _requests_for(server, path):
+    return [headers for seen_path, headers in server.seen if seen_path == path]
+
+def test_fresh_hit_makes_no_origin_request(origin, client, tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    
+    first, first_status = cache.fetch(client, _url(origin, "/fresh"))
+    second, second_status = cache.fetch(client, _url(origin, "/fresh"))
+    
+    assert (first_status, second_status) == ("miss", "hit")
+    assert second.content == first.content == b"fresh"
+    assert len(_requests_for(origin, "/fresh")) == 1
+
+def test_etag_revalidation(origin, client, tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    
+    assert cache.fetch(client, _url(origin, "/etag"))[1] == "miss"
+    response, status = cache.fetch(client, _url(origin, "/etag"))
+    
+    assert status == "revalidated"
+    assert response.content == b"etag body"
+    assert _requests_for(origin, "/etag")[-1].get("If-None-Match") == '"v1"'
+
+def test_last_modified_revalidation(origin, client, tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    
+    assert cache.fetch(client, _url(origin, "/last-modified"))[1] == "miss"
+    response, status = cache.fetch(client, _url(origin, "/last-modified"))
+    
+    assert status == "revalidated"
+    assert response.content == b"dated body"
+    assert _requests_for(origin, "/last-modified")[-1].get("If-Modified-Since") == LAST_MODIFIED
+
+def test_stale_copy_served_when_origin_is_down(origin, client, tmp_path):
+    cache = HTTPCache(str(tmp_path))
+    url = _url(origin, "/etag")
+    assert cache.fetch(client, url)[1] == "miss"
+    
+    origin.shutdown()
+    origin.server_close()
+    response, status = cache.fetch(client, url)
+    
+    assert status == "stale"
+    assert response.content == b"etag body"
+
+@pytest.mark.parametrize("directive", ["must-revalidate", "proxy-revalidate", "s-maxage=0"])
+def test_stale_copy_not_served_when_response_forbids_it(origin, client, tmp_path, directive):
+    cache = HTTPCache(str(tmp_path))
+    url = _url(origin, f"/revalidate/{directive}")
+    assert cache.fetch(client, url)[1] == "miss"
+    
+    origin.shutdown()
+    origin.server_close()
+    with pytest.raises(requests.RequestException):
+        cache.fetch(client, url)
+
+@pytest.mark.parametrize("cache_control,lifetime", [
+    ("max-age=60", 60.0),
+    ("s-maxage=10, max-age=60", 10.0),
+    ("max-age=60, s-maxage=0", 0.0),
+    ("no-cache, s-maxage=60", 0.0)
+])
+def test_freshness_lifetime_prefers_s_maxage(cache_control, lifetime):
+    assert freshness_lifetime({"Cache-Control": cache_control}) == lifetime
+
+def test_lru_eviction_keeps_store_under_max_bytes(origin, client, tmp_path):
+    cache = HTTPCache(str(tmp_path), max_bytes=3000)
+    for index in range(5):
+        cache.fetch(client, _url(origin, f"/big/{index}"))
+    
+    stats = cache.get_stats()
+    on_disk = sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path) if name.endswith(".body"))
+    assert stats["bytes"] <= 3000
+    assert on_disk <= 3000
+    assert stats["evictions"] == 2
+    
+    # The least recently used entries went first
+    assert cache.fetch(client, _url(origin, "/big/4"))[1] == "hit"
+    assert cache.fetch(client, _url(origin, "/big/0"))[1] == "miss"
+
+def test_domain_ttl_overrides_server_freshness(origin, client, tmp_path):
+    cache = HTTPCache(str(tmp_path), domain_ttls={"127.0.0.1": 60})
+    cache.fetch(client, _url(origin, "/uncacheable"))
+    assert cache.fetch(client, _url(origin, "/uncacheable"))[1] == "hit"
+    
+    expiring = HTTPCache(str(tmp_path / "expiring"), domain_ttls={"127.0.0.1": 0})
+    expiring.fetch(client, _url(origin, "/fresh"))
+    assert expiring.fetch(client, _url(origin, "/fresh"))[1] == "miss"
+
+@pytest.mark.parametrize("headers", [
+    {"Authorization": "Bearer secret"},
+    {"Cookie": "session=abc"},
+    {"Cache-Control": "no-store"}
+])
+def test_credentialed_and_no_store_requests_bypass(origin, client, tmp_path, headers):
+    cache = HTTPCache(str(tmp_path))
+    cache.fetch(client, _url(origin, "/fresh"))
+    
+    response, status = cache.fetch(client, _url(origin, "/fresh"), headers=headers)
+    
+    assert status == "bypass"
+    assert response.content == b"fresh"
+    assert len(_requests_for(origin, "/fresh")) == 2
+
+@pytest.mark.parametrize("path", ["/private", "/set-cookie"])
+def test_private_and_cookie_setting_responses_are_not_stored(origin, client, tmp_path, path):
+    cache = HTTPCache(str(tmp_path))
+    cache.fetch(client, _url(origin, path))
+    
+    assert cache.fetch(client, _url(origin, path))[1] == "miss"
+    assert cache.get_stats()["entries"] == 0
+
+def test_directory_is_private(origin, client, tmp_path):
+    directory = tmp_path / "cache"
+    cache = HTTPCache(str(directory))
+    cache.fetch(client, _url(origin, "/fresh"))
+    
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
@@ -0,0 +1,303 @@
+"""
+Tool Files
+Encoding detection, ranged and line-based reads and chunked streaming for workspace files
+"""
+import os
+import codecs
+import logging
+import mmap
+import shutil
+import tempfile
+from collections import deque
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_SIZE = 64 * 1024
+MMAP_THRESHOLD = 1024 * 1024
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Read once: os.umask can only be queried by setting it, which races with other threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16")
+)
+
+def detect_encoding(sample: bytes) -> Tuple[str, bool]:
+    """(encoding, binary) guessed from the first bytes of a file
+    
+    BOMs win, then strict utf-8 (tolerating a character cut off at the end of
+    the sample), then cp1252, then latin-1, which decodes anything. Statistical
+    detectors misread short Western samples too often to be worth it here.
+    """
+    
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding, False
+    
+    binary = b"\0" in sample
+    
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8", binary
+    except UnicodeDecodeError:
+        pass
+    
+    if not binary:
+        try:
+            sample.decode("cp1252")
+            return "cp1252", False
+        except UnicodeDecodeError:
+            pass
+    
+    return "latin-1", binary
+
+def detect_file_encoding(path: str) -> Tuple[str, bool]:
+    with open(path, "rb") as f:
+        return detect_encoding(f.read(SAMPLE_SIZE))
+
+def ascii_compatible(encoding: str) -> bool:
+    """Whether newlines are single 0x0A bytes, so lines can be found on raw bytes"""
+    
+    try:
+        return "\n".encode(encoding) == b"\n" and "a".encode(encoding) == b"a"
+    except (LookupError, UnicodeError):
+        return False
+
+def _align_start(data: bytes, encoding: str, offset: int) -> int:
+    """Bytes to skip so decoding starts on a character boundary"""
+    
+    name = codecs.lookup(encoding).name
+    if name.startswith("utf-16"):
+        return offset % 2
+    if name.startswith("utf-32"):
+        return -offset % 4
+    if name not in ("utf-8", "utf-8-sig"):
+        return 0
+    
+    # Skip utf-8 continuation bytes
+    skip = 0
+    while skip < min(len(data), 3) and 0x80 <= data[skip] <= 0xBF:
+        skip += 1
+    return skip
+
+def read_range(path: str, offset: int, length: int, encoding: str) -> Dict[str, Any]:
+    """Decode bytes [offset, offset + length), trimmed to whole characters
+    
+    A range that starts mid-character is moved forward to the next one and a
+    character cut off at the end is left for the next read, so consecutive
+    reads using next_offset reassemble the file exactly.
+    """
+    
+    size = os.path.getsize(path)
+    offset = max(0, min(offset, size))
+    
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    
+    start = _align_start(data, encoding, offset) if offset else 0
+    at_end = offset + len(data) >= size
+    
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    if offset and codecs.lookup(encoding).name in ("utf-8-sig", "utf-16", "utf-32"):
+        # The BOM only exists at offset 0; decode the rest with the matching plain codec
+        decoder = codecs.getincrementaldecoder(_plain_codec(path, encoding))(errors="replace")
+    text = decoder.decode(data[start:], final=at_end)
+    pending = len(decoder.getstate()[0]) if not at_end else 0
+    
+    consumed = len(data) - pending
+    return {
+        "content": text,
+        "offset": offset + start,
+        "length": consumed - start,
+        "next_offset": offset + consumed,
+        "eof": offset + consumed >= size
+    }
+
+def _plain_codec(path: str, encoding: str) -> str:
+    name = codecs.lookup(encoding).name
+    if name == "utf-8-sig":
+        return "utf-8"
+    
+    with open(path, "rb") as f:
+        bom = f.read(4)
+    if name == "utf-16":
+        return "utf-16-be" if bom.startswith(codecs.BOM_UTF16_BE) else "utf-16-le"
+    return "utf-32-be" if bom.startswith(codecs.BOM_UTF32_BE) else "utf-32-le"
+
+def _open_buffer(f) -> Tuple[Any, bool]:
+    """mmap for large files (pages are read on demand), bytes for small or empty ones"""
+    
+    size = os.fstat(f.fileno()).st_size
+    if size >= MMAP_THRESHOLD:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), True
+    return f.read(), False
+
+def read_lines(path: str, start_line: int, end_line: Optional[int], encoding: str) -> Dict[str, Any]:
+    """Lines start_line..end_line (1-based, inclusive; end_line None = to the end)"""
+    
+    start_line = max(1, start_line)
+    
+    if not ascii_compatible(encoding):
+        lines = []
+        with open(path, "r", encoding=encoding, errors="replace", newline="\n") as f:
+            for number, line in enumerate(f, 1):
+                if end_line is not None and number > end_line:
+                    break
+                if number >= start_line:
+                    lines.append(line)
+        return _line_result(lines, start_line)
+    
+    with open(path, "rb") as f:
+        buffer, mapped = _open_buffer(f)
+        try:
+            # Walk newline to newline; only the requested span is ever decoded
+            position, number = 0, 1
+            while number < start_line and position < len(buffer):
+                newline = buffer.find(b"\n", position)
+                if newline == -1:
+                    position = len(buffer)
+                    break
+                position, number = newline + 1, number + 1
+            
+            begin = position
+            if end_line is None:
+                position = len(buffer)
+            else:
+                while number <= end_line and position < len(buffer):
+                    newline = buffer.find(b"\n", position)
+                    position = len(buffer) if newline == -1 else newline + 1
+                    number += 1
+            
+            text = buffer[begin:position].decode(encoding, errors="replace")
+        finally:
+            if mapped:
+                buffer.close()
+    
+    return _line_result(_split_lines(text), start_line)
+
+def read_tail(path: str, count: int, encoding: str) -> Dict[str, Any]:
+    """Last count lines, found by scanning backwards from the end
+    
+    Absolute line numbers would need a scan of the whole file, so
+    start_line/end_line are None.
+    """
+    
+    if count <= 0:
+        return _line_result([], None)
+    
+    if not ascii_compatible(encoding):
+        with open(path, "r", encoding=encoding, errors="replace", newline="\n") as f:
+            lines = deque(f, maxlen=count)
+        return _line_result(list(lines), None)
+    
+    with open(path, "rb") as f:
+        buffer, mapped = _open_buffer(f)
+        try:
+            end = len(buffer)
+            # A trailing newline ends the last line rather than starting an empty one
+            search_end = end - 1 if end and buffer[end - 1:end] == b"\n" else end
+            position = search_end
+            for _ in range(count):
+                position = buffer.rfind(b"\n", 0, position)
+                if position == -1:
+                    break
+            text = buffer[position + 1:end].decode(encoding, errors="replace")
+        finally:
+            if mapped:
+                buffer.close()
+    
+    return _line_result(_split_lines(text), None)
+
+def _split_lines(text: str) -> List[str]:
+    """Split after each newline only, as the byte scans do; str.splitlines also breaks on form feeds, U+2028 and other separators"""
+    
+    lines = text.split("\n")
+    last = lines.pop()
+    return [line + "\n" for line in lines] + ([last] if last else [])
+
+def _line_result(lines: List[str], first_line: Optional[int]) -> Dict[str, Any]:
+    return {
+        "content": "".join(lines),
+        "start_line": first_line,
+        "end_line": first_line + len(lines) - 1 if first_line is not None else None,
+        "lines": len(lines)
+    }
+
+def iter_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: Optional[str] = None,
+                offset: int = 0) -> Iterator[Dict[str, Any]]:
+    """Decoded chunks of a file with their byte offsets, read one chunk at a time"""
+    
+    if encoding is None:
+        encoding, _ = detect_file_encoding(path)
+    
+    while True:
+        chunk = read_range(path, offset, chunk_size, encoding)
+        if chunk["content"] or chunk["eof"]:
+            chunk["encoding"] = encoding
+            yield chunk
+        if chunk["eof"] or chunk["next_offset"] == offset:
+            return
+        offset = chunk["next_offset"]
+
+def iter_lines(path: str, encoding: Optional[str] = None) -> Iterator[str]:
+    """Lines of a file, streamed"""
+    
+    if encoding is None:
+        encoding, _ = detect_file_encoding(path)
+    
+    with open(path, "r", encoding=encoding, errors="replace", newline="\n") as f:
+        yield from f
+
+def write_text(path: str, content: str, encoding: str = "utf-8", mode: str = "w",
+               atomic: bool = False) -> int:
+    """Write (mode "w") or append (mode "a") text; returns the bytes written
+    
+    With atomic, the new contents go to a temp file in the same directory
+    that is renamed over path, so readers see the old file or the new one and
+    never a partial write. Appends copy the existing file into the temp file
+    first. The file keeps its permission bits.
+    """
+    
+    if mode not in ("w", "a"):
+        raise ValueError(f"Unsupported write mode: {mode}")
+    
+    encoder = codecs.getincrementalencoder(encoding)()
+    if mode == "a" and os.path.exists(path) and os.path.getsize(path):
+        encoder.setstate(0)  # no BOM in the middle of a file
+    data = encoder.encode(content, final=True)
+    
+    if not atomic:
+        with open(path, mode + "b") as f:
+            f.write(data)
+        return len(data)
+    
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if mode == "a" and os.path.exists(path):
+                with open(path, "rb") as existing:
+                    shutil.copyfileobj(existing, f)
+            f.write(data)
+        
+        if os.path.exists(path):
+            shutil.copymode(path, temp_path)
+        else:
+            # mkstemp creates 0600; give new files the usual umask-derived mode
+            os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    
+    return len(data)
@@ -0,0 +1,260 @@
+"""
+Tool Git
+Cached GitPython repo handles, a status cache keyed on index/HEAD state and porcelain v2 status parsing
+"""
+import os
+import time
+import logging
+import subprocess
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from git import Repo
+
+logger = logging.getLogger(__name__)
+
+def parse_porcelain_v2(output: str) -> Dict[str, Any]:
+    """Status dict from `git status --porcelain=v2 -z --branch`
+    
+    Same keys as the GitPython-based status (branch, commit, modified,
+    staged, untracked) plus conflicted. branch is None when detached and
+    commit is None before the first commit.
+    """
+    
+    status = {"branch": None, "commit": None, "modified": [], "staged": [], "untracked": [], "conflicted": []}
+    
+    records = output.split("\0")
+    index = 0
+    while index < len(records):
+        record = records[index]
+        index += 1
+        if not record:
+            continue
+        
+        kind = record[0]
+        if kind == "#":
+            header, _, value = record[2:].partition(" ")
+            if header == "branch.oid" and value != "(initial)":
+                status["commit"] = value
+            elif header == "branch.head" and value != "(detached)":
+                status["branch"] = value
+        elif kind in ("1", "2"):
+            # 1 XY sub mH mI mW hH hI path / 2 ... Xscore path\0origPath
+            fields = record.split(" ", 8 if kind == "1" else 9)
+            xy, path = fields[1], fields[-1]
+            if xy[0] != ".":
+                status["staged"].append(path)
+            if xy[1] != ".":
+                status["modified"].append(path)
+            if kind == "2":
+                index += 1  # the original path of a rename or copy
+        elif kind == "u":
+            status["conflicted"].append(record.split(" ", 10)[-1])
+        elif kind == "?":
+            status["untracked"].append(record[2:])
+    
+    return status
+
+def clone_options(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Repo.clone_from keyword options for shallow and partial clones
+    
+    depth (shallow history), filter (partial clone, e.g. "blob:none"),
+    branch and single_branch, taken from git_clone's parameters.
+    """
+    
+    options: Dict[str, Any] = {}
+    if params.get("depth"):
+        options["depth"] = int(params["depth"])
+    if params.get("filter"):
+        options["filter"] = str(params["filter"])
+    if params.get("branch"):
+        options["branch"] = str(params["branch"])
+    # Shallow clones fetch only one branch unless told otherwise, like git itself
+    if params.get("single_branch", "depth" in options):
+        options["single_branch"] = True
+    return options
+
+class GitRepos:
+    """LRU of open Repo handles plus a cached status per repo
+    
+    Opening a Repo and computing status are the slow parts of every git tool
+    call. Handles are reused, one lock per repo serializes access to each
+    (GitPython keeps persistent git subprocesses per handle). A cached status
+    is reused while the index, HEAD and current branch ref are unchanged on
+    disk, nothing marked it dirty through invalidate(), and it is younger
+    than status_ttl; working tree edits made outside the tools only show up
+    once the ttl passes.
+    """
+    
+    def __init__(self, max_repos: int = 16, status_ttl: Optional[float] = 5.0):
+        self.max_repos = max_repos
+        self.status_ttl = status_ttl
+        
+        self._repos: "OrderedDict[str, Repo]" = OrderedDict()
+        self._locks: Dict[str, threading.RLock] = {}
+        # path -> (stamp, cached_at, status)
+        self._status: Dict[str, Tuple[tuple, float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        
+        self.metrics = {"opened": 0, "reused": 0, "evicted": 0, "status_hits": 0, "status_misses": 0}
+    
+    @contextmanager
+    def open(self, path: str) -> Iterator[Repo]:
+        """Cached Repo for path, used under that repo's lock"""
+        
+        path = os.path.realpath(path)
+        with self._lock:
+            lock = self._locks.setdefault(path, threading.RLock())
+        
+        with lock:
+            yield self._handle(path)
+    
+    def add(self, path: str, repo: Repo):
+        """Cache a handle created elsewhere (e.g. by a clone)"""
+        
+        path = os.path.realpath(path)
+        with self._lock:
+            self._locks.setdefault(path, threading.RLock())
+            self._insert(path, repo)
+    
+    def status(self, path: str, porcelain: bool = False, refresh: bool = False) -> Dict[str, Any]:
+        """Working tree status of the repo at path, from cache when still valid
+        
+        porcelain runs a single `git status --porcelain=v2 -z` instead of
+        GitPython's two index diffs and untracked scan.
+        """
+        
+        path = os.path.realpath(path)
+        with self.open(path) as repo:
+            stamp = (porcelain,) + self._stamp(repo)
+            with self._lock:
+                cached = self._status.get(path)
+            if cached and not refresh and cached[0] == stamp and \
+                    (self.status_ttl is None or time.time() - cached[1] < self.status_ttl):
+                with self._lock:
+                    self.metrics["status_hits"] += 1
+                return _copy_status(cached[2])
+            
+            status = self._porcelain_status(repo) if porcelain else self._gitpython_status(repo)
+            # Stamped afterwards: computing status may refresh the index's stat cache
+            with self._lock:
+                self._status[path] = ((porcelain,) + self._stamp(repo), time.time(), status)
+                self.metrics["status_misses"] += 1
+            return _copy_status(status)
+    
+    def invalidate(self, path: str):
+        """Forget cached status for every repo containing path, or inside it"""
+        
+        path = os.path.realpath(path)
+        with self._lock:
+            for repo_path in list(self._status):
+                if _contains(repo_path, path) or _contains(path, repo_path):
+                    self._status.pop(repo_path, None)
+            
+            # A deleted repo must not be served from a stale handle
+            for repo_path in list(self._repos):
+                if _contains(path, repo_path) and not os.path.exists(repo_path):
+                    self._drop(repo_path)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["repos"] = len(self._repos)
+            stats["cached_status"] = len(self._status)
+        return stats
+    
+    def close(self):
+        with self._lock:
+            for path in list(self._repos):
+                self._drop(path)
+    
+    def _handle(self, path: str) -> Repo:
+        with self._lock:
+            repo = self._repos.get(path)
+            if repo is not None and os.path.isdir(repo.git_dir):
+                self._repos.move_to_end(path)
+                self.metrics["reused"] += 1
+                return repo
+            if repo is not None:
+                self._drop(path)
+        
+        repo = Repo(path)
+        with self._lock:
+            self._insert(path, repo)
+            self.metrics["opened"] += 1
+        return repo
+    
+    def _insert(self, path: str, repo: Repo):
+        """Add a handle, closing the least recently used beyond max_repos (lock held)"""
+        
+        if path in self._repos and self._repos[path] is not repo:
+            self._repos[path].close()
+        self._repos[path] = repo
+        self._repos.move_to_end(path)
+        
+        while len(self._repos) > self.max_repos:
+            evicted = next(iter(self._repos))
+            self._drop(evicted)
+            self.metrics["evicted"] += 1
+    
+    def _drop(self, path: str):
+        """Close and forget a handle (lock held)"""
+        
+        repo = self._repos.pop(path, None)
+        if repo is not None:
+            try:
+                repo.close()
+            except Exception as e:
+                logger.debug(f"Error closing repo {path}: {str(e)}")
+        self._status.pop(path, None)
+    
+    def _stamp(self, repo: Repo) -> tuple:
+        """mtimes of the files a commit, add, checkout or reset rewrites"""
+        
+        git_dir = repo.git_dir
+        common_dir = getattr(repo, "common_dir", git_dir)
+        paths = [os.path.join(git_dir, "index"), os.path.join(git_dir, "HEAD"),
+                 os.path.join(common_dir, "packed-refs")]
+        
+        try:
+            with open(os.path.join(git_dir, "HEAD")) as f:
+                head = f.read().strip()
+            if head.startswith("ref: "):
+                paths.append(os.path.join(common_dir, head[5:]))
+        except OSError:
+            pass
+        
+        return tuple(_mtime_ns(stamp_path) for stamp_path in paths)
+    
+    def _gitpython_status(self, repo: Repo) -> Dict[str, Any]:
+        return {
+            "branch": repo.active_branch.name,
+            "commit": repo.head.commit.hexsha,
+            "modified": [item.a_path for item in repo.index.diff(None)],
+            "staged": [item.a_path for item in repo.index.diff("HEAD")],
+            "untracked": repo.untracked_files
+        }
+    
+    def _porcelain_status(self, repo: Repo) -> Dict[str, Any]:
+        completed = subprocess.run(
+            ["git", "--no-optional-locks", "status", "--porcelain=v2", "-z", "--branch", "--untracked-files=all"],
+            cwd=repo.working_tree_dir,
+            capture_output=True,
+            check=True
+        )
+        return parse_porcelain_v2(completed.stdout.decode("utf-8", errors="surrogateescape"))
+
+def _copy_status(status: Dict[str, Any]) -> Dict[str, Any]:
+    """Status with its own path lists, so callers can't modify the cached copy"""
+    return {key: list(value) if isinstance(value, list) else value for key, value in status.items()}
+
+def _mtime_ns(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+def _contains(directory: str, path: str) -> bool:
+    return path == directory or path.startswith(directory + os.sep)
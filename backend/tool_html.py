@@ -0,0 +1,240 @@
+"""
+Tool HTML
+Streaming HTML text/link extraction that stops once it has enough, on lxml when installed
+"""
+import re
+import sys
+import json
+import time
+import logging
+from html.parser import HTMLParser
+from typing import Dict, Any, List, Optional
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+logger = logging.getLogger(__name__)
+
+FEED_SIZE = 32 * 1024
+
+# Content inside these never reaches the extracted text
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg"}
+
+# Text on either side of these is on separate lines
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "fieldset",
+    "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hr", "li", "main", "nav", "ol", "p", "pre", "section", "table", "td", "th", "tr", "ul"
+}
+
+WHITESPACE = re.compile(r"\s+")
+
+class _Collector:
+    """Parser callbacks that build the extract and say when it is complete
+    
+    Works as an lxml parser target and behind the html.parser adapter.
+    """
+    
+    def __init__(self, max_text: int, max_links: int):
+        self.max_text = max_text
+        self.max_links = max_links
+        
+        self.title: Optional[str] = None
+        self.links: List[Dict[str, str]] = []
+        self.pieces: List[str] = []
+        self.text_length = 0
+        
+        self._skip_depth = 0
+        self._in_title = False
+        self._title_parts: List[str] = []
+        self._anchor: Optional[Dict[str, Any]] = None
+        self._done = False
+    
+    @property
+    def done(self) -> bool:
+        return self._done
+    
+    def start(self, tag: str, attrs):
+        tag = tag.lower()
+        if tag == "title" and self.title is None:
+            self._in_title = True
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+            return
+        if self._skip_depth:
+            return
+        
+        if tag in BLOCK_TAGS:
+            self._break()
+        if tag == "a" and self._anchor is None:
+            href = dict(attrs).get("href")
+            if href is not None and len(self.links) < self.max_links:
+                self._anchor = {"url": href, "parts": []}
+    
+    def end(self, tag: str):
+        tag = tag.lower()
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            self.title = WHITESPACE.sub(" ", "".join(self._title_parts)).strip()
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if self._skip_depth:
+            return
+        
+        if tag in BLOCK_TAGS:
+            self._break()
+        if tag == "a" and self._anchor is not None:
+            text = WHITESPACE.sub(" ", "".join(self._anchor["parts"])).strip()
+            self.links.append({"text": text, "url": self._anchor["url"]})
+            self._anchor = None
+        self._check_done()
+    
+    def data(self, text: str):
+        if self._in_title:
+            self._title_parts.append(text)
+            return
+        if self._skip_depth:
+            return
+        
+        if self._anchor is not None:
+            self._anchor["parts"].append(text)
+        if self.text_length < self.max_text:
+            collapsed = WHITESPACE.sub(" ", text)
+            if collapsed.strip():
+                self.pieces.append(collapsed)
+                self.text_length += len(collapsed)
+        self._check_done()
+    
+    def close(self):
+        return self
+    
+    def text(self) -> str:
+        lines = (line.strip() for line in "".join(self.pieces).split("\n"))
+        return "\n".join(line for line in lines if line)[:self.max_text]
+    
+    def _break(self):
+        if self.pieces and self.pieces[-1] != "\n":
+            self.pieces.append("\n")
+    
+    def _check_done(self):
+        # Both limits must be full: links after the text cut-off still count, so a
+        # page with fewer than max_links links is parsed to the end.
+        # The title comes first in any sane page; don't stop before it unless there's none
+        if self.text_length >= self.max_text and len(self.links) >= self.max_links and not self._in_title:
+            self._done = True
+
+class _StdlibParser(HTMLParser):
+    """html.parser front end for _Collector"""
+    
+    def __init__(self, collector: _Collector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+    
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag, attrs)
+        if tag in ("br", "hr", "img", "input", "meta", "link"):
+            self.collector.end(tag)
+    
+    def handle_startendtag(self, tag, attrs):
+        self.collector.start(tag, attrs)
+        self.collector.end(tag)
+    
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+    
+    def handle_data(self, data):
+        self.collector.data(data)
+
+def extract_html(html: str, max_text: int = 5000, max_links: int = 20,
+                 parser: Optional[str] = None) -> Dict[str, Any]:
+    """Title, visible text (max_text chars) and links (max_links) of a page
+    
+    The document is fed to the parser in FEED_SIZE slices and parsing stops
+    as soon as both limits are reached, so a large page costs about as much
+    as its first few screens. Until max_links links are found the rest of
+    the page is still parsed for links, even with the text full; a page
+    with fewer links is parsed whole ("complete" in the result). parser is
+    "lxml" or "html.parser"; by default lxml is used when installed.
+    """
+    
+    if parser is None:
+        parser = "lxml" if etree is not None else "html.parser"
+    
+    collector = _Collector(max_text, max_links)
+    if parser == "lxml":
+        if etree is None:
+            raise ImportError("lxml is required for the lxml parser")
+        feeder = etree.HTMLParser(target=collector, remove_comments=True, remove_pis=True)
+    else:
+        feeder = _StdlibParser(collector)
+    
+    consumed = 0
+    for start in range(0, len(html), FEED_SIZE):
+        feeder.feed(html[start:start + FEED_SIZE])
+        consumed = min(len(html), start + FEED_SIZE)
+        if collector.done:
+            break
+    
+    try:
+        feeder.close()
+    except Exception as e:
+        # lxml complains about documents cut off mid-way, which early stops do on purpose
+        logger.debug(f"HTML parser close: {str(e)}")
+    
+    return {
+        "title": collector.title or "",
+        "text": collector.text(),
+        "links": collector.links,
+        "parser": parser,
+        "chars_parsed": consumed,
+        "complete": consumed >= len(html)
+    }
+
+def benchmark_extract(html: str, runs: int = 10, max_text: int = 5000,
+                      max_links: int = 20) -> Dict[str, Any]:
+    """Time extract_html with each available parser against a full BeautifulSoup parse of the same page"""
+    
+    def full_soup():
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, "html.parser")
+        soup.get_text()[:max_text]
+        soup.find_all("a", href=True)[:max_links]
+    
+    candidates = [("html.parser", lambda: extract_html(html, max_text, max_links, parser="html.parser"))]
+    if etree is not None:
+        candidates.insert(0, ("lxml", lambda: extract_html(html, max_text, max_links, parser="lxml")))
+    try:
+        import bs4  # noqa: F401
+        candidates.append(("beautifulsoup", full_soup))
+    except ImportError:
+        pass
+    
+    results = {"bytes": len(html.encode("utf-8", errors="replace"))}
+    for name, run in candidates:
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        results[name] = {
+            "median_ms": round(timings[len(timings) // 2] * 1000, 2),
+            "min_ms": round(timings[0] * 1000, 2)
+        }
+    
+    extract = extract_html(html, max_text, max_links)
+    results["complete"] = extract["complete"]
+    results["chars_parsed"] = extract["chars_parsed"]
+    return results
+
+if __name__ == "__main__":
+    # python tool_html.py page.html [more.html ...]: benchmark saved pages
+    if len(sys.argv) < 2:
+        sys.exit("usage: python tool_html.py page.html [page.html ...]")
+    for page_path in sys.argv[1:]:
+        with open(page_path, "r", encoding="utf-8", errors="replace") as f:
+            page = f.read()
+        print(json.dumps({"file": page_path, **benchmark_extract(page)}, indent=2))
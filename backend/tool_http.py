@@ -0,0 +1,118 @@
+"""
+Tool HTTP
+Shared pooled HTTP client with keep-alive, per-host connection limits, retries and async fetches
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Any, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class HTTPClient:
+    """One connection pool for every web tool call
+    
+    Connections live in a single HTTPAdapter, so keep-alive connections are
+    reused across calls and threads. All threads share one Session mounted on
+    that adapter; its cookie jar refuses every cookie, so nothing set for one
+    call is sent on an unrelated later one. Pass cookies per request instead
+    (a redirect chain within one call still keeps its cookies). pool_block caps concurrent connections per host at per_host; extra callers
+    wait for a free connection instead of opening more.
+    
+    Retries cover connection errors and RETRY_STATUSES with exponential
+    backoff, honouring Retry-After. Non-idempotent methods (POST, PATCH) are
+    only retried when the connection failed before the request was sent.
+    """
+    
+    def __init__(self, max_hosts: int = 32, per_host: int = 8, retries: int = 3,
+                 backoff_factor: float = 0.3, max_concurrency: int = 16,
+                 timeout: float = DEFAULT_TIMEOUT, headers: Optional[Dict[str, str]] = None):
+        self.timeout = timeout
+        self.headers = dict(headers or {})
+        self.retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        self.adapter = HTTPAdapter(
+            pool_connections=max_hosts,
+            pool_maxsize=per_host,
+            pool_block=True,
+            max_retries=self.retry
+        )
+        
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.session.headers.update(self.headers)
+        self.session.cookies = RequestsCookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+        
+        self._lock = threading.Lock()
+        # Runs the blocking requests behind request_async and fetch_all
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="tool-http")
+        self.metrics = {"requests": 0, "errors": 0}
+    
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        with self._lock:
+            self.metrics["requests"] += 1
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.metrics["errors"] += 1
+            raise
+    
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+    
+    async def request_async(self, method: str, url: str, **kwargs) -> requests.Response:
+        """request() for asyncio callers; the blocking call runs on the client's executor"""
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: self.request(method, url, **kwargs))
+    
+    async def get_async(self, url: str, **kwargs) -> requests.Response:
+        return await self.request_async("GET", url, **kwargs)
+    
+    def fetch_all(self, calls: List[Dict[str, Any]]) -> List[Any]:
+        """Run several requests concurrently; results (Response or exception) in call order
+        
+        Each call is a dict with method (default GET), url and any requests
+        keyword arguments.
+        """
+        
+        def run(call: Dict[str, Any]):
+            call = dict(call)
+            try:
+                return self.request(call.pop("method", "GET"), call.pop("url"), **call)
+            except Exception as e:
+                return e
+        
+        return list(self.executor.map(run, calls))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.metrics)
+        stats["pools"] = len(self.adapter.poolmanager.pools)
+        return stats
+    
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,431 @@
+"""
+Tool HTTP Cache
+On-disk LRU cache of GET responses for the web tools, with Cache-Control freshness and conditional revalidation
+"""
+import os
+import json
+import stat
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import default_headers
+
+logger = logging.getLogger(__name__)
+
+# Headers a 304 may update on the stored response
+REVALIDATION_HEADERS = ("Cache-Control", "Date", "Expires", "ETag", "Last-Modified", "Age", "Vary")
+
+# Response directives that forbid serving a stale copy when the origin can't be reached
+# (RFC 9111 4.2.4; s-maxage implies proxy-revalidate for a shared cache)
+NO_STALE_DIRECTIVES = ("no-cache", "must-revalidate", "proxy-revalidate", "s-maxage")
+
+# Heuristic freshness (10% of the time since Last-Modified) never exceeds this
+MAX_HEURISTIC_TTL = 24 * 3600
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    """Cache-Control directives, lowercased: {"max-age": "60", "no-cache": None, ...}"""
+    
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def freshness_lifetime(headers: Dict[str, str], ttl_override: Optional[float] = None) -> float:
+    """Seconds a stored response stays fresh (RFC 9111 4.2.1, shared cache)
+    
+    s-maxage wins over max-age. A per-domain override replaces whatever the
+    server says, except that no-cache always forces revalidation.
+    """
+    
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    if "no-cache" in directives:
+        return 0.0
+    if ttl_override is not None:
+        return float(ttl_override)
+    
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            try:
+                return max(0.0, float(directives[name]))
+            except (TypeError, ValueError):
+                return 0.0
+    
+    date = _http_date(headers.get("Date"))
+    expires = headers.get("Expires")
+    if expires is not None:
+        expires_at = _http_date(expires)
+        # An invalid Expires (e.g. "0") means already expired
+        return max(0.0, expires_at - (date or time.time())) if expires_at else 0.0
+    
+    last_modified = _http_date(headers.get("Last-Modified"))
+    if last_modified and date and date > last_modified:
+        return min(MAX_HEURISTIC_TTL, (date - last_modified) / 10)
+    
+    return 0.0
+
+class CachedResponse:
+    """The parts of a requests.Response the web tools use, rebuilt from the cache"""
+    
+    def __init__(self, url: str, status_code: int, headers: Dict[str, str], content: bytes,
+                 encoding: Optional[str]):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.encoding = encoding
+    
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+    
+    def raise_for_status(self):
+        """Only successful responses are stored"""
+
+class HTTPCache:
+    """Size-bounded on-disk LRU of GET responses
+    
+    Each entry is a <key>.body file plus a <key>.meta JSON file (url,
+    headers, stored_at, Vary values); the LRU order lives in memory and is
+    rebuilt from meta file mtimes, which hits touch. Stale entries with an
+    ETag or Last-Modified are revalidated with a conditional GET, and served
+    stale if that request fails unless the response forbids it
+    (NO_STALE_DIRECTIVES).
+    
+    The store is shared by every caller, so it behaves as a shared cache:
+    requests with credentials (Authorization, Cookie) bypass it, responses
+    that are private or set cookies are never stored, and the directory is
+    only used if it belongs to this user (it is created with mode 0700).
+    """
+    
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = 256 * 1024 * 1024,
+                 max_entry_bytes: int = 8 * 1024 * 1024, domain_ttls: Optional[Dict[str, float]] = None):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "ali_http_cache")
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.domain_ttls = dict(domain_ttls or {})
+        
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._loaded = False
+        self._usable = False
+        self._lock = threading.Lock()
+        
+        self.metrics = {"hits": 0, "revalidated": 0, "misses": 0, "stale": 0, "bypassed": 0,
+                        "stores": 0, "evictions": 0}
+    
+    def fetch(self, client, url: str, headers: Optional[Dict[str, str]] = None,
+              **kwargs) -> Tuple[Any, str]:
+        """GET url through the cache: (response, cache_status)
+        
+        cache_status is "hit" (served from disk), "revalidated" (304 from the
+        origin), "stale" (origin failed, stale copy served), "miss" or
+        "bypass" (request not cacheable). kwargs go to client.request.
+        """
+        
+        request_headers = CaseInsensitiveDict(default_headers())
+        request_headers.update(getattr(client, "headers", {}) or {})
+        request_headers.update(headers or {})
+        request_directives = parse_cache_control(request_headers.get("Cache-Control"))
+        
+        credentials = "Authorization" in request_headers or "Cookie" in request_headers or kwargs.get("cookies")
+        if "no-store" in request_directives or credentials:
+            self._count("bypassed")
+            return client.request("GET", url, headers=headers, **kwargs), "bypass"
+        
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        entry = self._lookup(key, request_headers)
+        
+        if entry is not None:
+            age = time.time() - entry["stored_at"] + entry.get("age", 0)
+            lifetime = freshness_lifetime(entry["headers"], self._domain_ttl(url))
+            if age < lifetime and "no-cache" not in request_directives:
+                cached = self._load_response(key, entry)
+                if cached is not None:
+                    self._count("hits")
+                    self._touch(key)
+                    return cached, "hit"
+                entry = None  # body file lost; refetch below
+        
+        if entry is not None:
+            stored = CaseInsensitiveDict(entry["headers"])
+            validators = {}
+            if stored.get("ETag"):
+                validators["If-None-Match"] = stored["ETag"]
+            if stored.get("Last-Modified"):
+                validators["If-Modified-Since"] = stored["Last-Modified"]
+            
+            if validators:
+                conditional = {**(headers or {}), **validators}
+                try:
+                    response = client.request("GET", url, headers=conditional, **kwargs)
+                except requests.RequestException as e:
+                    stored_directives = parse_cache_control(stored.get("Cache-Control"))
+                    if any(name in stored_directives for name in NO_STALE_DIRECTIVES):
+                        raise
+                    cached = self._load_response(key, entry)
+                    if cached is None:
+                        raise
+                    logger.warning(f"Serving stale cached copy of {url}: {str(e)}")
+                    self._count("stale")
+                    return cached, "stale"
+                
+                if response.status_code == 304:
+                    self._refresh(key, entry, response)
+                    cached = self._load_response(key, entry)
+                    if cached is not None:
+                        self._count("revalidated")
+                        return cached, "revalidated"
+                    # Body went missing under us; fetch it unconditionally
+                    response = client.request("GET", url, headers=headers, **kwargs)
+                
+                self._store(key, url, response, request_headers)
+                self._count("misses")
+                return response, "miss"
+        
+        response = client.request("GET", url, headers=headers, **kwargs)
+        self._store(key, url, response, request_headers)
+        self._count("misses")
+        return response, "miss"
+    
+    def clear(self):
+        with self._lock:
+            self._load()
+            for key in list(self._entries):
+                self._remove(key)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        
+        lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["revalidated"]) / lookups if lookups else 0.0
+        stats["max_bytes"] = self.max_bytes
+        stats["directory"] = self.directory
+        return stats
+    
+    def _domain_ttl(self, url: str) -> Optional[float]:
+        """Override for the URL's host or its nearest parent domain listed in domain_ttls"""
+        
+        host = requests.utils.urlparse(url).hostname or ""
+        while host:
+            if host in self.domain_ttls:
+                return self.domain_ttls[host]
+            _, _, host = host.partition(".")
+        return None
+    
+    def _lookup(self, key: str, request_headers: CaseInsensitiveDict) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+        
+        if entry is None:
+            return None
+        
+        # A response that varies on a header only matches requests with the same value
+        for name, value in entry.get("vary", {}).items():
+            if request_headers.get(name) != value:
+                return None
+        return entry
+    
+    def _store(self, key: str, url: str, response, request_headers: CaseInsensitiveDict):
+        """Write a 200 response to disk if it is storable and worth keeping"""
+        
+        if response.status_code != 200:
+            return
+        
+        directives = parse_cache_control(response.headers.get("Cache-Control"))
+        vary = [name.strip() for name in response.headers.get("Vary", "").split(",") if name.strip()]
+        if "no-store" in directives or "private" in directives or "*" in vary:
+            return
+        # Replaying a Set-Cookie would hand one caller's session to the next
+        if "Set-Cookie" in response.headers:
+            return
+        
+        with self._lock:
+            self._load()
+            if not self._usable:
+                return
+        
+        has_validator = "ETag" in response.headers or "Last-Modified" in response.headers
+        if not has_validator and freshness_lifetime(response.headers, self._domain_ttl(url)) <= 0:
+            return
+        
+        content = response.content
+        if len(content) > self.max_entry_bytes:
+            return
+        
+        entry = {
+            "url": url,
+            "status_code": response.status_code,
+            "headers": dict(response.headers),
+            "encoding": response.encoding,
+            "stored_at": time.time(),
+            "age": _age_header(response.headers),
+            "vary": {name: request_headers.get(name) for name in vary},
+            "size": len(content)
+        }
+        
+        try:
+            _atomic_write(self._path(key, "body"), content)
+            _atomic_write(self._path(key, "meta"), json.dumps(entry).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Failed to cache response for {url}: {str(e)}")
+            return
+        
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)["size"]
+            self._entries[key] = entry
+            self._bytes += entry["size"]
+            self.metrics["stores"] += 1
+            
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                evicted = next(iter(self._entries))
+                self._remove(evicted)
+                self.metrics["evictions"] += 1
+    
+    def _refresh(self, key: str, entry: Dict[str, Any], response):
+        """Fold a 304's headers into the stored entry and restart its age"""
+        
+        headers = CaseInsensitiveDict(entry["headers"])
+        for name in REVALIDATION_HEADERS:
+            if name in response.headers:
+                headers[name] = response.headers[name]
+        
+        entry["headers"] = dict(headers)
+        entry["stored_at"] = time.time()
+        entry["age"] = _age_header(response.headers)
+        
+        try:
+            _atomic_write(self._path(key, "meta"), json.dumps(entry).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Failed to update cached response for {entry['url']}: {str(e)}")
+        self._touch(key)
+    
+    def _load_response(self, key: str, entry: Dict[str, Any]) -> Optional[CachedResponse]:
+        try:
+            with open(self._path(key, "body"), "rb") as f:
+                content = f.read()
+        except OSError:
+            with self._lock:
+                if key in self._entries:
+                    self._remove(key)
+            return None
+        
+        return CachedResponse(entry["url"], entry["status_code"], entry["headers"], content, entry.get("encoding"))
+    
+    def _touch(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        try:
+            os.utime(self._path(key, "meta"))
+        except OSError:
+            pass
+    
+    def _load(self):
+        """Rebuild the index from disk, least recently used first (first use only, lock held)"""
+        
+        if self._loaded:
+            return
+        self._loaded = True
+        
+        self._usable = _private_directory(self.directory)
+        if not self._usable:
+            logger.warning(f"HTTP cache disabled: {self.directory} is not a private directory of this user")
+            return
+        
+        found = []
+        with os.scandir(self.directory) as entries:
+            for item in entries:
+                if not item.name.endswith(".meta"):
+                    continue
+                key = item.name[:-len(".meta")]
+                try:
+                    with open(item.path, "rb") as f:
+                        entry = json.loads(f.read())
+                    mtime = item.stat().st_mtime
+                except (OSError, ValueError):
+                    self._remove(key)
+                    continue
+                found.append((mtime, key, entry))
+        
+        for _, key, entry in sorted(found, key=lambda item: item[0]):
+            self._entries[key] = entry
+            self._bytes += entry.get("size", 0)
+    
+    def _remove(self, key: str):
+        """Drop an entry and its files (lock held)"""
+        
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.get("size", 0)
+        for suffix in ("meta", "body"):
+            try:
+                os.remove(self._path(key, suffix))
+            except OSError:
+                pass
+    
+    def _count(self, metric: str):
+        with self._lock:
+            self.metrics[metric] += 1
+    
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{key}.{suffix}")
+
+def _private_directory(path: str) -> bool:
+    """Create path with mode 0700, or check an existing one is our own directory; False if it can't be trusted"""
+    
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+        if not stat.S_ISDIR(info.st_mode):
+            return False
+        if hasattr(os, "getuid") and info.st_uid != os.getuid():
+            return False
+        if info.st_mode & 0o077:
+            os.chmod(path, 0o700)
+        return True
+    except OSError:
+        return False
+
+def _age_header(headers) -> float:
+    try:
+        return max(0.0, float(headers.get("Age", 0)))
+    except (TypeError, ValueError):
+        return 0.0
+
+def _atomic_write(path: str, data: bytes):
+    """Write via a temp file and rename, so readers never see a partial file"""
+    
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,306 @@
+"""
+Tool Workspace Index
+scandir-built index of workspace files, revalidated by directory mtime, with glob matching and paging
+"""
+import os
+import re
+import logging
+import threading
+from functools import lru_cache
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+GLOB_CHARS = set("*?[")
+
+class _DirRecord:
+    """One indexed directory: its own mtime and its direct children"""
+    
+    __slots__ = ("mtime_ns", "files", "dirs", "linked_dirs", "dirty")
+    
+    def __init__(self, mtime_ns: int):
+        self.mtime_ns = mtime_ns
+        self.files: Dict[str, Tuple[int, int]] = {}  # name -> (size, mtime_ns)
+        self.dirs: Dict[str, int] = {}  # name -> mtime_ns
+        self.linked_dirs: Dict[str, int] = {}  # symlinks to directories: listed, never descended into
+        self.dirty = False
+
+@lru_cache(maxsize=256)
+def compile_glob(pattern: str) -> "re.Pattern":
+    """Regex for a glob: * and ? stay within one path segment, ** spans any number
+    
+    A pattern without glob characters matches names containing it, as
+    file_list always has.
+    """
+    
+    if not GLOB_CHARS & set(pattern):
+        return re.compile(".*" + re.escape(pattern) + ".*", re.DOTALL)
+    
+    parts = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith("**/", index):
+            parts.append("(?:.*/)?")
+            index += 3
+            continue
+        if pattern.startswith("**", index):
+            parts.append(".*")
+            index += 2
+            continue
+        if char == "*":
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            # A leading ! negates and a ] right after the opening bracket is literal
+            start = index + 1
+            if pattern[start:start + 1] == "!":
+                start += 1
+            if pattern[start:start + 1] == "]":
+                start += 1
+            close = pattern.find("]", start)
+            if close == -1:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[index + 1:close]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append("[" + body.replace("\\", "\\\\") + "]")
+                index = close
+        else:
+            parts.append(re.escape(char))
+        index += 1
+    
+    return re.compile("".join(parts) + r"\Z", re.DOTALL)
+
+class WorkspaceIndex:
+    """Files under a root, kept current with one stat per directory
+    
+    A directory's mtime changes whenever an entry is added, removed or
+    renamed in it, so listings only rescan directories whose mtime moved.
+    In-place edits to an existing file don't touch its directory: writers
+    call invalidate() (ToolUseAPI does for its own tools), and refresh=True
+    rescans everything.
+    """
+    
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._records: Dict[str, _DirRecord] = {}
+        self._built = False
+        self._lock = threading.RLock()
+        self.metrics = {"builds": 0, "rescanned_dirs": 0, "validations": 0}
+    
+    def list_files(self, directory: str = "", pattern: str = "*", recursive: bool = False,
+                   offset: int = 0, limit: Optional[int] = None,
+                   refresh: bool = False) -> Tuple[List[Dict[str, Any]], int]:
+        """Matching files under directory sorted by path, plus the total match count
+        
+        Patterns with a "/" match the path relative to directory, others the
+        file name.
+        """
+        
+        matcher = compile_glob(pattern) if pattern != "*" else None
+        match_path = "/" in pattern
+        directory = self._relative(directory)
+        
+        with self._lock:
+            self._validate(directory, recursive, refresh)
+            
+            matches = []
+            for rel_dir, record in self._records_under(directory, recursive):
+                prefix = rel_dir[len(directory):].lstrip("/")
+                for name, (size, mtime_ns) in record.files.items():
+                    path = f"{prefix}/{name}" if prefix else name
+                    if matcher and not matcher.match(path if match_path else name):
+                        continue
+                    matches.append((path, name, size, mtime_ns))
+        
+        matches.sort()
+        total = len(matches)
+        page = matches[offset:offset + limit] if limit is not None else matches[offset:]
+        
+        return [
+            {"name": name, "path": path, "size": size, "mtime": mtime_ns / 1e9}
+            for path, name, size, mtime_ns in page
+        ], total
+    
+    def list_directory(self, directory: str = "", refresh: bool = False) -> List[Dict[str, Any]]:
+        """Direct children of directory: subdirectories then files, by name"""
+        
+        directory = self._relative(directory)
+        
+        with self._lock:
+            self._validate(directory, False, refresh)
+            record = self._records.get(directory)
+            if record is None:
+                raise FileNotFoundError(f"Directory not found: {directory or '.'}")
+            
+            dirs = {**record.dirs, **record.linked_dirs}
+            items = [{"name": name, "type": "directory", "size": 0, "mtime": mtime_ns / 1e9}
+                     for name, mtime_ns in sorted(dirs.items())]
+            items.extend({"name": name, "type": "file", "size": size, "mtime": mtime_ns / 1e9}
+                         for name, (size, mtime_ns) in sorted(record.files.items()))
+        return items
+    
+    def iter_files(self, directory: str = "", refresh: bool = False) -> Iterator[Tuple[str, int, int]]:
+        """(path relative to root, size, mtime_ns) for every indexed file under directory"""
+        
+        directory = self._relative(directory)
+        with self._lock:
+            self._validate(directory, True, refresh)
+            files = [
+                (f"{rel_dir}/{name}" if rel_dir else name, size, mtime_ns)
+                for rel_dir, record in self._records_under(directory, True)
+                for name, (size, mtime_ns) in record.files.items()
+            ]
+        return iter(files)
+    
+    def invalidate(self, path: str):
+        """Force a rescan of whatever contains path (and everything under it, for a directory)"""
+        
+        rel_path = self._relative(path)
+        
+        with self._lock:
+            if not self._built:
+                return
+            
+            if rel_path in self._records:
+                for _, record in self._records_under(rel_path, True):
+                    record.dirty = True
+            
+            parent = rel_path.rsplit("/", 1)[0] if "/" in rel_path else ""
+            record = self._records.get(parent)
+            if record is not None:
+                record.dirty = True
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["directories"] = len(self._records)
+            stats["files"] = sum(len(record.files) for record in self._records.values())
+        return stats
+    
+    def _relative(self, path: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, path or ""))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            raise ValueError(f"Path outside index root: {path}")
+        rel_path = os.path.relpath(path, self.root)
+        return "" if rel_path == "." else rel_path.replace(os.sep, "/")
+    
+    def _records_under(self, directory: str, recursive: bool) -> Iterator[Tuple[str, _DirRecord]]:
+        """Records for directory and, if recursive, its descendants (lock held)"""
+        
+        record = self._records.get(directory)
+        if record is None:
+            return
+        yield directory, record
+        
+        if recursive:
+            stack = [f"{directory}/{name}" if directory else name for name in record.dirs]
+            while stack:
+                rel_dir = stack.pop()
+                child = self._records.get(rel_dir)
+                if child is None:
+                    continue
+                yield rel_dir, child
+                stack.extend(f"{rel_dir}/{name}" for name in child.dirs)
+    
+    def _validate(self, directory: str, recursive: bool, refresh: bool):
+        """Bring the records the listing needs up to date (lock held)"""
+        
+        if not self._built or refresh:
+            self._records.clear()
+            self._scan_tree("")
+            self._built = True
+            self.metrics["builds"] += 1
+            return
+        
+        self.metrics["validations"] += 1
+        
+        # Parents first, so a removed or replaced ancestor is noticed before its children
+        chain = [""]
+        if directory:
+            parts = directory.split("/")
+            chain.extend("/".join(parts[:index + 1]) for index in range(len(parts)))
+        for rel_dir in chain[:-1]:
+            self._validate_one(rel_dir)
+        
+        if recursive:
+            for rel_dir, _ in list(self._records_under(directory, True)):
+                self._validate_one(rel_dir)
+        else:
+            self._validate_one(directory)
+    
+    def _validate_one(self, rel_dir: str):
+        record = self._records.get(rel_dir)
+        if record is None:
+            return
+        
+        try:
+            mtime_ns = os.stat(self._absolute(rel_dir)).st_mtime_ns
+        except OSError:
+            self._drop(rel_dir)
+            return
+        
+        if record.dirty or mtime_ns != record.mtime_ns:
+            self._rescan(rel_dir)
+    
+    def _rescan(self, rel_dir: str):
+        """Re-read one directory, scanning new subdirectories and dropping removed ones"""
+        
+        old = self._records.get(rel_dir)
+        record = self._scan_dir(rel_dir)
+        if record is None:
+            self._drop(rel_dir)
+            return
+        
+        for name in (old.dirs if old else {}):
+            if name not in record.dirs:
+                self._drop(f"{rel_dir}/{name}" if rel_dir else name)
+        for name in record.dirs:
+            child = f"{rel_dir}/{name}" if rel_dir else name
+            if child not in self._records:
+                self._scan_tree(child)
+    
+    def _scan_tree(self, rel_dir: str):
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            record = self._scan_dir(current)
+            if record is not None:
+                stack.extend(f"{current}/{name}" if current else name for name in record.dirs)
+    
+    def _scan_dir(self, rel_dir: str) -> Optional[_DirRecord]:
+        """scandir one directory into a record; entry stats come from the DirEntry"""
+        
+        path = self._absolute(rel_dir)
+        try:
+            record = _DirRecord(os.stat(path).st_mtime_ns)
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            record.dirs[entry.name] = entry.stat(follow_symlinks=False).st_mtime_ns
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            record.files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                        elif entry.is_dir():
+                            record.linked_dirs[entry.name] = entry.stat().st_mtime_ns
+                    except OSError:
+                        continue  # vanished mid-scan or a broken symlink
+        except OSError as e:
+            logger.debug(f"Cannot index {path}: {str(e)}")
+            return None
+        
+        self._records[rel_dir] = record
+        self.metrics["rescanned_dirs"] += 1
+        return record
+    
+    def _drop(self, rel_dir: str):
+        prefix = rel_dir + "/"
+        for key in [key for key in self._records if key == rel_dir or (not rel_dir or key.startswith(prefix))]:
+            del self._records[key]
+    
+    def _absolute(self, rel_dir: str) -> str:
+        return os.path.join(self.root, rel_dir) if rel_dir else self.root
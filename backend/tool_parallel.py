@@ -0,0 +1,245 @@
+"""
+Tool Parallel
+Concurrent dispatch of independent tool calls: threads for I/O-bound tools, processes for CPU-heavy ones
+"""
+import time
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional
+
+from tool_text import json_parse, text_process
+
+logger = logging.getLogger(__name__)
+
+# Pure tools that may run in a worker process; they must be importable module-level functions
+PROCESS_TOOLS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "json_parse": json_parse,
+    "text_process": text_process
+}
+
+def _run_process_tool(tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker-process entry point: run a pure tool, timing it with the wall clock"""
+    
+    started = time.time()
+    try:
+        return {"success": True, "result": PROCESS_TOOLS[tool_name](parameters),
+                "started": started, "finished": time.time()}
+    except Exception as e:
+        return {"success": False, "error": str(e), "started": started, "finished": time.time()}
+
+def _warm_up() -> bool:
+    return True
+
+def payload_size(parameters: Dict[str, Any]) -> int:
+    """Characters of string input in a call's parameters (what a CPU-bound tool chews through)"""
+    return sum(len(value) for value in parameters.values() if isinstance(value, (str, bytes)))
+
+class ToolDispatcher:
+    """Runs a batch of tool calls concurrently and returns results in call order
+    
+    Calls go to a thread pool, except PROCESS_TOOLS calls whose string
+    payload is at least process_threshold characters: those go to a process
+    pool, so parsing or scanning big inputs doesn't hold the GIL against the
+    I/O-bound calls. Smaller ones stay on threads, where they finish faster
+    than the pickling round trip would take.
+    
+    A call that misses its timeout is reported as failed; its work can't be
+    interrupted and finishes in the background.
+    
+    The worker processes are forked in __init__, before the dispatcher's own
+    threads exist, so construct it early in a multithreaded server. If the
+    pool breaks it is not re-forked (other threads may hold locks by then);
+    later calls run on threads instead.
+    """
+    
+    def __init__(self, run_tool: Callable[[str, Dict[str, Any]], Dict[str, Any]], max_threads: int = 16,
+                 max_processes: Optional[int] = None, process_threshold: int = 256 * 1024,
+                 default_timeout: float = 120.0):
+        self.run_tool = run_tool
+        self.max_processes = max_processes or max(1, min(4, multiprocessing.cpu_count()))
+        self.process_threshold = process_threshold
+        self.default_timeout = default_timeout
+        
+        self.thread_pool = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="tool-dispatch")
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._process_pool_failed = False
+        self._lock = threading.Lock()
+        
+        self.metrics = {"batches": 0, "calls": 0, "thread_calls": 0, "process_calls": 0, "timeouts": 0}
+        
+        self._start_process_pool()
+    
+    def execute(self, calls: List[Dict[str, Any]], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Run calls ({tool, parameters, timeout}) concurrently; results in the same order
+        
+        Each result is what execute_tool returns plus "timing": executor,
+        queued (seconds before it started), duration and elapsed (seconds
+        from submission to result).
+        """
+        
+        with self._lock:
+            self.metrics["batches"] += 1
+            self.metrics["calls"] += len(calls)
+        
+        submitted = []
+        for call in calls:
+            tool_name = call.get("tool")
+            parameters = call.get("parameters") or {}
+            call_timeout = call.get("timeout", timeout if timeout is not None else self.default_timeout)
+            submitted_at = time.time()
+            
+            if not tool_name:
+                submitted.append((None, "inline", submitted_at, call_timeout, tool_name))
+                continue
+            
+            executor = self._executor_for(tool_name, parameters)
+            future = self._submit(executor, tool_name, parameters)
+            if future is None:
+                executor = "thread"
+                future = self._submit(executor, tool_name, parameters)
+            submitted.append((future, executor, submitted_at, call_timeout, tool_name))
+        
+        results = []
+        for future, executor, submitted_at, call_timeout, tool_name in submitted:
+            if future is None:
+                results.append(self._failure(tool_name, "tool is required", executor, submitted_at))
+                continue
+            
+            remaining = None if call_timeout is None else max(0.0, submitted_at + call_timeout - time.time())
+            try:
+                outcome = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                future.cancel()
+                with self._lock:
+                    self.metrics["timeouts"] += 1
+                result = self._failure(tool_name, f"Tool call timed out after {call_timeout} seconds",
+                                       executor, submitted_at)
+                result["timed_out"] = True
+                results.append(result)
+                continue
+            except BrokenProcessPool as e:
+                logger.error(f"Tool worker process died running {tool_name}: {str(e)}")
+                self._reset_process_pool()
+                results.append(self._failure(tool_name, f"Worker process failed: {str(e)}", executor, submitted_at))
+                continue
+            
+            results.append(self._finish(tool_name, outcome, executor, submitted_at))
+        
+        return results
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.metrics)
+        stats["process_pool"] = "failed" if self._process_pool_failed else \
+            ("running" if self._process_pool else "idle")
+        return stats
+    
+    def close(self):
+        self.thread_pool.shutdown(wait=False)
+        with self._lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=False, cancel_futures=True)
+                self._process_pool = None
+    
+    def _executor_for(self, tool_name: str, parameters: Dict[str, Any]) -> str:
+        # file_path calls need the workspace path checks that only run_tool applies
+        if tool_name in PROCESS_TOOLS and not self._process_pool_failed and "file_path" not in parameters and \
+                payload_size(parameters) >= self.process_threshold:
+            return "process"
+        return "thread"
+    
+    def _submit(self, executor: str, tool_name: str, parameters: Dict[str, Any]):
+        """Future for the call, or None if the process pool is unavailable"""
+        
+        if executor == "thread":
+            with self._lock:
+                self.metrics["thread_calls"] += 1
+            return self.thread_pool.submit(self._run_thread_tool, tool_name, parameters)
+        
+        pool = self._get_process_pool()
+        if pool is None:
+            return None
+        try:
+            future = pool.submit(_run_process_tool, tool_name, parameters)
+        except (BrokenProcessPool, RuntimeError) as e:
+            logger.warning(f"Process pool unavailable, running {tool_name} on a thread: {str(e)}")
+            self._reset_process_pool()
+            return None
+        with self._lock:
+            self.metrics["process_calls"] += 1
+        return future
+    
+    def _run_thread_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.time()
+        result = self.run_tool(tool_name, parameters)
+        return {**result, "started": started, "finished": time.time()}
+    
+    def _start_process_pool(self):
+        """Fork every worker now; a fork pool starts all of them on its first submit"""
+        
+        pool = None
+        try:
+            # fork, not spawn: spawn re-imports __main__ in every worker, and
+            # main.py builds a whole orchestrator at import time. Workers only
+            # run pure tool functions, which touch none of the parent's locks.
+            start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+            pool = ProcessPoolExecutor(
+                max_workers=self.max_processes,
+                mp_context=multiprocessing.get_context(start_method)
+            )
+            pool.submit(_warm_up).result(timeout=30)
+        except Exception as e:
+            logger.warning(f"Cannot start tool worker processes, using threads: {str(e)}")
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool_failed = True
+            return
+        
+        self._process_pool = pool
+    
+    def _get_process_pool(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            return self._process_pool
+    
+    def _reset_process_pool(self):
+        """Retire a broken pool for good; re-forking now could copy a lock held by another thread"""
+        
+        with self._lock:
+            if self._process_pool is not None:
+                self._process_pool.shutdown(wait=False, cancel_futures=True)
+                self._process_pool = None
+            self._process_pool_failed = True
+    
+    def _finish(self, tool_name: str, outcome: Dict[str, Any], executor: str,
+                submitted_at: float) -> Dict[str, Any]:
+        started = outcome.pop("started")
+        finished = outcome.pop("finished")
+        
+        result = outcome
+        if executor == "process":
+            # Same shape as execute_tool for calls it didn't run itself
+            result = {key: value for key, value in outcome.items() if key in ("success", "result", "error")}
+            result["tool"] = tool_name
+            result["timestamp"] = datetime.fromtimestamp(finished).isoformat()
+        
+        result["timing"] = {
+            "executor": executor,
+            "queued": round(max(0.0, started - submitted_at), 6),
+            "duration": round(finished - started, 6),
+            "elapsed": round(finished - submitted_at, 6)
+        }
+        result.setdefault("tool", tool_name)
+        return result
+    
+    def _failure(self, tool_name: Optional[str], error: str, executor: str, submitted_at: float) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": error,
+            "tool": tool_name,
+            "timestamp": datetime.now().isoformat(),
+            "timing": {"executor": executor, "elapsed": round(time.time() - submitted_at, 6)}
+        }
@@ -0,0 +1,279 @@
+"""
+Tool Search
+Trigram index over the workspace's text files for ranked full-text search
+"""
+import os
+import re
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Set
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+from tool_files import detect_encoding
+from tool_index import WorkspaceIndex, compile_glob
+
+logger = logging.getLogger(__name__)
+
+# Never indexed: VCS internals, dependency trees and caches
+IGNORED_DIRS = {".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv", ".tox",
+                ".mypy_cache", ".pytest_cache", "dist", "build"}
+
+MAX_FILE_BYTES = 1024 * 1024
+LINE_PREVIEW = 200
+
+def trigrams(text: str) -> Set[str]:
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
+def required_literals(pattern: str) -> List[str]:
+    """Literal runs every match of a regex must contain (lowercased)
+    
+    Only top-level literals count; alternations, groups and repeats break a
+    run. Returns [] when nothing can be guaranteed, meaning every file is a
+    candidate.
+    """
+    
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return []
+    
+    literals, run = [], []
+    for op, argument in parsed:
+        if str(op) == "LITERAL":
+            run.append(chr(argument))
+            continue
+        if str(op) == "BRANCH":
+            return []
+        if len(run) >= 3:
+            literals.append("".join(run).lower())
+        run = []
+    if len(run) >= 3:
+        literals.append("".join(run).lower())
+    return literals
+
+class _IndexedFile:
+    __slots__ = ("path", "size", "mtime_ns", "grams")
+    
+    def __init__(self, path: str, size: int, mtime_ns: int, grams: Set[str]):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.grams = grams
+
+class WorkspaceSearch:
+    """Inverted trigram index kept in step with a WorkspaceIndex
+    
+    Every query first syncs against the workspace index's file list (an
+    in-memory walk; directories are only rescanned when their mtime moved),
+    re-reading files whose size or mtime changed and dropping removed ones.
+    invalidate() forces a re-read of a path even if its stat looks the same.
+    A query then reads only the files whose trigrams contain all of the
+    query's, and ranks them by match count.
+    """
+    
+    def __init__(self, workspace_index: WorkspaceIndex, max_file_bytes: int = MAX_FILE_BYTES):
+        self.workspace_index = workspace_index
+        self.root = workspace_index.root
+        self.max_file_bytes = max_file_bytes
+        
+        self._files: Dict[str, _IndexedFile] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._skipped: Dict[str, tuple] = {}  # path -> (size, mtime_ns) of binary/oversized files
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+        
+        self.metrics = {"queries": 0, "indexed": 0, "removed": 0}
+    
+    def search(self, query: str, regex: bool = False, case_sensitive: bool = False,
+               directory: str = "", pattern: Optional[str] = None, max_results: int = 20,
+               max_matches_per_file: int = 5, refresh: bool = False) -> Dict[str, Any]:
+        """Files and lines matching query, best first
+        
+        refresh rescans the whole workspace first, picking up in-place edits
+        made outside the tools.
+        """
+        
+        started = time.perf_counter()
+        flags = 0 if case_sensitive else re.IGNORECASE
+        matcher = re.compile(query if regex else re.escape(query), flags | re.MULTILINE)
+        
+        literals = required_literals(query) if regex else ([query.lower()] if len(query) >= 3 else [])
+        prefix = self._relative(directory) if directory else ""
+        name_matcher = compile_glob(pattern) if pattern and pattern != "*" else None
+        
+        with self._lock:
+            self._sync(refresh)
+            self.metrics["queries"] += 1
+            candidates = self._candidates(literals)
+        
+        results = []
+        for path in candidates:
+            if prefix and not path.startswith(prefix + "/"):
+                continue
+            name = path.rsplit("/", 1)[-1]
+            if name_matcher and not name_matcher.match(name):
+                continue
+            found = self._scan(path, matcher, max_matches_per_file)
+            if found:
+                results.append(found)
+        
+        # Most matches first; a hit in the file name outranks the same count in the body
+        lowered = query.lower()
+        results.sort(key=lambda result: (-(lowered in result["path"].rsplit("/", 1)[-1].lower()),
+                                         -result["match_count"], result["path"]))
+        
+        return {
+            "query": query,
+            "results": results[:max_results],
+            "total_files_matched": len(results),
+            "candidates": len(candidates),
+            "indexed_files": len(self._files),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+    
+    def invalidate(self, path: str):
+        """Re-read path (or every file under it) on the next query"""
+        
+        rel_path = self._relative(path)
+        if rel_path is None:
+            return
+        with self._lock:
+            self._dirty.add(rel_path)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["files"] = len(self._files)
+            stats["trigrams"] = len(self._postings)
+        return stats
+    
+    def _relative(self, path: str) -> Optional[str]:
+        """path relative to the root with "/" separators ("" for the root), None if outside"""
+        
+        path = os.path.abspath(os.path.join(self.root, path))
+        if path == self.root:
+            return ""
+        if not path.startswith(self.root + os.sep):
+            return None
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+    
+    def _sync(self, refresh: bool = False):
+        """Bring the index up to date with the workspace (lock held)"""
+        
+        dirty, self._dirty = self._dirty, set()
+        seen = set()
+        
+        for path, size, mtime_ns in self.workspace_index.iter_files(refresh=refresh):
+            if IGNORED_DIRS.intersection(path.split("/")[:-1]):
+                continue
+            seen.add(path)
+            
+            forced = any(path == marked or path.startswith(marked + "/") or not marked for marked in dirty)
+            indexed = self._files.get(path)
+            if not forced:
+                if indexed is not None and (indexed.size, indexed.mtime_ns) == (size, mtime_ns):
+                    continue
+                if self._skipped.get(path) == (size, mtime_ns):
+                    continue
+            self._index_file(path, size, mtime_ns)
+        
+        for path in [path for path in self._files if path not in seen]:
+            self._remove(path)
+            self.metrics["removed"] += 1
+        for path in [path for path in self._skipped if path not in seen]:
+            del self._skipped[path]
+    
+    def _index_file(self, path: str, size: int, mtime_ns: int):
+        self._remove(path)
+        self._skipped.pop(path, None)
+        
+        text = self._read(path, size)
+        if text is None:
+            self._skipped[path] = (size, mtime_ns)
+            return
+        
+        grams = trigrams(text.lower())
+        self._files[path] = _IndexedFile(path, size, mtime_ns, grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(path)
+        self.metrics["indexed"] += 1
+    
+    def _remove(self, path: str):
+        indexed = self._files.pop(path, None)
+        if indexed is None:
+            return
+        for gram in indexed.grams:
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(path)
+                if not posting:
+                    del self._postings[gram]
+    
+    def _candidates(self, literals: List[str]) -> List[str]:
+        """Files containing every trigram of every literal (all files if there are none)"""
+        
+        grams = set()
+        for literal in literals:
+            grams |= trigrams(literal)
+        if not grams:
+            return sorted(self._files)
+        
+        # Smallest posting lists first, so the intersection shrinks fast
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+        return sorted(candidates)
+    
+    def _read(self, path: str, size: Optional[int] = None) -> Optional[str]:
+        """Decoded text of a workspace file, None for binary or oversized files"""
+        
+        if size is not None and size > self.max_file_bytes:
+            return None
+        try:
+            with open(os.path.join(self.root, path), "rb") as f:
+                data = f.read(self.max_file_bytes + 1)
+        except OSError:
+            return None
+        if len(data) > self.max_file_bytes:
+            return None
+        
+        encoding, binary = detect_encoding(data[:64 * 1024])
+        if binary:
+            return None
+        return data.decode(encoding, errors="replace")
+    
+    def _scan(self, path: str, matcher: "re.Pattern", max_matches: int) -> Optional[Dict[str, Any]]:
+        """Matching lines of one file, verified against its current contents"""
+        
+        text = self._read(path)
+        if text is None:
+            return None
+        
+        matches = []
+        count = 0
+        line_number, line_start = 1, 0
+        for match in matcher.finditer(text):
+            count += 1
+            if len(matches) >= max_matches:
+                continue
+            line_number += text.count("\n", line_start, match.start())
+            line_start = text.rfind("\n", 0, match.start()) + 1
+            line_end = text.find("\n", match.start())
+            line = text[line_start:line_end if line_end != -1 else len(text)]
+            matches.append({
+                "line": line_number,
+                "column": match.start() - line_start + 1,
+                "text": line.strip()[:LINE_PREVIEW]
+            })
+        
+        if not count:
+            return None
+        return {"path": path, "match_count": count, "matches": matches}
@@ -0,0 +1,234 @@
+"""
+Tool Text
+JSON parsing and text processing tools as plain functions, so they can also run in worker processes
+"""
+import re
+import json
+import logging
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Any, Callable, Iterator, List, Optional
+
+from tool_files import detect_file_encoding
+
+logger = logging.getLogger(__name__)
+
+# Characters handed to an operation at a time; blocks end on a line break
+BLOCK_SIZE = 1024 * 1024
+
+EMAIL_PATTERN = re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b")
+# The classic http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|%xx)+ as one character class
+URL_PATTERN = re.compile(r"https?://[!$-_a-z]+")
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def json_parse(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Parse JSON data"""
+    
+    json_data = params.get("json_data")
+    if not json_data:
+        raise ValueError("json_data is required")
+    
+    try:
+        if isinstance(json_data, str):
+            parsed = json.loads(json_data)
+        else:
+            parsed = json_data
+        
+        return {
+            "parsed": parsed,
+            "type": type(parsed).__name__
+        }
+    
+    except json.JSONDecodeError as e:
+        return {
+            "error": f"JSON parse error: {str(e)}"
+        }
+
+def text_process(params: Dict[str, Any], path: Optional[str] = None) -> Dict[str, Any]:
+    """Process text data
+    
+    Works on params["text"], or on the file at path (already resolved and
+    checked by the caller), read BLOCK_SIZE characters at a time so a large
+    file is never held in memory whole. Every operation makes one pass over
+    the blocks.
+    """
+    
+    operation = params.get("operation", "analyze")
+    
+    if path is None:
+        text = params.get("text")
+        if not text:
+            raise ValueError("text is required")
+        handler = _operation(operation)
+        result = handler(text_blocks(text), params)
+        if operation == "analyze":
+            result = {"text": text, **result}
+        return result
+    
+    handler = _operation(operation)
+    encoding = params.get("encoding")
+    if not encoding:
+        encoding, binary = detect_file_encoding(path)
+        if binary:
+            raise ValueError(f"Not a text file: {params.get('file_path', path)}")
+    result = handler(file_blocks(path, encoding), params)
+    result["encoding"] = encoding
+    return result
+
+def text_blocks(text: str, block_size: int = BLOCK_SIZE) -> Iterator[str]:
+    """text in slices of at least block_size characters ending on a line break (the last may not)"""
+    
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start + block_size - 1)
+        end = len(text) if end == -1 else end + 1
+        yield text[start:end]
+        start = end
+
+def file_blocks(path: str, encoding: str, block_size: int = BLOCK_SIZE) -> Iterator[str]:
+    """Decoded blocks of a file, each ending on a line break (the last may not)"""
+    
+    with open(path, "r", encoding=encoding, errors="replace", newline="") as f:
+        pending = ""
+        while True:
+            data = f.read(block_size)
+            if not data:
+                break
+            data = pending + data
+            cut = data.rfind("\n") + 1
+            if not cut:
+                # One very long line: keep reading until it ends
+                pending = data
+                continue
+            pending = data[cut:]
+            yield data[:cut]
+        if pending:
+            yield pending
+
+def _lines(block: str) -> List[str]:
+    lines = block.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return [line[:-1] if line.endswith("\r") else line for line in lines]
+
+@lru_cache(maxsize=32)
+def _token_pattern(min_length: int) -> "re.Pattern":
+    return TOKEN_PATTERN if min_length <= 1 else re.compile(r"\w{%d,}" % min_length)
+
+def _tokens(block: str, params: Dict[str, Any]) -> List[str]:
+    if not params.get("case_sensitive", False):
+        block = block.lower()
+    return _token_pattern(int(params.get("min_length", 1))).findall(block)
+
+def _top_k(params: Dict[str, Any]) -> int:
+    k = int(params.get("k", 10))
+    if k < 1:
+        raise ValueError("k must be at least 1")
+    return k
+
+def _analyze(blocks: Iterator[str], params: Dict[str, Any]) -> Dict[str, Any]:
+    length = words = newlines = spaces = 0
+    for block in blocks:
+        length += len(block)
+        words += len(block.split())
+        newlines += block.count("\n")
+        spaces += block.count(" ")
+    
+    return {
+        "length": length,
+        "words": words,
+        "lines": newlines + 1 if length else 0,
+        "characters": length - spaces
+    }
+
+def _extractor(pattern: "re.Pattern", key: str) -> Callable[[Iterator[str], Dict[str, Any]], Dict[str, Any]]:
+    def extract(blocks: Iterator[str], params: Dict[str, Any]) -> Dict[str, Any]:
+        limit = params.get("limit")
+        found: List[str] = []
+        count = 0
+        for block in blocks:
+            matches = pattern.findall(block)
+            count += len(matches)
+            if limit is None or len(found) < limit:
+                found.extend(matches if limit is None else matches[:limit - len(found)])
+        return {key: found, "count": count}
+    return extract
+
+def _dedupe_lines(blocks: Iterator[str], params: Dict[str, Any]) -> Dict[str, Any]:
+    """Lines in first-seen order, dropping repeats (optionally ignoring case and surrounding whitespace)"""
+    
+    ignore_case = params.get("ignore_case", False)
+    strip = params.get("strip", False)
+    
+    seen = set()
+    unique: List[str] = []
+    total = 0
+    for block in blocks:
+        lines = _lines(block)
+        total += len(lines)
+        for line in lines:
+            key = line.strip() if strip else line
+            if ignore_case:
+                key = key.casefold()
+            if key not in seen:
+                seen.add(key)
+                unique.append(line)
+    
+    return {
+        "text": "\n".join(unique),
+        "lines": total,
+        "unique_lines": len(unique),
+        "duplicates": total - len(unique)
+    }
+
+def _top_tokens(blocks: Iterator[str], params: Dict[str, Any]) -> Dict[str, Any]:
+    """The k most frequent word tokens (lowercased unless case_sensitive, at least min_length long)"""
+    
+    k = _top_k(params)
+    counts: Counter = Counter()
+    for block in blocks:
+        counts.update(_tokens(block, params))
+    
+    return {
+        "tokens": [{"token": token, "count": count} for token, count in counts.most_common(k)],
+        "total_tokens": sum(counts.values()),
+        "unique_tokens": len(counts)
+    }
+
+def _ngrams(blocks: Iterator[str], params: Dict[str, Any]) -> Dict[str, Any]:
+    """Counts of word n-grams (n tokens in a row, across line breaks) and the k most frequent"""
+    
+    n = int(params.get("n", 2))
+    if n < 1:
+        raise ValueError("n must be at least 1")
+    k = _top_k(params)
+    
+    counts: Counter = Counter()
+    carried: List[str] = []
+    for block in blocks:
+        # The last n-1 tokens of the previous block start n-grams that end in this one
+        tokens = carried + _tokens(block, params)
+        counts.update(zip(*(tokens[offset:] for offset in range(n))))
+        carried = tokens[-(n - 1):] if n > 1 else []
+    
+    return {
+        "n": n,
+        "ngrams": [{"ngram": " ".join(gram), "count": count} for gram, count in counts.most_common(k)],
+        "total_ngrams": sum(counts.values()),
+        "unique_ngrams": len(counts)
+    }
+
+OPERATIONS: Dict[str, Callable[[Iterator[str], Dict[str, Any]], Dict[str, Any]]] = {
+    "analyze": _analyze,
+    "extract_emails": _extractor(EMAIL_PATTERN, "emails"),
+    "extract_urls": _extractor(URL_PATTERN, "urls"),
+    "dedupe_lines": _dedupe_lines,
+    "top_tokens": _top_tokens,
+    "ngrams": _ngrams
+}
+
+def _operation(name: str) -> Callable[[Iterator[str], Dict[str, Any]], Dict[str, Any]]:
+    handler = OPERATIONS.get(name)
+    if handler is None:
+        raise ValueError(f"Unknown operation: {name}")
+    return handler
@@ -3,11 +3,10 @@ Tool Use API
 Provides file system, Git, and web search capabilities
 """
 import os
-import json
+import asyncio
 import logging
-import requests
 import subprocess
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterator
 from datetime import datetime
 import tempfile
 from pathlib import Path
@@ -15,26 +14,42 @@ import git
 from git import Repo
 import urllib.parse
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
 import shutil
 
 from config import CONFIG
+from tool_files import (
+    DEFAULT_CHUNK_SIZE, detect_file_encoding, read_range, read_lines, read_tail,
+    iter_chunks, iter_lines, write_text
+)
+from tool_index import WorkspaceIndex
+from tool_http import HTTPClient
+from tool_http_cache import HTTPCache
+from tool_html import extract_html
+from tool_git import GitRepos, clone_options
+from tool_search import WorkspaceSearch
+from tool_text import json_parse, text_process
+from tool_parallel import ToolDispatcher
 
 logger = logging.getLogger(__name__)
 
 class ToolUseAPI:
     """Provides various tools for ALI system operations"""
     
-    def __init__(self):
+    def __init__(self, http_cache_settings: Optional[Dict[str, Any]] = None):
         self.tools = {
             "file_read": self._file_read,
             "file_write": self._file_write,
+            "file_read_many": self._file_read_many,
+            "file_write_many": self._file_write_many,
             "file_list": self._file_list,
             "file_delete": self._file_delete,
             "file_copy": self._file_copy,
             "file_move": self._file_move,
             "directory_create": self._directory_create,
             "directory_list": self._directory_list,
+            "workspace_search": self._workspace_search,
             "git_clone": self._git_clone,
             "git_commit": self._git_commit,
             "git_push": self._git_push,
@@ -48,9 +63,53 @@ class ToolUseAPI:
             "text_process": self._text_process
         }
         
+        # execute_tools: concurrent batches of independent calls. Built first so
+        # its worker processes fork before any of the thread pools below start.
+        self.tool_dispatcher = ToolDispatcher(self.execute_tool)
+        
         # Working directory for file operations
         self.working_dir = tempfile.mkdtemp(prefix="ali_workspace_")
         
+        # Largest file_read result unless the caller asks for a range
+        self.max_read_bytes = 4 * 1024 * 1024
+        
+        # Parallel file I/O for the batch tools
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=min(32, (os.cpu_count() or 1) + 4), thread_name_prefix="tool-io"
+        )
+        
+        # file_list/directory_list index; the tools below invalidate what they change
+        self.workspace_index = WorkspaceIndex(self.working_dir)
+        
+        # Full-text trigram index over the same files, synced on each search
+        self.workspace_search = WorkspaceSearch(self.workspace_index)
+        
+        # Open repo handles and cached status for the git tools
+        self.git_repos = GitRepos()
+        
+        # Pooled, retrying HTTP client shared by the web tools
+        self.http = HTTPClient()
+        self.web_tools = {"web_search", "web_scrape", "http_request"}
+        
+        # On-disk cache for web_scrape and GET http_request, shared across instances
+        self.http_cache_settings = {
+            "enabled": True,
+            "directory": os.path.join(tempfile.gettempdir(), "ali_http_cache"),
+            "max_bytes": 256 * 1024 * 1024,
+            "max_entry_bytes": 8 * 1024 * 1024,
+            "domain_ttls": {}  # domain -> seconds, overriding the server's freshness
+        }
+        if http_cache_settings:
+            self.http_cache_settings.update(http_cache_settings)
+        self.http_cache = None
+        if self.http_cache_settings["enabled"]:
+            self.http_cache = HTTPCache(
+                directory=self.http_cache_settings["directory"],
+                max_bytes=self.http_cache_settings["max_bytes"],
+                max_entry_bytes=self.http_cache_settings["max_entry_bytes"],
+                domain_ttls=self.http_cache_settings["domain_ttls"]
+            )
+        
         logger.info(f"Tool Use API initialized with workspace: {self.working_dir}")
     
     def execute_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
@@ -82,8 +141,36 @@ class ToolUseAPI:
                 "timestamp": datetime.now().isoformat()
             }
     
+    def execute_tools(self, calls: List[Dict[str, Any]], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Execute independent tool calls concurrently
+        
+        calls is a list of {"tool", "parameters", "timeout"}; timeout is the
+        default per-call timeout in seconds. Results come back in call order,
+        each shaped like execute_tool's plus "timing" (and "timed_out" when
+        a call ran out of time). Calls must not depend on each other's output.
+        """
+        
+        logger.info(f"Executing {len(calls)} tools concurrently")
+        return self.tool_dispatcher.execute(calls, timeout=timeout)
+    
+    async def execute_tool_async(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """execute_tool for asyncio callers, so independent tool calls can be awaited together
+        
+        Web tools run on the HTTP client's executor, whose size bounds how many
+        fetches are in flight; everything else uses the loop's default executor.
+        """
+        
+        loop = asyncio.get_running_loop()
+        executor = self.http.executor if tool_name in self.web_tools else None
+        return await loop.run_in_executor(executor, self.execute_tool, tool_name, parameters)
+    
     def _file_read(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Read file content"""
+        """Read file content
+        
+        Reads at most max_bytes unless a range is given: offset/length (bytes),
+        head/tail (lines) or start_line/end_line (1-based, inclusive). The
+        encoding is detected from the start of the file unless passed in.
+        """
         
         file_path = params.get("file_path")
         if not file_path:
@@ -98,24 +185,64 @@ class ToolUseAPI:
         if not os.path.isfile(full_path):
             raise ValueError(f"Path is not a file: {file_path}")
         
-        # Read file with encoding detection
-        encoding = params.get("encoding", "utf-8")
+        # Detect encoding from a prefix sample
+        encoding = params.get("encoding")
+        binary = False
+        if not encoding:
+            encoding, binary = detect_file_encoding(full_path)
         
-        try:
-            with open(full_path, "r", encoding=encoding) as f:
-                content = f.read()
-        except UnicodeDecodeError:
-            # Try with different encoding
-            with open(full_path, "r", encoding="latin-1") as f:
-                content = f.read()
-            encoding = "latin-1"
+        max_bytes = int(params.get("max_bytes", self.max_read_bytes))
         
-        return {
-            "content": content,
+        result = {
             "file_path": file_path,
             "encoding": encoding,
             "size": os.path.getsize(full_path)
         }
+        if binary:
+            result["binary"] = True
+        
+        if params.get("tail") is not None:
+            result.update(read_tail(full_path, int(params["tail"]), encoding))
+        elif params.get("head") is not None:
+            result.update(read_lines(full_path, 1, int(params["head"]), encoding))
+        elif params.get("start_line") is not None or params.get("end_line") is not None:
+            end_line = params.get("end_line")
+            result.update(read_lines(
+                full_path, int(params.get("start_line") or 1),
+                int(end_line) if end_line is not None else None, encoding
+            ))
+        else:
+            length = params.get("length")
+            length = min(int(length), max_bytes) if length is not None else max_bytes
+            result.update(read_range(full_path, int(params.get("offset", 0)), length, encoding))
+            # More to read than was asked for: continue from next_offset
+            result["truncated"] = not result["eof"] and params.get("length") is None
+            return result
+        
+        # max_bytes counts encoded bytes; a character cut in half is dropped
+        encoded = result["content"].encode(encoding, errors="replace")
+        result["truncated"] = len(encoded) > max_bytes
+        if result["truncated"]:
+            result["content"] = encoded[:max_bytes].decode(encoding, errors="ignore")
+        
+        return result
+    
+    def stream_file(self, file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    encoding: Optional[str] = None, offset: int = 0,
+                    lines: bool = False) -> Iterator[Any]:
+        """Stream a workspace file without loading it
+        
+        Yields dicts with content, offset and next_offset per chunk, or plain
+        strings per line when lines is True.
+        """
+        
+        full_path = self._get_secure_path(file_path)
+        if not os.path.isfile(full_path):
+            raise FileNotFoundError(f"File not found: {file_path}")
+        
+        if lines:
+            return iter_lines(full_path, encoding)
+        return iter_chunks(full_path, chunk_size, encoding, offset)
     
     def _file_write(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Write content to file"""
@@ -139,21 +266,123 @@ class ToolUseAPI:
         encoding = params.get("encoding", "utf-8")
         mode = params.get("mode", "w")  # w = overwrite, a = append
         
-        with open(full_path, mode, encoding=encoding) as f:
-            f.write(content)
+        bytes_written = write_text(full_path, content, encoding, mode, atomic=params.get("atomic", False))
+        self._invalidate(full_path)
         
         return {
             "file_path": file_path,
-            "bytes_written": len(content.encode(encoding)),
+            "bytes_written": bytes_written,
             "mode": mode
         }
     
+    def _file_read_many(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Read a batch of files in parallel
+        
+        Takes file_paths, or files as a list of file_read parameter dicts.
+        Other parameters (encoding, max_bytes, head, ...) apply to every file
+        unless a files entry overrides them. Failures are reported per file.
+        """
+        
+        shared = {key: value for key, value in params.items() if key not in ("files", "file_paths")}
+        reads = params.get("files") or [{"file_path": path} for path in params.get("file_paths") or []]
+        if not reads:
+            raise ValueError("file_paths or files is required")
+        
+        def read(spec: Dict[str, Any]) -> Dict[str, Any]:
+            try:
+                return {"success": True, **self._file_read({**shared, **spec})}
+            except Exception as e:
+                return {"file_path": spec.get("file_path"), "success": False, "error": str(e)}
+        
+        results = list(self.io_executor.map(read, reads))
+        
+        return {
+            "results": results,
+            "total_files": len(results),
+            "failed": sum(1 for result in results if not result["success"])
+        }
+    
+    def _file_write_many(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Write a batch of files in parallel
+        
+        files is a list of {file_path, content, encoding, mode}. Parent
+        directories are created in one pass before any write; writes to the
+        same path run in list order. atomic replaces each file through a temp
+        file and rename. Failures are reported per file and don't stop the batch.
+        """
+        
+        files = params.get("files")
+        if not files:
+            raise ValueError("files is required")
+        
+        atomic = params.get("atomic", False)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(files)
+        
+        # full path -> indexes of the writes to it, in order
+        writes: Dict[str, List[int]] = {}
+        for index, spec in enumerate(files):
+            try:
+                if not spec.get("file_path"):
+                    raise ValueError("file_path is required")
+                if spec.get("content") is None:
+                    raise ValueError("content is required")
+                writes.setdefault(self._get_secure_path(spec["file_path"]), []).append(index)
+            except Exception as e:
+                results[index] = {"file_path": spec.get("file_path"), "success": False, "error": str(e)}
+        
+        # Sorted, so a parent is created before its children and they only stat it
+        directory_errors = {}
+        for directory in sorted({os.path.dirname(full_path) for full_path in writes}):
+            try:
+                os.makedirs(directory, exist_ok=True)
+            except OSError as e:
+                directory_errors[directory] = str(e)
+        
+        def write(full_path: str, indexes: List[int]):
+            for index in indexes:
+                spec = files[index]
+                mode = spec.get("mode", "w")
+                try:
+                    if os.path.dirname(full_path) in directory_errors:
+                        raise OSError(directory_errors[os.path.dirname(full_path)])
+                    bytes_written = write_text(
+                        full_path, spec["content"], spec.get("encoding", "utf-8"), mode, atomic=atomic
+                    )
+                    results[index] = {
+                        "file_path": spec["file_path"],
+                        "success": True,
+                        "bytes_written": bytes_written,
+                        "mode": mode
+                    }
+                except Exception as e:
+                    results[index] = {"file_path": spec["file_path"], "success": False, "error": str(e)}
+        
+        list(self.io_executor.map(lambda item: write(*item), writes.items()))
+        
+        self._invalidate(*writes)
+        
+        return {
+            "results": results,
+            "total_files": len(results),
+            "bytes_written": sum(result.get("bytes_written", 0) for result in results),
+            "failed": sum(1 for result in results if not result["success"]),
+            "atomic": atomic
+        }
+    
     def _file_list(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        """List files in directory"""
+        """List files in directory
+        
+        pattern is a glob (** spans directories; patterns containing "/" match
+        the relative path). Results are sorted by path and paged with
+        offset/limit; total_files counts all matches.
+        """
         
         directory = params.get("directory", ".")
         pattern = params.get("pattern", "*")
         recursive = params.get("recursive", False)
+        offset = int(params.get("offset", 0))
+        limit = params.get("limit")
+        limit = int(limit) if limit is not None else None
         
         # Secure path handling
         full_path = self._get_secure_path(directory)
@@ -164,38 +393,28 @@ class ToolUseAPI:
         if not os.path.isdir(full_path):
             raise ValueError(f"Path is not a directory: {directory}")
         
-        files = []
-        
-        if recursive:
-            for root, dirs, filenames in os.walk(full_path):
-                for filename in filenames:
-                    if self._match_pattern(filename, pattern):
-                        rel_path = os.path.relpath(os.path.join(root, filename), full_path)
-                        files.append({
-                            "name": filename,
-                            "path": rel_path,
-                            "size": os.path.getsize(os.path.join(root, filename)),
-                            "modified": datetime.fromtimestamp(
-                                os.path.getmtime(os.path.join(root, filename))
-                            ).isoformat()
-                        })
-        else:
-            for item in os.listdir(full_path):
-                item_path = os.path.join(full_path, item)
-                if os.path.isfile(item_path) and self._match_pattern(item, pattern):
-                    files.append({
-                        "name": item,
-                        "path": item,
-                        "size": os.path.getsize(item_path),
-                        "modified": datetime.fromtimestamp(
-                            os.path.getmtime(item_path)
-                        ).isoformat()
-                    })
+        # Answered from the workspace index; only changed directories are rescanned
+        entries, total = self.workspace_index.list_files(
+            full_path, pattern=pattern, recursive=recursive, offset=offset, limit=limit,
+            refresh=params.get("refresh", False)
+        )
+        
+        files = [
+            {
+                "name": entry["name"],
+                "path": entry["path"],
+                "size": entry["size"],
+                "modified": datetime.fromtimestamp(entry["mtime"]).isoformat()
+            }
+            for entry in entries
+        ]
         
         return {
             "directory": directory,
             "files": files,
-            "total_files": len(files)
+            "total_files": total,
+            "offset": offset,
+            "has_more": offset + len(files) < total
         }
     
     def _file_delete(self, params: Dict[str, Any]) -> Dict[str, Any]:
@@ -215,6 +434,7 @@ class ToolUseAPI:
             os.remove(full_path)
         elif os.path.isdir(full_path):
             shutil.rmtree(full_path)
+        self._invalidate(full_path)
         
         return {
             "file_path": file_path,
@@ -244,6 +464,7 @@ class ToolUseAPI:
             shutil.copy2(source_path, dest_path)
         elif os.path.isdir(source_path):
             shutil.copytree(source_path, dest_path)
+        self._invalidate(dest_path)
         
         return {
             "source": source,
@@ -271,6 +492,7 @@ class ToolUseAPI:
         os.makedirs(os.path.dirname(dest_path), exist_ok=True)
         
         shutil.move(source_path, dest_path)
+        self._invalidate(source_path, dest_path)
         
         return {
             "source": source,
@@ -289,6 +511,7 @@ class ToolUseAPI:
         full_path = self._get_secure_path(directory)
         
         os.makedirs(full_path, exist_ok=True)
+        self._invalidate(full_path)
         
         return {
             "directory": directory,
@@ -309,20 +532,15 @@ class ToolUseAPI:
         if not os.path.isdir(full_path):
             raise ValueError(f"Path is not a directory: {directory}")
         
-        items = []
-        
-        for item in os.listdir(full_path):
-            item_path = os.path.join(full_path, item)
-            is_dir = os.path.isdir(item_path)
-            
-            items.append({
-                "name": item,
-                "type": "directory" if is_dir else "file",
-                "size": 0 if is_dir else os.path.getsize(item_path),
-                "modified": datetime.fromtimestamp(
-                    os.path.getmtime(item_path)
-                ).isoformat()
-            })
+        items = [
+            {
+                "name": entry["name"],
+                "type": entry["type"],
+                "size": entry["size"],
+                "modified": datetime.fromtimestamp(entry["mtime"]).isoformat()
+            }
+            for entry in self.workspace_index.list_directory(full_path, refresh=params.get("refresh", False))
+        ]
         
         return {
             "directory": directory,
@@ -330,6 +548,38 @@ class ToolUseAPI:
             "total_items": len(items)
         }
     
+    def _workspace_search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Search file contents across the workspace
+        
+        query is a literal string unless regex is True. Results are files
+        ranked by match count (name matches first), each with up to
+        max_matches_per_file matching lines; directory and pattern (a glob on
+        the file name) narrow the search.
+        """
+        
+        query = params.get("query")
+        if not query:
+            raise ValueError("query is required")
+        
+        directory = params.get("directory", ".")
+        
+        # Secure path handling
+        full_path = self._get_secure_path(directory)
+        
+        if not os.path.isdir(full_path):
+            raise ValueError(f"Path is not a directory: {directory}")
+        
+        return self.workspace_search.search(
+            query,
+            regex=params.get("regex", False),
+            case_sensitive=params.get("case_sensitive", False),
+            directory=full_path,
+            pattern=params.get("pattern"),
+            max_results=int(params.get("max_results", 20)),
+            max_matches_per_file=int(params.get("max_matches_per_file", 5)),
+            refresh=params.get("refresh", False)
+        )
+    
     def _git_clone(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Clone Git repository"""
         
@@ -345,14 +595,18 @@ class ToolUseAPI:
         # Secure path handling
         full_path = self._get_secure_path(local_path)
         
-        # Clone repository
-        repo = Repo.clone_from(repo_url, full_path)
+        # Clone repository; depth/filter/branch make shallow or partial clones
+        options = clone_options(params)
+        repo = Repo.clone_from(repo_url, full_path, **options)
+        self._invalidate(full_path)
+        self.git_repos.add(full_path, repo)
         
         return {
             "repo_url": repo_url,
             "local_path": local_path,
             "cloned": True,
-            "commit": repo.head.commit.hexsha
+            "commit": repo.head.commit.hexsha,
+            "options": options
         }
     
     def _git_commit(self, params: Dict[str, Any]) -> Dict[str, Any]:
@@ -364,14 +618,12 @@ class ToolUseAPI:
         # Secure path handling
         full_path = self._get_secure_path(repo_path)
         
-        # Open repository
-        repo = Repo(full_path)
-        
-        # Add all changes
-        repo.git.add(A=True)
-        
-        # Commit
-        commit = repo.index.commit(message)
+        with self.git_repos.open(full_path) as repo:
+            # Add all changes
+            repo.git.add(A=True)
+            
+            # Commit
+            commit = repo.index.commit(message)
         
         return {
             "repo_path": repo_path,
@@ -390,12 +642,10 @@ class ToolUseAPI:
         # Secure path handling
         full_path = self._get_secure_path(repo_path)
         
-        # Open repository
-        repo = Repo(full_path)
-        
-        # Push to remote
-        origin = repo.remote(remote)
-        origin.push(branch)
+        with self.git_repos.open(full_path) as repo:
+            # Push to remote
+            origin = repo.remote(remote)
+            origin.push(branch)
         
         return {
             "repo_path": repo_path,
@@ -414,12 +664,11 @@ class ToolUseAPI:
         # Secure path handling
         full_path = self._get_secure_path(repo_path)
         
-        # Open repository
-        repo = Repo(full_path)
-        
-        # Pull from remote
-        origin = repo.remote(remote)
-        origin.pull(branch)
+        with self.git_repos.open(full_path) as repo:
+            # Pull from remote
+            origin = repo.remote(remote)
+            origin.pull(branch)
+        self._invalidate(full_path)
         
         return {
             "repo_path": repo_path,
@@ -429,24 +678,24 @@ class ToolUseAPI:
         }
     
     def _git_status(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Get Git repository status"""
+        """Get Git repository status
+        
+        Cached until the index or HEAD changes, a tool writes into the repo,
+        or a few seconds pass. porcelain=True computes it with one
+        `git status --porcelain=v2` call; refresh=True skips the cache.
+        """
         
         repo_path = params.get("repo_path", ".")
         
         # Secure path handling
         full_path = self._get_secure_path(repo_path)
         
-        # Open repository
-        repo = Repo(full_path)
-        
         # Get status
-        status = {
-            "branch": repo.active_branch.name,
-            "commit": repo.head.commit.hexsha,
-            "modified": [item.a_path for item in repo.index.diff(None)],
-            "staged": [item.a_path for item in repo.index.diff("HEAD")],
-            "untracked": repo.untracked_files
-        }
+        status = self.git_repos.status(
+            full_path,
+            porcelain=params.get("porcelain", False),
+            refresh=params.get("refresh", False)
+        )
         
         return {
             "repo_path": repo_path,
@@ -463,52 +712,51 @@ class ToolUseAPI:
         # Secure path handling
         full_path = self._get_secure_path(repo_path)
         
-        # Open repository
-        repo = Repo(full_path)
-        
-        if action == "list":
-            branches = [branch.name for branch in repo.branches]
-            return {
-                "repo_path": repo_path,
-                "branches": branches,
-                "current": repo.active_branch.name
-            }
-        
-        elif action == "create":
-            if not branch_name:
-                raise ValueError("branch_name is required for create action")
+        with self.git_repos.open(full_path) as repo:
+            if action == "list":
+                branches = [branch.name for branch in repo.branches]
+                return {
+                    "repo_path": repo_path,
+                    "branches": branches,
+                    "current": repo.active_branch.name
+                }
             
-            new_branch = repo.create_head(branch_name)
-            return {
-                "repo_path": repo_path,
-                "branch_name": branch_name,
-                "created": True
-            }
-        
-        elif action == "switch":
-            if not branch_name:
-                raise ValueError("branch_name is required for switch action")
+            elif action == "create":
+                if not branch_name:
+                    raise ValueError("branch_name is required for create action")
+                
+                new_branch = repo.create_head(branch_name)
+                return {
+                    "repo_path": repo_path,
+                    "branch_name": branch_name,
+                    "created": True
+                }
             
-            repo.git.checkout(branch_name)
-            return {
-                "repo_path": repo_path,
-                "branch_name": branch_name,
-                "switched": True
-            }
-        
-        elif action == "delete":
-            if not branch_name:
-                raise ValueError("branch_name is required for delete action")
+            elif action == "switch":
+                if not branch_name:
+                    raise ValueError("branch_name is required for switch action")
+                
+                repo.git.checkout(branch_name)
+                self._invalidate(full_path)
+                return {
+                    "repo_path": repo_path,
+                    "branch_name": branch_name,
+                    "switched": True
+                }
             
-            repo.delete_head(branch_name)
-            return {
-                "repo_path": repo_path,
-                "branch_name": branch_name,
-                "deleted": True
-            }
-        
-        else:
-            raise ValueError(f"Unknown action: {action}")
+            elif action == "delete":
+                if not branch_name:
+                    raise ValueError("branch_name is required for delete action")
+                
+                repo.delete_head(branch_name)
+                return {
+                    "repo_path": repo_path,
+                    "branch_name": branch_name,
+                    "deleted": True
+                }
+            
+            else:
+                raise ValueError(f"Unknown action: {action}")
     
     def _web_search(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Search the web (simple implementation)"""
@@ -521,7 +769,7 @@ class ToolUseAPI:
         search_url = f"https://duckduckgo.com/html/?q={urllib.parse.quote(query)}"
         
         try:
-            response = requests.get(search_url, timeout=10)
+            response = self.http.get(search_url, timeout=10)
             response.raise_for_status()
             
             # Parse search results
@@ -544,7 +792,7 @@ class ToolUseAPI:
                 "results": results,
                 "total_results": len(results)
             }
-            
+        
         except Exception as e:
             logger.error(f"Web search error: {str(e)}")
             return {
@@ -566,31 +814,26 @@ class ToolUseAPI:
             raise ValueError(f"Domain not allowed: {parsed_url.netloc}")
         
         try:
-            response = requests.get(url, timeout=10)
+            response, cache_status = self._cached_get(url, params, timeout=10)
             response.raise_for_status()
             
-            # Parse HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract text content
-            text = soup.get_text()
-            
-            # Extract links
-            links = []
-            for link in soup.find_all('a', href=True):
-                links.append({
-                    "text": link.text.strip(),
-                    "url": link['href']
-                })
+            # Streaming extraction: parsing stops once the text and link limits are filled
+            extract = extract_html(
+                response.text,
+                max_text=int(params.get("max_text", 5000)),
+                max_links=int(params.get("max_links", 20))
+            )
             
             return {
                 "url": url,
-                "title": soup.title.string if soup.title else "",
-                "text": text[:5000],  # Limit text length
-                "links": links[:20],  # Limit links
-                "status_code": response.status_code
+                "title": extract["title"],
+                "text": extract["text"],
+                "links": extract["links"],
+                "status_code": response.status_code,
+                "cache_hit": cache_status in ("hit", "revalidated"),
+                "cache_status": cache_status
             }
-            
+        
         except Exception as e:
             logger.error(f"Web scraping error: {str(e)}")
             return {
@@ -615,22 +858,28 @@ class ToolUseAPI:
             raise ValueError(f"Domain not allowed: {parsed_url.netloc}")
         
         try:
-            response = requests.request(
-                method=method,
-                url=url,
-                headers=headers,
-                json=data if data else None,
-                timeout=10
-            )
+            if method == "GET" and not data:
+                response, cache_status = self._cached_get(url, params, headers=headers, timeout=10)
+            else:
+                response = self.http.request(
+                    method=method,
+                    url=url,
+                    headers=headers,
+                    json=data if data else None,
+                    timeout=10
+                )
+                cache_status = "bypass"
             
             return {
                 "url": url,
                 "method": method,
                 "status_code": response.status_code,
                 "headers": dict(response.headers),
-                "content": response.text[:5000]  # Limit content length
+                "content": response.text[:5000],  # Limit content length
+                "cache_hit": cache_status in ("hit", "revalidated"),
+                "cache_status": cache_status
             }
-            
+        
         except Exception as e:
             logger.error(f"HTTP request error: {str(e)}")
             return {
@@ -639,65 +888,35 @@ class ToolUseAPI:
                 "error": str(e)
             }
     
+    def _cached_get(self, url: str, params: Dict[str, Any], **kwargs):
+        """GET through the HTTP cache unless it is disabled or the call passes cache=False"""
+        
+        if self.http_cache is None or not params.get("cache", True):
+            return self.http.get(url, **kwargs), "bypass"
+        return self.http_cache.fetch(self.http, url, **kwargs)
+    
     def _json_parse(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """Parse JSON data"""
-        
-        json_data = params.get("json_data")
-        if not json_data:
-            raise ValueError("json_data is required")
-        
-        try:
-            if isinstance(json_data, str):
-                parsed = json.loads(json_data)
-            else:
-                parsed = json_data
-            
-            return {
-                "parsed": parsed,
-                "type": type(parsed).__name__
-            }
-            
-        except json.JSONDecodeError as e:
-            return {
-                "error": f"JSON parse error: {str(e)}"
-            }
+        return json_parse(params)
     
     def _text_process(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Process text data"""
-        
-        text = params.get("text")
-        operation = params.get("operation", "analyze")
-        
-        if not text:
-            raise ValueError("text is required")
-        
-        if operation == "analyze":
-            return {
-                "text": text,
-                "length": len(text),
-                "words": len(text.split()),
-                "lines": len(text.split('\\n')),
-                "characters": len(text.replace(' ', ''))
-            }
+        """Process text data, given inline or as a workspace file streamed in blocks"""
         
-        elif operation == "extract_emails":
-            import re
-            emails = re.findall(r'\\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\\.[A-Z|a-z]{2,}\\b', text)
-            return {
-                "emails": emails,
-                "count": len(emails)
-            }
-        
-        elif operation == "extract_urls":
-            import re
-            urls = re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', text)
-            return {
-                "urls": urls,
-                "count": len(urls)
-            }
+        file_path = params.get("file_path")
+        if not file_path:
+            return text_process(params)
         
-        else:
-            raise ValueError(f"Unknown operation: {operation}")
+        full_path = self._get_secure_path(file_path)
+        if not os.path.isfile(full_path):
+            raise FileNotFoundError(f"File not found: {file_path}")
+        return text_process(params, path=full_path)
+    
+    def _invalidate(self, *paths: str):
+        """Tell the workspace caches that paths (files or directories) changed"""
+        for path in paths:
+            self.workspace_index.invalidate(path)
+            self.workspace_search.invalidate(path)
+            self.git_repos.invalidate(path)
     
     def _get_secure_path(self, path: str) -> str:
         """Get secure path within working directory"""
@@ -709,28 +928,15 @@ class ToolUseAPI:
         if os.path.isabs(path):
             path = os.path.relpath(path, '/')
         
-        # Join with working directory
-        full_path = os.path.join(self.working_dir, path)
+        # Join with working directory, resolving any ".." left at the front
+        full_path = os.path.abspath(os.path.join(self.working_dir, path))
         
         # Ensure path is within working directory
-        if not full_path.startswith(self.working_dir):
+        if full_path != self.working_dir and not full_path.startswith(self.working_dir + os.sep):
             raise ValueError(f"Path outside working directory: {path}")
         
         return full_path
     
-    def _match_pattern(self, filename: str, pattern: str) -> bool:
-        """Check if filename matches pattern"""
-        
-        if pattern == "*":
-            return True
-        
-        # Simple pattern matching
-        if pattern.startswith("*."):
-            extension = pattern[2:]
-            return filename.endswith(extension)
-        
-        return pattern in filename
-    
     def get_available_tools(self) -> List[str]:
         """Get list of available tools"""
         return list(self.tools.keys())
@@ -739,14 +945,17 @@ class ToolUseAPI:
         """Get information about a specific tool"""
         
         tool_info = {
-            "file_read": "Read content from a file",
+            "file_read": "Read content from a file (whole, byte range, head/tail or line range)",
             "file_write": "Write content to a file",
-            "file_list": "List files in a directory",
+            "file_read_many": "Read a batch of files in parallel",
+            "file_write_many": "Write a batch of files in parallel, optionally atomically",
+            "file_list": "List files in a directory (glob patterns, recursive, paged)",
             "file_delete": "Delete a file or directory",
             "file_copy": "Copy a file or directory",
             "file_move": "Move a file or directory",
             "directory_create": "Create a directory",
             "directory_list": "List directory contents",
+            "workspace_search": "Search file contents in the workspace (ranked file/line matches)",
             "git_clone": "Clone a Git repository",
             "git_commit": "Commit changes to Git repository",
             "git_push": "Push changes to remote repository",
@@ -757,7 +966,7 @@ class ToolUseAPI:
             "web_scrape": "Scrape web page content",
             "http_request": "Make HTTP requests",
             "json_parse": "Parse JSON data",
-            "text_process": "Process text data"
+            "text_process": "Process text (or a file_path, streamed): analyze, extract_emails, extract_urls, dedupe_lines, top_tokens, ngrams"
         }
         
         return {
@@ -766,12 +975,22 @@ class ToolUseAPI:
             "available": tool_name in self.tools
         }
     
+    def get_http_cache_stats(self) -> Dict[str, Any]:
+        """HTTP cache hit/miss counters and size, or {"enabled": False}"""
+        if self.http_cache is None:
+            return {"enabled": False}
+        return self.http_cache.get_stats()
+    
     def get_working_directory(self) -> str:
         """Get current working directory"""
         return self.working_dir
     
     def cleanup(self):
         """Clean up temporary files"""
+        self.http.close()
+        self.io_executor.shutdown(wait=False)
+        self.git_repos.close()
+        self.tool_dispatcher.close()
         try:
             shutil.rmtree(self.working_dir)
             logger.info(f"Cleaned up working directory: {self.working_dir}")